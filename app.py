@@ -1,6 +1,6 @@
 from flask import Flask
 from config import Config
-from models.database import init_db
+from models.database import init_db, release_request_connections
 
 def create_app():
     app = Flask(__name__)
@@ -9,18 +9,49 @@ def create_app():
     # Initialize database
     init_db()
     
+    # Hand pooled database connections back at the end of each request
+    app.teardown_appcontext(release_request_connections)
+    
+    # Server-Timing header and slow request log
+    from services import request_timing
+    request_timing.init_app(app)
+    
+    # Query fingerprints, plans and N+1 suspects (only with QUERY_STATS on)
+    from services import query_stats
+    query_stats.init_app(app)
+    
+    # Counters and histograms for /metrics
+    from services import metrics
+    metrics.init_app(app)
+    
+    # Sampling profiler for /admin/profile and X-Profile requests
+    from services import profiler
+    profiler.init_app(app)
+    
+    # Peak and retained memory of requests and PDF renders for /admin/memory
+    from services import memory
+    memory.init_app(app)
+    
     # Register blueprints
     from routes.main import main_bp
     from routes.contractor import contractor_bp
     from routes.client import client_bp
     from routes.invoice import invoice_bp
     from routes.receipt import receipt_bp
+    from routes.search import search_bp
+    from routes.export import export_bp
+    from routes.admin import admin_bp
+    from routes.metrics import metrics_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(contractor_bp, url_prefix='/contractor')
     app.register_blueprint(client_bp, url_prefix='/client')
     app.register_blueprint(invoice_bp, url_prefix='/invoice')
     app.register_blueprint(receipt_bp, url_prefix='/receipt')
+    app.register_blueprint(search_bp, url_prefix='/search')
+    app.register_blueprint(export_bp, url_prefix='/export')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(metrics_bp)
     
     return app
 
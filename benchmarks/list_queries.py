@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+List Query Benchmark for Invoice System
+=======================================
+
+Fills a scratch database with synthetic clients, invoices, line items and
+receipts, then times the queries behind the invoice, receipt and dashboard
+list pages.
+
+Usage:
+    python benchmarks/list_queries.py [--invoices 100000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+SERVICES = ['Consulting', 'Design', 'Development', 'Support', 'Training', 'Audit', 'Hosting', 'Maintenance']
+
+def generate(invoice_count, client_count=500, seed=1):
+    """Bulk insert synthetic data straight into the scratch database"""
+    from models.database import connection, timestamp
+    from models.invoice import summarize_services
+    from models.migrations import _columns
+    from models.stats import DashboardStats
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+
+    with connection() as conn:
+        has_summary = 'services_summary' in _columns(conn, 'invoices')
+        conn.execute('BEGIN')
+        conn.execute(
+            "INSERT INTO contractor_info (id, name, address, email, phone) VALUES (1, 'Bench', 'Street', 'b@example.com', '1')"
+        )
+        conn.executemany(
+            "INSERT INTO clients (name, address, email, phone) VALUES (?, ?, ?, ?)",
+            [(f'Client {n}', f'{n} Main St', f'client{n}@example.com', '555-0100') for n in range(client_count)]
+        )
+
+        invoices, items, receipts = [], [], []
+        for invoice_id in range(1, invoice_count + 1):
+            created = start + timedelta(minutes=invoice_id * 5)
+            names = [rng.choice(SERVICES) for _ in range(rng.randint(1, 6))]
+            total = 0
+            for order, name in enumerate(names):
+                rate = rng.randint(50, 500)
+                total += rate
+                items.append((invoice_id, name, 'Work performed', 1, rate, rate, order))
+            paid = rng.random() < 0.6
+            invoices.append((
+                invoice_id, f'INV-{invoice_id:07d}', rng.randint(1, client_count), 1,
+                created.strftime('%Y-%m-%d'), total, timestamp(created), 'paid' if paid else 'pending',
+                summarize_services(names)
+            ))
+            if paid:
+                receipts.append((invoice_id, f'REC-{invoice_id:07d}', total, timestamp(created + timedelta(days=7))))
+
+        columns = 'id, invoice_number, client_id, contractor_id, invoice_date, total, date_created, status'
+        if has_summary:
+            conn.executemany(f"INSERT INTO invoices ({columns}, services_summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", invoices)
+        else:
+            conn.executemany(f"INSERT INTO invoices ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [row[:-1] for row in invoices])
+        conn.executemany('''
+            INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', items)
+        conn.executemany(
+            "INSERT INTO receipts (invoice_id, receipt_number, paid_amount, payment_date) VALUES (?, ?, ?, ?)", receipts
+        )
+        DashboardStats.rebuild(conn)
+        conn.commit()
+        conn.execute('ANALYZE')
+
+    return len(items), len(receipts)
+
+def measure(func, repeat):
+    """Run func repeat times, returns (median, max) in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the list page queries on a large synthetic database')
+    parser.add_argument('--invoices', type=int, default=100000, help='number of invoices to generate')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    args = parser.parse_args()
+
+    scratch_dir = tempfile.mkdtemp(prefix='invoice_bench_')
+    Config.DATABASE_PATH = os.path.join(scratch_dir, 'invoices.db')
+
+    from models.database import init_db, close_pools
+    from models.invoice import Invoice
+    from models.receipt import Receipt
+
+    try:
+        init_db(progress=lambda *_: None)
+        print(f"🏗️  Generating {args.invoices:,} invoices...")
+        started = time.perf_counter()
+        item_count, receipt_count = generate(args.invoices)
+        print(f"   {item_count:,} line items, {receipt_count:,} receipts in {time.perf_counter() - started:.1f}s")
+
+        page = Invoice.get_all_invoices(page_size=Config.PAGE_SIZE)
+        for _ in range(20):
+            page = Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, cursor=page.next_cursor)
+        deep_cursor = page.next_cursor
+
+        cases = [
+            ('Invoice list, first page', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE)),
+            ('Invoice list, page 21', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, cursor=deep_cursor)),
+            ('Invoice list, by amount', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, sort='amount')),
+            ('Invoice list, pending only', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, status='pending')),
+            ('Invoice list, one client', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, client_id=7)),
+            ('Recent invoices (dashboard)', lambda: Invoice.get_recent_invoices(5)),
+            ('Invoice list, max page size', lambda: Invoice.get_all_invoices(page_size=Config.MAX_PAGE_SIZE)),
+            ('Receipt list, first page', lambda: Receipt.get_all_receipts(page_size=Config.PAGE_SIZE)),
+            ('Receipt list, max page size', lambda: Receipt.get_all_receipts(page_size=Config.MAX_PAGE_SIZE)),
+        ]
+        # Unpaginated lists read every row, so they are timed fewer times
+        full_cases = [
+            ('Invoice list, all rows', lambda: Invoice.get_all_invoices()),
+            ('Receipt list, all rows', lambda: Receipt.get_all_receipts()),
+        ]
+
+        print(f"\n{'Query':<32} {'median':>10} {'max':>10}")
+        print("-" * 54)
+        for name, func in cases:
+            median, worst = measure(func, args.repeat)
+            print(f"{name:<32} {median:>8.2f}ms {worst:>8.2f}ms")
+        for name, func in full_cases:
+            median, worst = measure(func, max(1, args.repeat // 10))
+            print(f"{name:<32} {median:>8.2f}ms {worst:>8.2f}ms")
+    finally:
+        close_pools()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
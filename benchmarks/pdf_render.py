@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+PDF Rendering Benchmark for Invoice System
+==========================================
+
+Renders synthetic invoices and receipts (1 to 5,000 line items, long
+descriptions, long addresses) with generate_invoice_pdf and
+generate_receipt_pdf, and records the wall-clock time and peak Python
+memory of each. Results can be saved as JSON and compared against a
+saved baseline; the run fails if any case got slower or bigger than the
+baseline by more than the threshold.
+
+Usage:
+    python benchmarks/pdf_render.py [--repeat 5] [--sizes 1,10,100,1000,5000]
+    python benchmarks/pdf_render.py --output benchmarks/pdf_baseline.json
+    python benchmarks/pdf_render.py --baseline benchmarks/pdf_baseline.json [--threshold 0.2]
+
+Baselines are only comparable on the same machine and setup: timings
+depend heavily on whether ReportLab's C accelerators (_rl_accel) are
+installed, since without them number formatting and stream encoding run
+in pure Python.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+SIZES = [1, 10, 100, 1000, 5000]
+
+SERVICES = ['Consulting', 'Design', 'Development', 'Support', 'Training', 'Audit', 'Hosting', 'Maintenance']
+
+LONG_DESCRIPTION = (
+    'Analysis of the existing system, workshops with the team, implementation of the agreed '
+    'changes and a written report with recommendations for the next phase of the project. '
+) * 3
+
+LONG_ADDRESS = '\n'.join([
+    'Building 4, Floor 12, Suite 1204', 'Attn: Accounts Payable Department', '1234 Long Industrial Park Road',
+    'Northern Business District', 'Springfield, IL 62701', 'United States of America'
+])
+
+def line_items(count, description='Work performed'):
+    """count synthetic line items; every other one has a description"""
+    items = []
+    for n in range(count):
+        quantity = 1 + n % 4
+        rate = 50.0 + (n * 37) % 450
+        items.append({
+            'service_name': SERVICES[n % len(SERVICES)],
+            'service_description': description if n % 2 == 0 else '',
+            'quantity': quantity,
+            'rate': rate,
+            'amount': quantity * rate
+        })
+    return items
+
+def document(count, description='Work performed', address='100 Main St\nSpringfield'):
+    """Synthetic invoice and receipt data: both renderers take the same dict"""
+    items = line_items(count, description)
+    total = sum(item['amount'] for item in items)
+    return {
+        'invoice_number': 'INV-0001',
+        'receipt_number': 'REC-0001',
+        'invoice_date': '2026-01-15',
+        'payment_date': '2026-02-01 10:30:00',
+        'status': 'paid',
+        'total': total,
+        'paid_amount': total,
+        'line_items': items,
+        'service_name': items[0]['service_name'] if items else 'Consulting',
+        'service_description': description,
+        'contractor_name': 'Bench Consulting LLC',
+        'contractor_address': address,
+        'contractor_email': 'billing@bench.example.com',
+        'contractor_phone': '555-0100',
+        'contractor_tax_id': '12-3456789',
+        'client_name': 'Example Client Inc.',
+        'client_address': address,
+        'client_email': 'ap@client.example.com',
+        'client_phone': '555-0199'
+    }
+
+def cases(kinds, sizes):
+    """(name, kind, data) for every document to render"""
+    result = []
+    for kind in kinds:
+        for size in sizes:
+            result.append((f'{kind}-{size}', kind, document(size)))
+        result.append((f'{kind}-100-long-descriptions', kind, document(100, description=LONG_DESCRIPTION)))
+        result.append((f'{kind}-10-long-addresses', kind, document(10, address=LONG_ADDRESS)))
+    return result
+
+def environment():
+    """What the timings depend on besides the code"""
+    import reportlab
+
+    return {
+        'python': platform.python_version(),
+        'reportlab': reportlab.Version,
+        'rl_accel': importlib.util.find_spec('_rl_accel') is not None,
+        'machine': platform.machine(),
+        'system': platform.system()
+    }
+
+def run_case(kind, data, filepath, repeat):
+    """Render one document repeat times, then once more under tracemalloc"""
+    from services.pdf_generator import generate_invoice_pdf, generate_receipt_pdf
+
+    generate = generate_invoice_pdf if kind == 'invoice' else generate_receipt_pdf
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        generate(dict(data), filepath)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Tracing slows rendering down, so memory gets a run of its own
+    tracemalloc.start()
+    try:
+        generate(dict(data), filepath)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'kind': kind,
+        'line_items': len(data['line_items']),
+        'runs': repeat,
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'peak_kb': round(peak / 1024, 1),
+        'pdf_kb': round(os.path.getsize(filepath) / 1024, 1)
+    }
+
+def compare(results, baseline, threshold):
+    """Print the change against baseline per case, returns the names of the regressed cases"""
+    for section in ('environment', 'settings'):
+        before, now = baseline.get(section, {}), results[section]
+        if before != now:
+            print(f"⚠️  The baseline was recorded with different {section}:")
+            for key in sorted(set(before) | set(now)):
+                if before.get(key) != now.get(key):
+                    print(f"   {key}: {before.get(key)} (baseline) vs {now.get(key)} (now)")
+
+    regressions = []
+    print(f"\n{'Case':<34} {'time':>9} {'memory':>9}")
+    print("-" * 54)
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<34} {'new':>9} {'new':>9}")
+            continue
+
+        # The fastest run is the least disturbed by whatever else the machine is doing
+        time_change = result['min_ms'] / before['min_ms'] - 1
+        memory_change = result['peak_kb'] / before['peak_kb'] - 1
+        regressed = time_change > threshold or memory_change > threshold
+        if regressed:
+            regressions.append(name)
+        marker = '  ❌' if regressed else ''
+        print(f"{name:<34} {time_change:>+8.1%} {memory_change:>+8.1%}{marker}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and measure invoice and receipt PDF rendering')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per document (large ones get fewer)')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma separated line item counts')
+    parser.add_argument('--kinds', default='invoice,receipt', help='documents to render: invoice, receipt or both')
+    parser.add_argument('--output', help='write the results to this JSON file (e.g. to save a baseline)')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fraction by which time or memory may grow before a case counts as a regression')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    kinds = [kind for kind in args.kinds.split(',') if kind]
+
+    scratch_dir = tempfile.mkdtemp(prefix='invoice_pdf_bench_')
+    filepath = os.path.join(scratch_dir, 'bench.pdf')
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'settings': {
+            'PDF_FAST_LAYOUT_ITEMS': Config.PDF_FAST_LAYOUT_ITEMS,
+            'LARGE_INVOICE_ITEMS': Config.LARGE_INVOICE_ITEMS,
+            'RECEIPT_MIN_SPACING_SCALE': Config.RECEIPT_MIN_SPACING_SCALE,
+            'RECEIPT_MIN_FONT_SCALE': Config.RECEIPT_MIN_FONT_SCALE
+        },
+        'results': {}
+    }
+
+    try:
+        if not results['environment']['rl_accel']:
+            print("ℹ️  ReportLab C accelerators (_rl_accel) not installed: rendering runs in pure Python")
+
+        print(f"\n{'Case':<34} {'median':>10} {'min':>10} {'peak mem':>10} {'size':>9}")
+        print("-" * 77)
+        for name, kind, data in cases(kinds, sizes):
+            items = len(data['line_items'])
+            repeat = args.repeat if items < 1000 else max(1, args.repeat // 5)
+            result = run_case(kind, data, filepath, repeat)
+            results['results'][name] = result
+            print(f"{name:<34} {result['median_ms']:>8.1f}ms {result['min_ms']:>8.1f}ms "
+                  f"{result['peak_kb'] / 1024:>8.1f}MB {result['pdf_kb']:>7.0f}KB")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✅ No case regressed by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
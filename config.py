@@ -1,4 +1,6 @@
+import hashlib
 import os
+import tempfile
 from datetime import timedelta
 
 class Config:
@@ -7,20 +9,140 @@ class Config:
     # Database
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'invoices.db')
     
+    # Database connections (pooled per worker process, see models/database.py)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_BUSY_TIMEOUT_MS = 5000
+    DB_CACHE_SIZE_KB = 16384
+    DB_MMAP_SIZE = 256 * 1024 * 1024
+    
+    # Schema migrations: apply pending migrations on startup, or set
+    # AUTO_MIGRATE=0 and run 'python manage_db.py migrate' before deploying
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') != '0'
+    MIGRATION_BATCH_SIZE = 1000
+    # How long a process waits for another one that is migrating the same
+    # database (several workers starting at once) before giving up
+    MIGRATION_LOCK_TIMEOUT = 600
+    
     # File paths
     PDF_FOLDER = os.path.join(os.path.dirname(__file__), 'pdfs')
     INVOICE_PDF_FOLDER = os.path.join(PDF_FOLDER, 'invoices')
     RECEIPT_PDF_FOLDER = os.path.join(PDF_FOLDER, 'receipts')
+    PDF_CACHE_FOLDER = os.path.join(PDF_FOLDER, 'cache')
     
     # Invoice settings
     INVOICE_PREFIX = 'INV-'
     RECEIPT_PREFIX = 'REC-'
     
+    # Number formats, with {prefix}, {year} and {seq} available. A format
+    # containing {year} keeps a separate counter per year, e.g.
+    # '{prefix}{year}-{seq:04d}' gives INV-2026-0001
+    INVOICE_NUMBER_FORMAT = '{prefix}{seq:04d}'
+    RECEIPT_NUMBER_FORMAT = '{prefix}{seq:04d}'
+    
+    # List pages
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    
+    # Search results shown per section, and the most a JSON caller may ask for
+    SEARCH_RESULT_LIMIT = 20
+    MAX_SEARCH_RESULT_LIMIT = 100
+    
+    # Request timing: every response gets a Server-Timing header with its
+    # total, SQL, template and PDF time, and requests taking at least
+    # SLOW_REQUEST_MS are logged as JSON (None turns the log off)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'
+    SLOW_REQUEST_MS = 500
+    
+    # Query statistics at /admin/queries (off by default): timings per
+    # normalized query, the plan of every query and of its first run taking
+    # SLOW_QUERY_MS or more, and requests running one query
+    # N_PLUS_ONE_QUERIES times or more
+    QUERY_STATS = os.environ.get('QUERY_STATS', '0') == '1'
+    SLOW_QUERY_MS = 100
+    N_PLUS_ONE_QUERIES = 10
+    
+    # Admin pages: they need ADMIN_TOKEN in an X-Admin-Token header or as a
+    # bearer token, and are closed to everyone while it is not set
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    
+    # Prometheus metrics at /metrics (same access rules as the admin pages).
+    # Each process, PDF workers included, writes its counters to a file in
+    # METRICS_DIR at most every METRICS_FLUSH_SECONDS so that /metrics can
+    # add up all worker processes of the app. The files only live as long
+    # as their process, so they go to the temp directory (one folder per
+    # installation); files of processes that are gone are removed at startup
+    METRICS = os.environ.get('METRICS', '1') != '0'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(
+        tempfile.gettempdir(),
+        'invoice-metrics-' + hashlib.sha256(os.path.abspath(os.path.dirname(__file__)).encode('utf-8')).hexdigest()[:12]
+    )
+    METRICS_FLUSH_SECONDS = 1
+    
+    # Sampling profiler for admins: /admin/profile samples the threads
+    # serving requests every PROFILE_INTERVAL_MS for up to
+    # PROFILE_MAX_SECONDS, and a request sent with an X-Profile header (or
+    # ?_profile=1) is sampled every PROFILE_REQUEST_INTERVAL_MS on its own.
+    # A busy thread only lets the sampler run every 5 ms (Python's thread
+    # switch interval), so shorter intervals gain nothing.
+    PROFILING = os.environ.get('PROFILING', '1') != '0'
+    PROFILE_INTERVAL_MS = 10
+    PROFILE_REQUEST_INTERVAL_MS = 5
+    PROFILE_MAX_SECONDS = 60
+    
+    # Memory accounting with tracemalloc (slows Python down, so off by
+    # default): peak and retained memory of every request and PDF render,
+    # logged and listed at /admin/memory, renders with the MEMORY_TOP_SITES
+    # source lines that allocated the most. A render whose peak goes over
+    # MEMORY_BUDGET_MB is logged with its top sites, and aborted as well when
+    # MEMORY_BUDGET_ACTION is 'abort'. More MEMORY_TRACE_FRAMES show more of
+    # each site's call stack at a further cost.
+    MEMORY_TRACKING = os.environ.get('MEMORY_TRACKING', '0') == '1'
+    MEMORY_TRACE_FRAMES = 1
+    MEMORY_TOP_SITES = 5
+    MEMORY_BUDGET_MB = None
+    MEMORY_BUDGET_ACTION = 'warn'  # or 'abort'
+    
     # Session settings
     PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
     
     # PDF settings
     PDF_PAGE_SIZE = 'letter'
+    # Rendered PDFs are kept for repeat downloads; the least recently used
+    # are removed once the cache grows past this size
+    PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Each process keeps a running total of the cache size and only walks
+    # the cache when that total passes the limit, or to pick up what other
+    # processes stored after this many seconds
+    PDF_CACHE_SCAN_SECONDS = 300
+    # PDFs are rendered in worker processes so a large document does not
+    # hold up other requests; 0 workers renders in the request instead.
+    # Each render is stopped after PDF_RENDER_TIMEOUT seconds, counted from
+    # when a worker starts it, and a worker may use at most
+    # PDF_RENDER_MEMORY_MB of address space (POSIX only). A download whose
+    # render no worker has started within PDF_RENDER_QUEUE_TIMEOUT seconds
+    # is answered with a "busy" error instead.
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_TIMEOUT = 30
+    PDF_RENDER_QUEUE_TIMEOUT = 60
+    PDF_RENDER_MEMORY_MB = 1024
+    # Invoices with more line items than this are laid out as a series of
+    # page-sized tables with page subtotals, and their items are read from
+    # the database while the PDF is built instead of all up front. From
+    # about 400 items on that is faster than one long table too (1000: 370
+    # vs 445 ms); below, the extra headers and subtotals cost a few ms
+    LARGE_INVOICE_ITEMS = 100
+    # Invoices and receipts with at most this many line items are drawn
+    # straight onto a single page instead of going through the flowing
+    # layout (which they still fall back to if they do not fit on one
+    # page); None always uses the flowing layout. Six items is the most
+    # that fit on an invoice page, so more would only be laid out twice
+    PDF_FAST_LAYOUT_ITEMS = 6
+    # Receipts that would run onto a second page are shrunk to fit one:
+    # first their padding and spacing, down to this fraction, then their
+    # fonts. One that does not fit even then keeps its regular size.
+    # 1 and 1 turn shrinking off.
+    RECEIPT_MIN_SPACING_SCALE = 0.25
+    RECEIPT_MIN_FONT_SCALE = 0.8
     
     @staticmethod
     def init_app(app):
@@ -28,4 +150,5 @@ class Config:
         os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
         os.makedirs(Config.PDF_FOLDER, exist_ok=True)
         os.makedirs(Config.INVOICE_PDF_FOLDER, exist_ok=True)
-        os.makedirs(Config.RECEIPT_PDF_FOLDER, exist_ok=True)
\ No newline at end of file
+        os.makedirs(Config.RECEIPT_PDF_FOLDER, exist_ok=True)
+        os.makedirs(Config.PDF_CACHE_FOLDER, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Bulk PDF Export for Invoice System
+==================================
+
+Renders every invoice or receipt matching a filter into one ZIP file, using
+all the PDF render workers (PDF_RENDER_WORKERS) and the PDF cache. The ZIP
+is written as the documents finish, so memory use stays flat however many
+documents are exported. Documents that fail to render are listed in
+errors.txt inside the ZIP.
+
+Usage:
+    python export_pdfs.py invoice --from 2026-01-01 --to 2026-03-31
+    python export_pdfs.py invoice --client 3 --status paid -o paid.zip
+    python export_pdfs.py receipt --from 2026-01-01 [--database path/to/invoices.db]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from config import Config
+
+def valid_date(value):
+    """argparse type for YYYY-MM-DD dates"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a YYYY-MM-DD date")
+    return value
+
+def export(kind, filters, output):
+    from models.database import close_pools
+    from services.bulk_export import ZipExport
+    from services.render_service import RenderService
+
+    started = time.perf_counter()
+    last_print = [0]
+
+    def progress(done, failed, total, finished):
+        now = time.perf_counter()
+        if finished or now - last_print[0] >= 1:
+            last_print[0] = now
+            print(f"   {done + failed:,}/{total:,} {kind}s ({failed} failed)", flush=True)
+
+    try:
+        zip_export = ZipExport(kind, filters, progress=progress)
+        if not zip_export.total:
+            print(f"ℹ️  No {kind}s match this filter")
+            return True
+
+        print(f"📦 Exporting {zip_export.total:,} {kind}s to {output}...")
+        temp_output = output + '.part'
+        with open(temp_output, 'wb') as f:
+            for chunk in zip_export:
+                f.write(chunk)
+        os.replace(temp_output, output)
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ {zip_export.done:,} PDFs written to {output} in {elapsed:.1f}s")
+        if zip_export.errors:
+            print(f"⚠️  {len(zip_export.errors)} {kind}s failed to render (listed in errors.txt)")
+            return False
+        return True
+    finally:
+        RenderService.shutdown()
+        close_pools()
+
+def main():
+    parser = argparse.ArgumentParser(description='Export invoice or receipt PDFs into a ZIP file')
+    parser.add_argument('kind', choices=['invoice', 'receipt'], help='documents to export')
+    parser.add_argument('--from', dest='date_from', type=valid_date,
+                        help='first invoice date (payment date for receipts), YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', type=valid_date, help='last date to include, YYYY-MM-DD')
+    parser.add_argument('--client', dest='client_id', type=int, help='only this client id')
+    parser.add_argument('--status', choices=['pending', 'paid'], help='only invoices with this status')
+    parser.add_argument('-o', '--output', help='ZIP file to write (default: <kind>s_<date>.zip)')
+    parser.add_argument('--database', help='database file to use (default: Config.DATABASE_PATH)')
+
+    args = parser.parse_args()
+    if args.database:
+        Config.DATABASE_PATH = os.path.abspath(args.database)
+    if args.status and args.kind == 'receipt':
+        parser.error('--status only applies to invoices')
+
+    filters = {'date_from': args.date_from, 'date_to': args.date_to, 'client_id': args.client_id, 'status': args.status}
+    output = args.output or f"{args.kind}s_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return 0 if export(args.kind, filters, output) else 1
+
+# The render workers are spawned processes that import this module again,
+# so nothing may run at import time
+if __name__ == "__main__":
+    sys.exit(main())
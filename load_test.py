@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+HTTP Load Test for Invoice System
+=================================
+
+Boots the app on a scratch database filled with synthetic data, serves it
+on a local port and drives it with a weighted mix of requests (dashboard,
+list pages, invoice views, search, invoice creates and edits, mark-paid and
+PDF downloads) from many concurrent client threads, optionally spread over
+several processes. Reports per route throughput, latency percentiles and
+error rates, plus the SQLITE_BUSY errors the server ran into.
+
+Afterwards the database is checked: every invoice the clients created must
+exist exactly once, every paid invoice must have exactly one receipt,
+invoice and receipt numbers must be unique and gapless, and the
+dashboard totals must match the tables.
+So with a write-heavy mix it doubles as a stress test for concurrent
+invoice numbering. The exit status is 1 if any check fails.
+
+Your real database and PDFs are never touched.
+
+Usage:
+    python load_test.py [--duration 30] [--threads 16] [--processes 1] [--invoices 10000]
+    python load_test.py --mix create=4,mark_paid=2,edit=1 --threads 32
+    python load_test.py --server-processes 8 --mix create=1,mark_paid=1
+"""
+
+import argparse
+import http.client
+import logging
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import multiprocessing
+
+from config import Config
+
+# Share of requests per action unless --mix is given
+DEFAULT_MIX = {
+    'dashboard': 10,
+    'invoice_list': 10,
+    'receipt_list': 5,
+    'client_list': 5,
+    'invoice_view': 20,
+    'search': 5,
+    'create': 8,
+    'edit': 4,
+    'mark_paid': 4,
+    'invoice_pdf': 5,
+    'receipt_pdf': 3,
+}
+
+SEARCH_WORDS = ['consulting', 'design', 'migration', 'support', 'audit', 'client', 'work', 'main']
+SERVICES = ['Consulting', 'Design', 'Development', 'Support', 'Training']
+
+VIEW_LOCATION = re.compile(r'/invoice/view/([^/?#]+)')
+
+class Client:
+    """One client thread's connection details and random choices"""
+
+    def __init__(self, base_url, seed, shared):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.rng = random.Random(seed)
+        self.shared = shared
+
+    def request(self, method, path, form=None):
+        """(status, Location, Content-Type) of one request on a fresh connection"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            body = urllib.parse.urlencode(form) if form else None
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status, response.getheader('Location') or '', response.getheader('Content-Type') or ''
+        finally:
+            conn.close()
+
+    def invoice_form(self, client_count):
+        form = {
+            'client_id': self.rng.randint(1, client_count),
+            'invoice_date': date.today().isoformat(),
+        }
+        for index in range(self.rng.randint(1, 5)):
+            form[f'line_items[{index}][service_name]'] = self.rng.choice(SERVICES)
+            form[f'line_items[{index}][service_description]'] = 'Load test work'
+            form[f'line_items[{index}][quantity]'] = self.rng.randint(1, 5)
+            form[f'line_items[{index}][rate]'] = self.rng.randint(50, 500)
+        return form
+
+    def take_pending(self):
+        """A pending invoice this process created, withheld from other threads until put back"""
+        with self.shared['lock']:
+            pending = self.shared['pending']
+            if not pending:
+                return None
+            return pending.pop(self.rng.randrange(len(pending)))
+
+def _page(path):
+    def action(client):
+        status, _, _ = client.request('GET', path)
+        return f'GET {path}', status == 200 or f'HTTP {status}'
+    return action
+
+def _invoice_view(client):
+    number = client.rng.choice(client.shared['invoices'])
+    status, _, _ = client.request('GET', f'/invoice/view/{number}')
+    return 'GET /invoice/view/<number>', status == 200 or f'HTTP {status}'
+
+def _search(client):
+    word = client.rng.choice(SEARCH_WORDS)
+    status, _, _ = client.request('GET', f'/search/?q={word}')
+    return 'GET /search/?q=<word>', status == 200 or f'HTTP {status}'
+
+def _create(client):
+    status, location, _ = client.request('POST', '/invoice/create', client.invoice_form(client.shared['client_count']))
+    match = VIEW_LOCATION.search(location)
+    if status != 302 or not match:
+        # Failures re-render the form (200) with the error flashed
+        return 'POST /invoice/create', f'HTTP {status} {urllib.parse.urlsplit(location).path}'.strip()
+    number = urllib.parse.unquote(match.group(1))
+    with client.shared['lock']:
+        client.shared['created'].append(number)
+        client.shared['pending'].append(number)
+    return 'POST /invoice/create', True
+
+def _edit(client):
+    number = client.take_pending()
+    if number is None:
+        return _create(client)
+    try:
+        status, location, _ = client.request(
+            'POST', f'/invoice/edit/{number}', client.invoice_form(client.shared['client_count'])
+        )
+    finally:
+        with client.shared['lock']:
+            client.shared['pending'].append(number)
+    ok = status == 302 and VIEW_LOCATION.search(location) is not None
+    return 'POST /invoice/edit/<number>', ok or f'HTTP {status}'
+
+def _mark_paid(client):
+    number = client.take_pending()
+    if number is None:
+        return _create(client)
+    status, location, _ = client.request('GET', f'/invoice/mark-paid/{number}')
+    ok = status == 302 and VIEW_LOCATION.search(location) is not None
+    if ok:
+        with client.shared['lock']:
+            client.shared['paid'].append(number)
+    return 'GET /invoice/mark-paid/<number>', ok or f'HTTP {status}'
+
+def _download(kind, numbers):
+    def action(client):
+        number = client.rng.choice(client.shared[numbers])
+        status, _, content_type = client.request('GET', f'/{kind}/download/{number}')
+        ok = status == 200 and content_type.startswith('application/pdf')
+        return f'GET /{kind}/download/<number>', ok or f'HTTP {status} {content_type}'.strip()
+    return action
+
+ACTIONS = {
+    'dashboard': _page('/'),
+    'invoice_list': _page('/invoice/'),
+    'receipt_list': _page('/receipt/'),
+    'client_list': _page('/client/'),
+    'invoice_view': _invoice_view,
+    'search': _search,
+    'create': _create,
+    'edit': _edit,
+    'mark_paid': _mark_paid,
+    'invoice_pdf': _download('invoice', 'invoices'),
+    'receipt_pdf': _download('receipt', 'receipts'),
+}
+
+def _client_thread(base_url, mix, deadline, seed, shared, samples, errors):
+    client = Client(base_url, seed, shared)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        action = ACTIONS[client.rng.choices(names, weights)[0]]
+        started = time.perf_counter()
+        try:
+            route, result = action(client)
+        except Exception as e:
+            route, result = 'connection', type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+        with shared['lock']:
+            samples[route].append((elapsed, result is True))
+            if result is not True:
+                errors[route][result] += 1
+
+def run_clients(base_url, mix, duration, threads, seed, invoices, receipts, client_count):
+    """Drive the server from threads client threads for duration seconds.
+
+    Returns (samples, errors, created, paid): per route lists of
+    (milliseconds, ok) and Counters of failure reasons, and the invoice
+    numbers created and marked paid.
+    """
+    shared = {
+        'lock': threading.Lock(), 'invoices': invoices, 'receipts': receipts, 'client_count': client_count,
+        'created': [], 'pending': [], 'paid': []
+    }
+    samples, errors = defaultdict(list), defaultdict(Counter)
+    deadline = time.monotonic() + duration
+    workers = [
+        threading.Thread(target=_client_thread, args=(base_url, mix, deadline, seed * 1000 + n, shared, samples, errors))
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return dict(samples), dict(errors), shared['created'], shared['paid']
+
+def percentiles(timings):
+    """(p50, p95, p99) of timings"""
+    if len(timings) < 2:
+        return timings[0], timings[0], timings[0]
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+def report(samples, errors, elapsed):
+    print(f"\n{'Route':<36} {'requests':>8} {'errors':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    print("-" * 92)
+    every = []
+    for route in sorted(samples):
+        timings = [ms for ms, _ in samples[route]]
+        failed = sum(1 for _, ok in samples[route] if not ok)
+        every.extend(samples[route])
+        p50, p95, p99 = percentiles(timings)
+        print(f"{route:<36} {len(timings):>8} {failed / len(timings):>7.1%} {len(timings) / elapsed:>8.1f} "
+              f"{p50:>7.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms")
+    if every:
+        failed = sum(1 for _, ok in every if not ok)
+        p50, p95, p99 = percentiles([ms for ms, _ in every])
+        print("-" * 92)
+        print(f"{'All routes':<36} {len(every):>8} {failed / len(every):>7.1%} {len(every) / elapsed:>8.1f} "
+              f"{p50:>7.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms")
+
+    if errors:
+        print("\n❌ Failed requests:")
+        for route in sorted(errors):
+            for reason, count in errors[route].most_common(5):
+                print(f"   {route}: {reason} x{count}")
+
+def check_database(created, paid):
+    """Verify numbering and totals after the run, returns a list of problems"""
+    from models.database import execute_query
+    from models.stats import DashboardStats
+
+    problems = []
+
+    if len(set(created)) != len(created):
+        problems.append(f"{len(created) - len(set(created))} invoice numbers were handed out twice")
+
+    found = set()
+    for start in range(0, len(created), 500):
+        batch = created[start:start + 500]
+        rows = execute_query(
+            f"SELECT invoice_number FROM invoices WHERE invoice_number IN ({','.join('?' * len(batch))})",
+            tuple(batch), fetch='all'
+        )
+        found.update(row['invoice_number'] for row in rows)
+    if len(found) != len(set(created)):
+        problems.append(f"{len(set(created)) - len(found)} created invoices are missing from the database")
+
+    # A failed mark-paid redirects to the invoice too, with the error only flashed
+    not_paid = 0
+    for start in range(0, len(paid), 500):
+        batch = paid[start:start + 500]
+        not_paid += execute_query(
+            f"SELECT COUNT(*) as count FROM invoices WHERE status != 'paid' AND invoice_number IN ({','.join('?' * len(batch))})",
+            tuple(batch), fetch='one'
+        )['count']
+    if not_paid:
+        print(f"\n⚠️  {not_paid} mark-paid requests redirected without paying the invoice (counted as successes above)")
+
+    duplicates = execute_query('''
+        SELECT invoice_id, COUNT(*) as count FROM receipts GROUP BY invoice_id HAVING COUNT(*) > 1
+    ''', fetch='all')
+    if duplicates:
+        problems.append(f"{len(duplicates)} invoices have more than one receipt")
+
+    unpaid = execute_query('''
+        SELECT COUNT(*) as count FROM invoices i
+        WHERE i.status = 'paid' AND NOT EXISTS (SELECT 1 FROM receipts r WHERE r.invoice_id = i.id)
+    ''', fetch='one')['count']
+    if unpaid:
+        problems.append(f"{unpaid} paid invoices have no receipt")
+
+    for table, column in (('invoices', 'invoice_number'), ('receipts', 'receipt_number')):
+        row = execute_query(f"SELECT COUNT(*) - COUNT(DISTINCT {column}) as count FROM {table}", fetch='one')
+        if row['count']:
+            problems.append(f"{row['count']} duplicate values in {table}.{column}")
+
+    # Numbers handed out in the run follow on without gaps
+    if created and '{year' not in Config.INVOICE_NUMBER_FORMAT:
+        head = Config.INVOICE_NUMBER_FORMAT[:Config.INVOICE_NUMBER_FORMAT.index('{seq')].format(prefix=Config.INVOICE_PREFIX)
+        sequence = sorted(int(number[len(head):]) for number in created)
+        gaps = sequence[-1] - sequence[0] + 1 - len(sequence)
+        if gaps:
+            problems.append(f"{gaps} gaps in the invoice numbers created during the run")
+
+    stored = DashboardStats.get()
+    DashboardStats.rebuild()
+    rebuilt = DashboardStats.get()
+    drift = [key for key in rebuilt if abs((stored.get(key) or 0) - (rebuilt[key] or 0)) > 0.005]
+    if drift:
+        problems.append(f"dashboard totals drifted from the tables: {', '.join(drift)}")
+
+    print(f"\n🔢 {len(created):,} invoices created and {len(paid):,} marked paid by the clients")
+    return problems
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action '{name}' (choose from {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the app with concurrent HTTP clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--threads', type=int, default=16, help='client threads per process')
+    parser.add_argument('--processes', type=int, default=1, help='client processes')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weighted actions, e.g. create=4,mark_paid=2 (default: %s)' %
+                        ','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()))
+    parser.add_argument('--invoices', type=int, default=10000, help='invoices in the scratch database before the run')
+    parser.add_argument('--server-processes', type=int, default=0,
+                        help='serve every request from a forked process (at most this many at once) '
+                             'instead of threads; PDFs are then rendered inline')
+    parser.add_argument('--busy-timeout', type=int, help='override DB_BUSY_TIMEOUT_MS, e.g. to provoke SQLITE_BUSY')
+    parser.add_argument('--query-stats', metavar='FILE',
+                        help='collect query statistics (see QUERY_STATS) during the run and write them to FILE')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if args.query_stats and args.server_processes:
+        parser.error('--query-stats needs the threaded server (statistics stay in the request processes)')
+
+    scratch_dir = tempfile.mkdtemp(prefix='invoice_load_')
+    Config.DATABASE_PATH = os.path.join(scratch_dir, 'invoices.db')
+    Config.PDF_FOLDER = os.path.join(scratch_dir, 'pdfs')
+    Config.INVOICE_PDF_FOLDER = os.path.join(Config.PDF_FOLDER, 'invoices')
+    Config.RECEIPT_PDF_FOLDER = os.path.join(Config.PDF_FOLDER, 'receipts')
+    Config.PDF_CACHE_FOLDER = os.path.join(Config.PDF_FOLDER, 'cache')
+    Config.METRICS_DIR = os.path.join(scratch_dir, 'metrics')
+    if args.busy_timeout is not None:
+        Config.DB_BUSY_TIMEOUT_MS = args.busy_timeout
+    if args.server_processes:
+        # A forked request process would otherwise start a worker pool of its own
+        Config.PDF_RENDER_WORKERS = 0
+    if args.query_stats:
+        Config.QUERY_STATS = True
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    from models.database import busy_error_count, close_pools, execute_query
+    from scale_benchmark import bulk_load
+    from services.query_stats import QueryStats
+    from services.render_service import RenderService
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('services.request_timing').setLevel(logging.ERROR)  # Latencies are reported below
+    server = None
+    try:
+        app = create_app()
+        print(f"🏗️  Filling the scratch database with {args.invoices:,} invoices...")
+        bulk_load(args.invoices, 5, random.Random(args.seed))
+
+        invoices = [row['invoice_number'] for row in execute_query(
+            "SELECT invoice_number FROM invoices ORDER BY random() LIMIT 1000", fetch='all')]
+        receipts = [row['receipt_number'] for row in execute_query(
+            "SELECT receipt_number FROM receipts ORDER BY random() LIMIT 1000", fetch='all')]
+        client_count = execute_query("SELECT MAX(id) as count FROM clients", fetch='one')['count']
+        close_pools()  # Forked request processes must not share the loader's connections
+        QueryStats.reset()  # Only the requests count, not the bulk load
+
+        if args.server_processes:
+            server = make_server('127.0.0.1', 0, app, threaded=False, processes=args.server_processes)
+        else:
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        total_threads = args.threads * args.processes
+        print(f"\n🚀 {total_threads} clients ({args.processes} process(es) x {args.threads} threads) "
+              f"for {args.duration:g}s against {base_url}")
+        client_args = (base_url, args.mix, args.duration, args.threads)
+        data_args = (invoices, receipts, client_count)
+        started = time.perf_counter()
+        if args.processes == 1:
+            results = [run_clients(*client_args, args.seed, *data_args)]
+        else:
+            with ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [pool.submit(run_clients, *client_args, args.seed + n, *data_args) for n in range(args.processes)]
+                results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        samples, errors, created, paid = defaultdict(list), defaultdict(Counter), [], []
+        for process_samples, process_errors, process_created, process_paid in results:
+            for route, values in process_samples.items():
+                samples[route].extend(values)
+            for route, reasons in process_errors.items():
+                errors[route].update(reasons)
+            created.extend(process_created)
+            paid.extend(process_paid)
+
+        report(samples, errors, elapsed)
+        if args.server_processes:
+            print("\n⏳ SQLITE_BUSY errors: not counted with --server-processes (they happen in the request processes)")
+        else:
+            print(f"\n⏳ SQLITE_BUSY errors: {busy_error_count()}")
+
+        server.shutdown()
+        server = None
+        if args.query_stats:
+            QueryStats.dump(args.query_stats)
+            print(f"💾 Query statistics written to {args.query_stats}")
+
+        problems = check_database(created, paid)
+        if problems:
+            for problem in problems:
+                print(f"❌ {problem}")
+            sys.exit(1)
+        print("✅ Numbers unique, every paid invoice has one receipt, dashboard totals consistent")
+    finally:
+        if server is not None:
+            server.shutdown()
+        RenderService.shutdown()
+        close_pools()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
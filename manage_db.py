@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Database Management Utility for Invoice System
+==============================================
+
+Command line helpers for looking after the SQLite database.
+
+Commands:
+- status    Show the schema version and any pending migrations
+- migrate   Apply pending schema migrations (run this before deploying a new
+            version with AUTO_MIGRATE=0 so the app starts without migrating)
+- rebuild-stats
+            Recompute the dashboard summary tables from the base tables
+- explain   Run every model query against a scratch database and show its
+            query plan, failing if any of them scans a whole table or sorts
+            in a temporary B-tree instead of using an index
+
+Usage:
+    python manage_db.py status
+    python manage_db.py migrate [--database path/to/invoices.db]
+    python manage_db.py rebuild-stats
+    python manage_db.py explain
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from config import Config
+
+def use_scratch_database():
+    """Point the app at a fresh database (and PDF cache) in a temporary directory"""
+    scratch_dir = tempfile.mkdtemp(prefix='invoice_db_')
+    Config.DATABASE_PATH = os.path.join(scratch_dir, 'invoices.db')
+    Config.PDF_CACHE_FOLDER = os.path.join(scratch_dir, 'pdf_cache')
+    return scratch_dir
+
+def seed_sample_data():
+    """Create a contractor, clients, invoices and a receipt to query against"""
+    from models.contractor import Contractor
+    from models.client import Client
+    from models.invoice import Invoice
+
+    Contractor.create_or_update_contractor({
+        'name': 'Sample Contractor', 'address': '1 Main St', 'email': 'me@example.com',
+        'phone': '555-0100', 'tax_id': '', 'personal_tax_id': ''
+    })
+    for index in range(3):
+        Client.create_client({
+            'name': f'Client {index}', 'address': 'Somewhere', 'email': f'client{index}@example.com',
+            'phone': '555-0101'
+        })
+
+    line_items = [
+        {'service_name': 'Consulting', 'service_description': 'Advice', 'quantity': 2, 'rate': 100},
+        {'service_name': 'Support', 'service_description': '', 'quantity': 1, 'rate': 50},
+    ]
+    numbers = []
+    for index in range(4):
+        numbers.append(Invoice.create_invoice({
+            'client_id': 1 + index % 2, 'contractor_id': 1, 'invoice_date': '2026-01-15',
+            'leave_date_blank': 0, 'line_items': line_items
+        }))
+    return numbers
+
+def exercise_models(invoice_numbers):
+    """Call every model method that touches the database"""
+    from models.contractor import Contractor
+    from models.client import Client
+    from models.invoice import Invoice
+    from models.receipt import Receipt
+    from models.search import Search
+
+    pending, paid, deleted = invoice_numbers[0], invoice_numbers[1], invoice_numbers[2]
+    receipt_number = Invoice.record_payment(paid)
+    invoice = Invoice.get_invoice_by_number(paid)
+
+    Contractor.get_contractor()
+    Client.get_all_clients()
+    for sort in Client.SORTS:
+        page = Client.get_all_clients(page_size=2, sort=sort)
+        Client.get_all_clients(page_size=2, cursor=page.next_cursor, sort=sort)
+    Client.get_client_by_id(1)
+    Client.get_client_count()
+    Client.update_client(2, {'name': 'Client 2', 'address': 'Elsewhere', 'email': 'client2@example.com', 'phone': '555-0102'})
+    Client.delete_client(1)
+    Invoice.get_all_invoices()
+    for sort in Invoice.SORTS:
+        page = Invoice.get_all_invoices(page_size=2, sort=sort)
+        Invoice.get_all_invoices(page_size=2, cursor=page.next_cursor, sort=sort)
+        Invoice.get_all_invoices(page_size=2, cursor=page.next_cursor, backwards=True, sort=sort, status='pending')
+    Invoice.get_all_invoices(page_size=2, client_id=2, status='pending')
+    Invoice.get_recent_invoices(5)
+    for filters in ({}, {'date_from': '2026-01-01', 'date_to': '2026-01-31'}, {'client_id': 2}, {'status': 'pending'},
+                    {'date_from': '2026-01-01', 'date_to': '2026-01-31', 'client_id': 2, 'status': 'pending'}):
+        Invoice.count_for_export(**filters)
+        list(Invoice.iter_invoice_numbers(batch_size=2, **filters))
+    Invoice.get_invoice_by_number(pending)
+    Invoice.get_invoice_for_pdf(pending)
+    list(Invoice.iter_line_items(invoice['id'], batch_size=1))
+    Invoice.get_invoice_stats()
+    Invoice.can_edit_invoice(pending)
+    Invoice.update_invoice(pending, {
+        'client_id': 2, 'invoice_date': '2026-01-16', 'leave_date_blank': 0,
+        'line_items': [{'service_name': 'Consulting', 'quantity': 1, 'rate': 90}]
+    })
+    Invoice.delete_invoice(deleted)
+    Receipt.get_all_receipts()
+    for sort in Receipt.SORTS:
+        page = Receipt.get_all_receipts(page_size=1, sort=sort)
+        Receipt.get_all_receipts(page_size=1, cursor=page.next_cursor, sort=sort)
+    Receipt.get_receipt_by_number(receipt_number)
+    Receipt.get_receipt_by_invoice_id(invoice['id'])
+    Receipt.get_receipt_stats()
+    Receipt.get_recent_receipts(5)
+    for filters in ({}, {'date_from': '2026-01-01', 'date_to': '2099-12-31'}, {'client_id': 2}):
+        Receipt.count_for_export(**filters)
+        list(Receipt.iter_receipt_numbers(batch_size=1, **filters))
+    Search.search('consult')
+    Search.search('client')
+    Search.search('nothing matches this')
+    Search.search(paid)
+
+def status():
+    """Show the schema version and pending migrations"""
+    from models.database import connection
+    from models.migrations import LATEST_VERSION, get_schema_version, pending_migrations
+
+    if not os.path.exists(Config.DATABASE_PATH):
+        print(f"💾 Database: NOT FOUND ({Config.DATABASE_PATH})")
+        return True
+
+    with connection() as conn:
+        version = get_schema_version(conn)
+        pending = pending_migrations(conn)
+
+    print(f"💾 Database: {Config.DATABASE_PATH}")
+    print(f"📐 Schema version: {version} (latest {LATEST_VERSION})")
+    if not pending:
+        print("✅ Schema is up to date")
+    for pending_version, description, _ in pending:
+        print(f"⏳ Pending migration {pending_version}: {description}")
+    return True
+
+def migrate():
+    """Apply pending migrations"""
+    from models.database import connection
+    from models.migrations import get_schema_version, run_migrations
+
+    os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
+
+    def progress(description, done, total):
+        if total:
+            print(f"   {description}: {done:,}/{total:,} ({done * 100 // total}%)")
+        else:
+            print(f"🔧 {description}")
+
+    with connection() as conn:
+        applied = run_migrations(conn, progress=progress)
+        version = get_schema_version(conn)
+
+    if applied:
+        print(f"✅ Applied {len(applied)} migration(s), schema is now at version {version}")
+    else:
+        print(f"✅ Schema is already up to date (version {version})")
+    return True
+
+def rebuild_stats():
+    """Recompute the dashboard summary tables"""
+    from models.database import init_db
+    from models.stats import DashboardStats
+
+    init_db()
+    DashboardStats.rebuild()
+    print("✅ Dashboard statistics rebuilt")
+    return True
+
+def explain():
+    """Show the query plan of every model query and flag unindexed ones"""
+    from models.database import (
+        init_db, add_query_listener, remove_query_listener,
+        explain_query_plan, plan_problems, close_pools
+    )
+
+    scratch_dir = use_scratch_database()
+    try:
+        init_db()
+        invoice_numbers = seed_sample_data()
+
+        captured = []
+        def capture(query, params, duration):
+            captured.append((query, params))
+
+        add_query_listener(capture)
+        try:
+            exercise_models(invoice_numbers)
+        finally:
+            remove_query_listener(capture)
+
+        failures = 0
+        seen = set()
+        for query, params in captured:
+            sql = ' '.join(query.split())
+            if sql in seen:
+                continue
+            seen.add(sql)
+
+            plan = explain_query_plan(query, params)
+            problems = plan_problems(plan, query)
+            failures += bool(problems)
+
+            print(f"{'❌' if problems else '✅'} {sql}")
+            for detail in plan:
+                marker = '  <-- not index-backed' if detail in problems else ''
+                print(f"      {detail}{marker}")
+
+        print("=" * 60)
+        if failures:
+            print(f"❌ {failures} of {len(seen)} queries are not fully index-backed")
+            return False
+        print(f"✅ All {len(seen)} model queries use an index")
+        return True
+    finally:
+        close_pools()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice System database utilities')
+    parser.add_argument('--database', help='database file to use (default: Config.DATABASE_PATH)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='show the schema version and pending migrations')
+    subparsers.add_parser('migrate', help='apply pending schema migrations')
+    subparsers.add_parser('rebuild-stats', help='recompute the dashboard summary tables')
+    subparsers.add_parser('explain', help='check that every model query is index-backed')
+
+    args = parser.parse_args()
+    if args.database:
+        Config.DATABASE_PATH = os.path.abspath(args.database)
+
+    commands = {'status': status, 'migrate': migrate, 'rebuild-stats': rebuild_stats, 'explain': explain}
+    return 0 if commands[args.command]() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
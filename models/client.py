@@ -1,4 +1,7 @@
 from models.database import execute_query
+from models.stats import DashboardStats
+from models.pagination import Sort, fetch_all, fetch_page
+from services.pdf_cache import PdfCache
 
 class Client:
     def __init__(self, name, address=None, email=None, phone=None):
@@ -7,11 +10,33 @@ class Client:
         self.email = email
         self.phone = phone
     
+    # List sort orders, each backed by an index (see models/migrations.py)
+    SORTS = {
+        'name': Sort([('name', 'name'), ('id', 'id')]),
+        'name_desc': Sort([('name', 'name'), ('id', 'id')], descending=True),
+    }
+    
     @staticmethod
-    def get_all_clients():
-        """Get all clients ordered by name"""
-        query = "SELECT * FROM clients ORDER BY name"
-        return execute_query(query, fetch='all')
+    def get_all_clients(page_size=None, cursor=None, backwards=False, sort='name'):
+        """Get clients, ordered by name unless another sort is given.
+        
+        Without page_size every client is returned; with page_size a Page of
+        rows continuing from cursor is returned instead.
+        """
+        query = "SELECT * FROM clients"
+        sort_order = Client.SORTS.get(sort, Client.SORTS['name'])
+        if page_size is None:
+            return fetch_all(query, sort_order)
+        
+        return fetch_page(
+            query, sort_order, page_size=page_size, cursor=cursor, backwards=backwards,
+            total=Client.get_client_count()
+        )
+    
+    @staticmethod
+    def get_client_count():
+        """Get the number of clients from the dashboard summary"""
+        return DashboardStats.get().get('client_count', 0)
     
     @staticmethod
     def get_client_by_id(client_id):
@@ -38,7 +63,21 @@ class Client:
             WHERE id=?
         '''
         params = (data['name'], data['address'], data['email'], data['phone'], client_id)
-        return execute_query(query, params)
+        result = execute_query(query, params)
+        
+        # Cached PDFs are keyed by their content, so the old versions of the
+        # client's documents are never served again; free their space
+        documents = execute_query('''
+            SELECT i.invoice_number, r.receipt_number
+            FROM invoices i
+            LEFT JOIN receipts r ON r.invoice_id = i.id
+            WHERE i.client_id = ?
+        ''', (client_id,), fetch='all')
+        for document in documents:
+            PdfCache.invalidate('invoice', document['invoice_number'])
+            if document['receipt_number']:
+                PdfCache.invalidate('receipt', document['receipt_number'])
+        return result
     
     @staticmethod
     def delete_client(client_id):
@@ -1,4 +1,5 @@
 from models.database import execute_query
+from services.pdf_cache import PdfCache
 
 class Contractor:
     def __init__(self, name, address=None, email=None, phone=None, tax_id=None, personal_tax_id=None):
@@ -41,7 +42,12 @@ class Contractor:
                 data['phone'], data['tax_id'], data['personal_tax_id']
             )
         
-        return execute_query(query, params)
+        result = execute_query(query, params)
+        
+        # Cached PDFs are keyed by their content, so the old versions are
+        # never served again; the contractor is on every document, so free them all
+        PdfCache.clear()
+        return result
     
     @staticmethod
     def get_contractor_dict():
@@ -1,157 +1,345 @@
 import sqlite3
 import os
-from flask import current_app
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_request_context, request
 
-def get_db_connection():
-    """Get database connection"""
+# Pools are keyed by (pid, database path, readonly) so forked workers never
+# share a connection with their parent and a changed DATABASE_PATH gets
+# fresh connections.
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Holds the connection of the unit of work open on the current thread
+_local = threading.local()
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Timestamps are stored as fixed-width local-time text so that comparisons
+# against a bound cutoff are plain index range scans
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Plan steps that are acceptable full scans (single-row tables)
+FULL_SCAN_ALLOWED = {'contractor_info'}
+
+_query_listeners = []
+
+# SQLITE_BUSY errors this process ran into: the database stayed locked by
+# another connection for longer than DB_BUSY_TIMEOUT_MS
+SQLITE_BUSY = 5
+_busy_errors = 0
+_busy_lock = threading.Lock()
+
+def _open_connection(database_path, readonly=False):
+    """Open a new SQLite connection and apply the startup PRAGMAs once"""
     from config import Config
-    conn = sqlite3.connect(Config.DATABASE_PATH)
+    conn = sqlite3.connect(
+        database_path,
+        timeout=Config.DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False  # Connections move between threads via the pool
+    )
     conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+    
+    if not readonly:
+        conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT_MS)}')
+    conn.execute(f'PRAGMA cache_size = -{int(Config.DB_CACHE_SIZE_KB)}')
+    conn.execute(f'PRAGMA mmap_size = {int(Config.DB_MMAP_SIZE)}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
     return conn
 
-def init_db():
-    """Initialize database with all tables"""
-    from config import Config
+class ConnectionPool:
+    """A small LIFO pool of SQLite connections for one database file"""
     
-    # Ensure data directory exists
-    os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
+    def __init__(self, database_path, readonly=False, max_size=8):
+        self.database_path = database_path
+        self.readonly = readonly
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        # Usage counters for the metrics endpoint
+        self.in_use = 0
+        self.opened = 0
+        self._counts_lock = threading.Lock()
+    
+    def acquire(self):
+        """Take an idle connection, opening a new one if none is available"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            if has_request_context():
+                # Reported by the request timing as connections opened
+                g._db_connections_opened = g.get('_db_connections_opened', 0) + 1
+            conn = _open_connection(self.database_path, self.readonly)
+            with self._counts_lock:
+                self.opened += 1
+        with self._counts_lock:
+            self.in_use += 1
+        return conn
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        with self._counts_lock:
+            self.in_use -= 1
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
     
-    # Create contractor_info table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS contractor_info (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            address TEXT,
-            email TEXT,
-            phone TEXT,
-            tax_id TEXT,
-            personal_tax_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    def stats(self):
+        """Connections idle in the pool, lent out, and opened so far"""
+        with self._counts_lock:
+            return {'idle': self._idle.qsize(), 'in_use': self.in_use, 'opened': self.opened, 'max_size': self.max_size}
     
-    # Create clients table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clients (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            address TEXT,
-            email TEXT,
-            phone TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+def get_pool(readonly=False):
+    """Get the connection pool for the configured database"""
+    from config import Config
+    key = (os.getpid(), Config.DATABASE_PATH, readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(Config.DATABASE_PATH, readonly, Config.DB_POOL_SIZE)
+                _pools[key] = pool
+    return pool
+
+def pool_stats():
+    """stats() of this process's pools for the configured database, by readonly flag"""
+    from config import Config
+    with _pools_lock:
+        pools = [pool for (pid, path, _), pool in _pools.items() if pid == os.getpid() and path == Config.DATABASE_PATH]
+    return {pool.readonly: pool.stats() for pool in pools}
+
+def close_pools():
+    """Close all idle pooled connections (e.g. after deleting the database)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+@contextmanager
+def connection(readonly=False):
+    """Borrow a pooled connection.
     
-    # Create invoices table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS invoices (
-            id INTEGER PRIMARY KEY,
-            invoice_number TEXT UNIQUE NOT NULL,
-            client_id INTEGER,
-            contractor_id INTEGER,
-            invoice_date DATE,
-            leave_date_blank INTEGER DEFAULT 0,
-            total REAL NOT NULL,
-            date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'pending',
-            FOREIGN KEY (client_id) REFERENCES clients (id),
-            FOREIGN KEY (contractor_id) REFERENCES contractor_info (id)
-        )
-    ''')
+    Inside a request the connection is bound to the request and reused by
+    every query until teardown; outside a request it goes straight back to
+    the pool when the block exits.
+    """
+    if has_request_context():
+        connections = g.setdefault('_db_connections', {})
+        conn = connections.get(readonly)
+        if conn is None:
+            conn = get_pool(readonly).acquire()
+            connections[readonly] = conn
+        yield conn
+        return
     
-    # Create invoice_items table for multiple line items per invoice
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS invoice_items (
-            id INTEGER PRIMARY KEY,
-            invoice_id INTEGER NOT NULL,
-            service_name TEXT NOT NULL,
-            service_description TEXT,
-            quantity INTEGER DEFAULT 1,
-            rate REAL NOT NULL,
-            amount REAL NOT NULL,
-            sort_order INTEGER DEFAULT 0,
-            FOREIGN KEY (invoice_id) REFERENCES invoices (id) ON DELETE CASCADE
-        )
-    ''')
+    pool = get_pool(readonly)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def release_request_connections(exception=None):
+    """Return the connections bound to the current request to their pools"""
+    connections = g.pop('_db_connections', None)
+    if connections:
+        for readonly, conn in connections.items():
+            get_pool(readonly).release(conn)
+
+@contextmanager
+def transaction():
+    """Run a block as one atomic unit of work.
+    
+    The write lock is taken up front (BEGIN IMMEDIATE) and every
+    execute_query call made inside the block on this thread joins the
+    transaction instead of committing on its own. The block commits once on
+    success and rolls back on any exception; nested blocks join the
+    outermost one.
+    """
+    conn = getattr(_local, 'transaction', None)
+    if conn is not None:
+        yield conn
+        return
     
-    # Create receipts table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS receipts (
-            id INTEGER PRIMARY KEY,
-            invoice_id INTEGER,
-            receipt_number TEXT UNIQUE NOT NULL,
-            paid_amount REAL NOT NULL,
-            leave_date_blank INTEGER DEFAULT 0,
-            payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (invoice_id) REFERENCES invoices (id)
-        )
-    ''')
+    with connection() as conn:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            _count_busy(e)
+            raise
+        _local.transaction = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            if isinstance(e, sqlite3.Error):
+                _count_busy(e)
+            conn.rollback()
+            raise
+        finally:
+            _local.transaction = None
+
+def timestamp(value=None):
+    """Format a datetime (default: now) the way timestamps are stored"""
+    return (value or datetime.now()).strftime(TIMESTAMP_FORMAT)
+
+def add_query_listener(listener):
+    """Register a callable(query, params, duration) run after every execute_query"""
+    _query_listeners.append(listener)
+
+def remove_query_listener(listener):
+    """Unregister a listener added with add_query_listener"""
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+def _notify_listeners(query, params, started):
+    duration = time.perf_counter() - started
+    for listener in list(_query_listeners):
+        listener(query, params, duration)
+
+def _count_busy(error):
+    """Count a sqlite3 error if it is SQLITE_BUSY"""
+    global _busy_errors
+    code = getattr(error, 'sqlite_errorcode', None)  # Python 3.11+
+    if code is not None:
+        busy = code & 0xff == SQLITE_BUSY  # Extended codes such as SQLITE_BUSY_SNAPSHOT too
+    else:
+        busy = 'database is locked' in str(error)
+    if busy:
+        with _busy_lock:
+            _busy_errors += 1
+
+def busy_error_count():
+    """Number of SQLITE_BUSY errors this process has run into"""
+    return _busy_errors
+
+def get_db_connection(readonly=False):
+    """Get a pooled database connection (release it with get_pool().release)"""
+    return get_pool(readonly).acquire()
+
+def _is_read_query(query):
+    """Check if a statement only reads data"""
+    return query.lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH', 'EXPLAIN')
+
+def _use_readonly(query):
+    """Reads issued while serving a GET request go to a query_only connection"""
+    return has_request_context() and request.method in READ_METHODS and _is_read_query(query)
+
+def init_db(progress=None):
+    """Initialize the database, applying any pending schema migrations.
     
-    # If there are any legacy invoices without line items, migrate them
-    # Check if we have invoices but no invoice items (legacy data)
-    cursor.execute('SELECT COUNT(*) as invoice_count FROM invoices')
-    invoice_count = cursor.fetchone()['invoice_count']
+    When the schema is already current this is a single PRAGMA read.
+    """
+    from config import Config
+    from models.migrations import LATEST_VERSION, get_schema_version, run_migrations
     
-    cursor.execute('SELECT COUNT(*) as item_count FROM invoice_items')
-    item_count = cursor.fetchone()['item_count']
+    # Ensure data directory exists
+    os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
     
-    # If we have invoices but no items, migrate legacy data
-    if invoice_count > 0 and item_count == 0:
-        print("Migrating legacy invoice data to new line items structure...")
+    with connection() as conn:
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return
         
-        # Get all invoices that have the old structure
-        cursor.execute('''
-            SELECT id, service_name, service_description, quantity, rate, total
-            FROM invoices 
-            WHERE service_name IS NOT NULL
-        ''')
-        legacy_invoices = cursor.fetchall()
-        
-        for invoice in legacy_invoices:
-            # Create a line item for each legacy invoice
-            cursor.execute('''
-                INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
-                VALUES (?, ?, ?, ?, ?, ?, 0)
-            ''', (
-                invoice['id'],
-                invoice['service_name'],
-                invoice['service_description'],
-                invoice['quantity'] or 1,
-                invoice['rate'],
-                invoice['total']
-            ))
-        
-        # Remove the old columns from invoices table (optional - for cleanup)
-        # Note: SQLite doesn't support DROP COLUMN directly, so we'll leave them for now
-        print(f"Migrated {len(legacy_invoices)} legacy invoices to new structure")
+        if not Config.AUTO_MIGRATE:
+            raise RuntimeError(
+                "Database schema is out of date - run 'python manage_db.py migrate' before starting the app"
+            )
+        run_migrations(conn, progress=progress or print_progress)
+
+def print_progress(description, done, total):
+    """Default migration progress reporter"""
+    if total:
+        print(f"{description}: {done}/{total}")
+    else:
+        print(description)
+
+def explain_query_plan(query, params=None):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    with connection() as conn:
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {query}', params or ()).fetchall()
+    return [row['detail'] for row in rows]
+
+def _table_aliases(query):
+    """Map the aliases in a query's FROM and JOIN clauses to their tables"""
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', query, re.I):
+        if alias and alias.upper() not in ('WHERE', 'ON', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'GROUP', 'ORDER', 'LIMIT', 'USING'):
+            aliases[alias] = table
+    return aliases
+
+def plan_problems(plan, query=None):
+    """List the plan steps that scan a whole table or sort in a temp B-tree.
     
-    conn.commit()
-    conn.close()
+    Plans name tables by their alias; pass the query to have aliases of
+    FULL_SCAN_ALLOWED tables recognised.
+    """
+    aliases = _table_aliases(query) if query else {}
+    problems = []
+    for detail in plan:
+        scan = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        # Full-text MATCH lookups show up as a SCAN of the virtual table
+        index_backed = 'USING' in detail or 'VIRTUAL TABLE INDEX' in detail
+        table = scan and aliases.get(scan.group(1), scan.group(1))
+        if scan and not index_backed and table not in FULL_SCAN_ALLOWED:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
 
 def execute_query(query, params=None, fetch=None):
     """Execute a database query with proper error handling"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        
+    started = time.perf_counter()
+    conn = getattr(_local, 'transaction', None)
+    if conn is not None:
+        # Part of an open unit of work: the transaction commits or rolls back
+        cursor = conn.execute(query, params or ())
         if fetch == 'one':
             result = cursor.fetchone()
         elif fetch == 'all':
             result = cursor.fetchall()
         else:
             result = cursor.lastrowid
-        
-        conn.commit()
+        _notify_listeners(query, params, started)
         return result
-    except sqlite3.Error as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
\ No newline at end of file
+    
+    with connection(readonly=_use_readonly(query)) as conn:
+        try:
+            cursor = conn.cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            
+            if fetch == 'one':
+                result = cursor.fetchone()
+            elif fetch == 'all':
+                result = cursor.fetchall()
+            else:
+                result = cursor.lastrowid
+            
+            conn.commit()
+            _notify_listeners(query, params, started)
+            return result
+        except sqlite3.Error as e:
+            conn.rollback()
+            _count_busy(e)
+            raise e
\ No newline at end of file
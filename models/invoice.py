@@ -1,7 +1,35 @@
-from models.database import execute_query
-from datetime import datetime
+from models.database import execute_query, transaction, timestamp
+import hashlib
+import json
+from models.sequence import NumberSequence
+from models.stats import DashboardStats
+from models.pagination import Sort, fetch_all, fetch_page
+from services.pdf_cache import PdfCache
 from config import Config
 
+LINE_ITEM_INSERT = '''
+    INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Service names shown in list pages before the rest are counted instead
+SERVICES_SUMMARY_ITEMS = 3
+
+def summarize_services(names):
+    """Build the invoices.services_summary text, e.g. 'A, B, C (+2 more)'"""
+    names = list(names)
+    summary = ', '.join(names[:SERVICES_SUMMARY_ITEMS])
+    if len(names) > SERVICES_SUMMARY_ITEMS:
+        summary += f' (+{len(names) - SERVICES_SUMMARY_ITEMS} more)'
+    return summary
+
+def _digest_line_item(digest, item):
+    """Add one line item to a hashlib digest of an invoice's items"""
+    digest.update(json.dumps(item, sort_keys=True).encode('utf-8'))
+
+class LineItemsChanged(Exception):
+    """A large invoice's line items changed between loading it and rendering them"""
+
 class Invoice:
     def __init__(self, client_id, contractor_id, invoice_date, line_items):
         self.client_id = client_id
@@ -10,22 +38,132 @@ class Invoice:
         self.line_items = line_items
         self.total = sum(item['quantity'] * item['rate'] for item in line_items)
     
+    # List sort orders, each backed by an index (see models/migrations.py)
+    SORTS = {
+        'newest': Sort([('i.date_created', 'date_created'), ('i.id', 'id')], descending=True),
+        'oldest': Sort([('i.date_created', 'date_created'), ('i.id', 'id')]),
+        'number': Sort([('i.invoice_number', 'invoice_number')]),
+        'amount': Sort([('i.total', 'total'), ('i.id', 'id')], descending=True),
+    }
+    
+    # Bulk export order; invoice_date is never NULL (see models/migrations.py),
+    # which the keyset comparison would never match
+    EXPORT_SORT = Sort([('i.invoice_date', 'invoice_date'), ('i.id', 'id')])
+    
+    # Line item display order
+    LINE_ITEM_SORT = Sort([('sort_order', 'sort_order'), ('id', 'id')])
+    
+    @staticmethod
+    def get_all_invoices(page_size=None, cursor=None, backwards=False, sort='newest', status=None, client_id=None):
+        """Get invoices with client information.
+        
+        Without page_size every matching invoice is returned; with page_size
+        a Page of rows continuing from cursor is returned instead.
+        """
+        query = '''
+            SELECT i.invoice_number, c.name, 
+                   i.services_summary as services,
+                   i.total, i.invoice_date, i.status, r.receipt_number, i.id, i.date_created
+            FROM invoices i
+            JOIN clients c ON i.client_id = c.id
+            LEFT JOIN receipts r ON i.id = r.invoice_id
+        '''
+        conditions, params = [], []
+        if status:
+            conditions.append('i.status = ?')
+            params.append(status)
+        if client_id:
+            conditions.append('i.client_id = ?')
+            params.append(client_id)
+        
+        sort_order = Invoice.SORTS.get(sort, Invoice.SORTS['newest'])
+        if page_size is None:
+            return fetch_all(query, sort_order, conditions, params)
+        
+        return fetch_page(
+            query, sort_order, conditions, params, page_size, cursor, backwards,
+            total=Invoice.count_invoices(status, client_id)
+        )
+    
+    @staticmethod
+    def count_invoices(status=None, client_id=None):
+        """Count invoices, from the dashboard summary unless filtering by client"""
+        if client_id:
+            query = "SELECT COUNT(*) as count FROM invoices WHERE client_id = ?"
+            params = [client_id]
+            if status:
+                query += " AND status = ?"
+                params.append(status)
+            return execute_query(query, params, fetch='one')['count']
+        
+        summary = DashboardStats.get()
+        if status in ('pending', 'paid'):
+            return summary.get(f'{status}_invoices', 0)
+        if status:
+            return execute_query("SELECT COUNT(*) as count FROM invoices WHERE status = ?", (status,), fetch='one')['count']
+        return summary.get('total_invoices', 0)
+    
+    @staticmethod
+    def _export_filter(date_from=None, date_to=None, client_id=None, status=None, in_export_order=False):
+        """SQL conditions for the bulk export filter (dates are inclusive)"""
+        # When reading in export order, the unary + keeps SQLite from using
+        # the client/status indexes, so it walks idx_invoices_invoice_date in
+        # order and every batch continues where the last one stopped instead
+        # of sorting the whole selection again
+        column = '+i.{}' if in_export_order else 'i.{}'
+        conditions, params = [], []
+        if date_from:
+            conditions.append('i.invoice_date >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append('i.invoice_date <= ?')
+            params.append(date_to)
+        if client_id:
+            conditions.append(f"{column.format('client_id')} = ?")
+            params.append(client_id)
+        if status:
+            conditions.append(f"{column.format('status')} = ?")
+            params.append(status)
+        return conditions, params
+    
     @staticmethod
-    def get_all_invoices():
-        """Get all invoices with client information"""
+    def count_for_export(date_from=None, date_to=None, client_id=None, status=None):
+        """Count the invoices matching a bulk export filter"""
+        conditions, params = Invoice._export_filter(date_from, date_to, client_id, status)
+        query = f"SELECT COUNT(*) as count FROM invoices i {'WHERE ' + ' AND '.join(conditions) if conditions else ''}"
+        return execute_query(query, params, fetch='one')['count']
+    
+    @staticmethod
+    def iter_invoice_numbers(date_from=None, date_to=None, client_id=None, status=None, batch_size=500):
+        """Yield the numbers of matching invoices by invoice date, reading a batch at a time"""
+        conditions, params = Invoice._export_filter(date_from, date_to, client_id, status, in_export_order=True)
+        select = "SELECT i.invoice_number, i.invoice_date, i.id FROM invoices i"
+        cursor = None
+        while True:
+            page = fetch_page(select, Invoice.EXPORT_SORT, conditions, params, batch_size, cursor)
+            for row in page:
+                yield row['invoice_number']
+            if not page.next_cursor:
+                return
+            cursor = page.next_cursor
+    
+    @staticmethod
+    def get_recent_invoices(limit=5):
+        """Get the most recently created invoices"""
         query = '''
             SELECT i.invoice_number, c.name, 
-                   (SELECT GROUP_CONCAT(ii.service_name, ', ') FROM invoice_items ii WHERE ii.invoice_id = i.id LIMIT 3) as services,
+                   i.services_summary as services,
                    i.total, i.invoice_date, i.status, r.receipt_number
             FROM invoices i
             JOIN clients c ON i.client_id = c.id
             LEFT JOIN receipts r ON i.id = r.invoice_id
-            ORDER BY i.date_created DESC
+            ORDER BY i.date_created DESC, i.id DESC
+            LIMIT ?
         '''
-        return execute_query(query, fetch='all')
+        return execute_query(query, (limit,), fetch='all')
     
     @staticmethod
-    def get_invoice_by_number(invoice_number):
+    def get_invoice_by_number(invoice_number, with_line_items=True):
         """Get invoice by invoice number with full details including line items"""
         # Get invoice header
         query = '''
@@ -41,6 +179,9 @@ class Invoice:
         '''
         invoice = execute_query(query, (invoice_number,), fetch='one')
         
+        if invoice and not with_line_items:
+            return dict(invoice)
+        
         if invoice:
             # Get line items
             items_query = '''
@@ -59,124 +200,188 @@ class Invoice:
         return None
     
     @staticmethod
-    def create_invoice(data):
-        """Create a new invoice with multiple line items"""
-        # Generate invoice number
-        count_query = "SELECT COUNT(*) as count FROM invoices"
-        count_result = execute_query(count_query, fetch='one')
-        invoice_number = f"{Config.INVOICE_PREFIX}{(count_result['count'] + 1):04d}"
+    def iter_line_items(invoice_id, batch_size=500):
+        """Yield the line items of an invoice in display order, reading a batch at a time"""
+        select = '''
+            SELECT id, sort_order, service_name, service_description, quantity, rate, amount
+            FROM invoice_items
+        '''
+        cursor = None
+        while True:
+            page = fetch_page(select, Invoice.LINE_ITEM_SORT, ['invoice_id = ?'], [invoice_id], batch_size, cursor)
+            for row in page:
+                yield {
+                    'service_name': row['service_name'],
+                    'service_description': row['service_description'],
+                    'quantity': row['quantity'],
+                    'rate': row['rate'],
+                    'amount': row['amount']
+                }
+            if not page.next_cursor:
+                return
+            cursor = page.next_cursor
+    
+    @staticmethod
+    def get_invoice_for_pdf(invoice_number):
+        """Get an invoice for rendering as a PDF.
         
-        # Calculate total from line items
-        total = sum(float(item['quantity']) * float(item['rate']) for item in data['line_items'])
+        Invoices with more than LARGE_INVOICE_ITEMS line items come without
+        'line_items'; the PDF reads them with stream_line_items while it is
+        built. They carry the item count and a digest of the items instead,
+        so the PDF cache key still changes whenever an item does.
+        """
+        invoice = Invoice.get_invoice_by_number(invoice_number, with_line_items=False)
+        if not invoice:
+            return None
         
-        # Insert invoice header
-        invoice_query = '''
-            INSERT INTO invoices (invoice_number, client_id, contractor_id, invoice_date, leave_date_blank, total, date_created)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        '''
-        invoice_params = (
-            invoice_number, data['client_id'], data['contractor_id'], 
-            data['invoice_date'], data.get('leave_date_blank', 0), total, datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        )
+        count = execute_query(
+            "SELECT COUNT(*) as count FROM invoice_items WHERE invoice_id = ?", (invoice['id'],), fetch='one'
+        )['count']
+        if count <= Config.LARGE_INVOICE_ITEMS:
+            invoice['line_items'] = list(Invoice.iter_line_items(invoice['id']))
+            return invoice
         
-        invoice_id = execute_query(invoice_query, invoice_params)
+        digest = hashlib.sha256()
+        for item in Invoice.iter_line_items(invoice['id']):
+            _digest_line_item(digest, item)
+        invoice['line_item_count'] = count
+        invoice['line_items_digest'] = digest.hexdigest()
+        return invoice
+    
+    @staticmethod
+    def stream_line_items(invoice):
+        """Yield the line items of a large invoice from get_invoice_for_pdf.
         
-        # Insert line items
-        for index, item in enumerate(data['line_items']):
-            item_query = '''
-                INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            '''
+        The PDF is cached under the digest the invoice was loaded with, so
+        the items are hashed again as they are rendered; LineItemsChanged
+        is raised after the last one if they no longer match.
+        """
+        digest = hashlib.sha256()
+        count = 0
+        for item in Invoice.iter_line_items(invoice['id']):
+            _digest_line_item(digest, item)
+            count += 1
+            yield item
+        if count != invoice['line_item_count'] or digest.hexdigest() != invoice['line_items_digest']:
+            raise LineItemsChanged(f"The line items of invoice {invoice['invoice_number']} changed while it was rendered")
+    
+    @staticmethod
+    def _line_item_rows(invoice_id, line_items):
+        """Build invoice_items parameter rows for executemany"""
+        rows = []
+        for index, item in enumerate(line_items):
             amount = float(item['quantity']) * float(item['rate'])
-            item_params = (
+            rows.append((
                 invoice_id, item['service_name'], item.get('service_description', ''),
                 int(item['quantity']), float(item['rate']), amount, index
+            ))
+        return rows
+    
+    @staticmethod
+    def create_invoice(data):
+        """Create a new invoice with multiple line items"""
+        # Calculate total from line items
+        total = sum(float(item['quantity']) * float(item['rate']) for item in data['line_items'])
+        
+        # Header and line items are written as one unit of work with a single commit
+        with transaction() as conn:
+            # Allocate the invoice number as part of the same transaction
+            invoice_number = NumberSequence.next_number('invoice')
+            
+            # Insert invoice header
+            invoice_query = '''
+                INSERT INTO invoices (invoice_number, client_id, contractor_id, invoice_date, leave_date_blank, total, date_created, services_summary)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            '''
+            invoice_params = (
+                invoice_number, data['client_id'], data['contractor_id'], 
+                data['invoice_date'], data.get('leave_date_blank', 0), total, timestamp(),
+                summarize_services(item['service_name'] for item in data['line_items'])
             )
-            execute_query(item_query, item_params)
+            
+            invoice_id = execute_query(invoice_query, invoice_params)
+            
+            # Insert line items
+            conn.executemany(LINE_ITEM_INSERT, Invoice._line_item_rows(invoice_id, data['line_items']))
         
         return invoice_number
     
     @staticmethod
     def update_invoice(invoice_number, data):
         """Update an existing invoice (only if pending)"""
-        # Get invoice ID
-        invoice = Invoice.get_invoice_by_number(invoice_number)
-        if not invoice or invoice['status'] != 'pending':
-            return False
-        
-        invoice_id = invoice['id']
-        
         # Calculate new total
         total = sum(float(item['quantity']) * float(item['rate']) for item in data['line_items'])
         
-        # Update invoice header
-        update_query = '''
-            UPDATE invoices 
-            SET client_id=?, invoice_date=?, leave_date_blank=?, total=?
-            WHERE id=? AND status='pending'
-        '''
-        execute_query(update_query, (data['client_id'], data['invoice_date'], data.get('leave_date_blank', 0), total, invoice_id))
-        
-        # Delete existing line items
-        execute_query('DELETE FROM invoice_items WHERE invoice_id = ?', (invoice_id,))
-        
-        # Insert new line items
-        for index, item in enumerate(data['line_items']):
-            item_query = '''
-                INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            '''
-            amount = float(item['quantity']) * float(item['rate'])
-            item_params = (
-                invoice_id, item['service_name'], item.get('service_description', ''),
-                int(item['quantity']), float(item['rate']), amount, index
+        with transaction() as conn:
+            # Get invoice ID
+            invoice = execute_query(
+                "SELECT id, status FROM invoices WHERE invoice_number = ?", (invoice_number,), fetch='one'
             )
-            execute_query(item_query, item_params)
+            if not invoice or invoice['status'] != 'pending':
+                return False
+            
+            invoice_id = invoice['id']
+            
+            # Update invoice header
+            update_query = '''
+                UPDATE invoices 
+                SET client_id=?, invoice_date=?, leave_date_blank=?, total=?, services_summary=?
+                WHERE id=? AND status='pending'
+            '''
+            services_summary = summarize_services(item['service_name'] for item in data['line_items'])
+            execute_query(update_query, (
+                data['client_id'], data['invoice_date'], data.get('leave_date_blank', 0), total,
+                services_summary, invoice_id
+            ))
+            
+            # Replace existing line items
+            execute_query('DELETE FROM invoice_items WHERE invoice_id = ?', (invoice_id,))
+            conn.executemany(LINE_ITEM_INSERT, Invoice._line_item_rows(invoice_id, data['line_items']))
         
+        PdfCache.invalidate('invoice', invoice_number)
         return True
     
     @staticmethod
     def mark_invoice_paid(invoice_number):
-        """Mark an invoice as paid"""
-        query = "UPDATE invoices SET status = 'paid' WHERE invoice_number = ?"
-        return execute_query(query, (invoice_number,))
+        """Mark a pending invoice as paid, returns True if this call changed it"""
+        with transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE invoices SET status = 'paid' WHERE invoice_number = ? AND status = 'pending'",
+                (invoice_number,)
+            )
+            changed = cursor.rowcount > 0
+        
+        if changed:
+            PdfCache.invalidate('invoice', invoice_number)
+        return changed
     
     @staticmethod
-    def get_invoice_stats():
-        """Get invoice statistics"""
-        stats = {}
-        
-        # Total invoices
-        query = "SELECT COUNT(*) as count FROM invoices"
-        result = execute_query(query, fetch='one')
-        stats['total_invoices'] = result['count']
+    def record_payment(invoice_number):
+        """Mark an invoice as paid and issue its receipt in one transaction.
         
-        # Pending invoices
-        query = "SELECT COUNT(*) as count FROM invoices WHERE status = 'pending'"
-        result = execute_query(query, fetch='one')
-        stats['pending_invoices'] = result['count']
+        Returns the new receipt number, or None if the invoice does not exist
+        or was already paid (e.g. when mark-paid is submitted twice).
+        """
+        from models.receipt import Receipt
         
-        # Paid invoices
-        query = "SELECT COUNT(*) as count FROM invoices WHERE status = 'paid'"
-        result = execute_query(query, fetch='one')
-        stats['paid_invoices'] = result['count']
-        
-        # Total amount
-        query = "SELECT SUM(total) as total FROM invoices"
-        result = execute_query(query, fetch='one')
-        stats['total_amount'] = result['total'] or 0
-        
-        # Pending amount
-        query = "SELECT SUM(total) as total FROM invoices WHERE status = 'pending'"
-        result = execute_query(query, fetch='one')
-        stats['pending_amount'] = result['total'] or 0
-        
-        # Paid amount
-        query = "SELECT SUM(total) as total FROM invoices WHERE status = 'paid'"
-        result = execute_query(query, fetch='one')
-        stats['paid_amount'] = result['total'] or 0
-        
-        return stats
+        with transaction():
+            invoice = execute_query(
+                "SELECT id, total FROM invoices WHERE invoice_number = ?", (invoice_number,), fetch='one'
+            )
+            if not invoice or not Invoice.mark_invoice_paid(invoice_number):
+                return None
+            return Receipt.create_receipt(invoice['id'], invoice['total'])
+    
+    @staticmethod
+    def get_invoice_stats():
+        """Get invoice statistics from the trigger-maintained summary table"""
+        summary = DashboardStats.get()
+        return {
+            key: summary.get(key, 0) for key in (
+                'total_invoices', 'pending_invoices', 'paid_invoices',
+                'total_amount', 'pending_amount', 'paid_amount'
+            )
+        }
     
     @staticmethod
     def can_edit_invoice(invoice_number):
@@ -188,22 +393,24 @@ class Invoice:
     @staticmethod
     def delete_invoice(invoice_number):
         """Delete an invoice (only if pending and no receipt exists)"""
-        # Check if invoice is pending
-        if not Invoice.can_edit_invoice(invoice_number):
-            return False, "Only pending invoices can be deleted"
-        
-        # Check if receipt exists
-        query = "SELECT COUNT(*) as count FROM receipts r JOIN invoices i ON r.invoice_id = i.id WHERE i.invoice_number = ?"
-        result = execute_query(query, (invoice_number,), fetch='one')
-        if result['count'] > 0:
-            return False, "Cannot delete invoice with existing receipt"
-        
-        # Get invoice ID for deleting line items
-        invoice = Invoice.get_invoice_by_number(invoice_number)
-        if invoice:
-            # Delete line items first (due to foreign key)
-            execute_query('DELETE FROM invoice_items WHERE invoice_id = ?', (invoice['id'],))
-            # Delete invoice
-            execute_query('DELETE FROM invoices WHERE invoice_number = ?', (invoice_number,))
+        with transaction():
+            # Check if invoice is pending
+            if not Invoice.can_edit_invoice(invoice_number):
+                return False, "Only pending invoices can be deleted"
+            
+            # Check if receipt exists
+            query = "SELECT COUNT(*) as count FROM receipts r JOIN invoices i ON r.invoice_id = i.id WHERE i.invoice_number = ?"
+            result = execute_query(query, (invoice_number,), fetch='one')
+            if result['count'] > 0:
+                return False, "Cannot delete invoice with existing receipt"
+            
+            # Get invoice ID for deleting line items
+            invoice = execute_query("SELECT id FROM invoices WHERE invoice_number = ?", (invoice_number,), fetch='one')
+            if invoice:
+                # Delete line items first (due to foreign key)
+                execute_query('DELETE FROM invoice_items WHERE invoice_id = ?', (invoice['id'],))
+                # Delete invoice
+                execute_query('DELETE FROM invoices WHERE invoice_number = ?', (invoice_number,))
         
+        PdfCache.invalidate('invoice', invoice_number)
         return True, "Invoice deleted successfully"
\ No newline at end of file
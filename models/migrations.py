@@ -0,0 +1,549 @@
+"""Versioned schema migrations.
+
+The schema version lives in PRAGMA user_version. Each migration is a
+function registered with @migration(version, description); pending ones run
+in version order and the version is bumped after each one succeeds. Every
+migration must be safe to re-run, since a migration interrupted between
+chunked commits is simply applied again on the next run.
+
+A migration describes the schema of its own version in full, never by
+calling model code: what an old migration creates must not change when the
+models do. Processes starting at the same time take turns through
+_migration_lock().
+"""
+import sqlite3
+from contextlib import contextmanager
+from config import Config
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a schema migration"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return register
+
+def get_schema_version(conn):
+    """Read the schema version of a database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def pending_migrations(conn):
+    """List the (version, description, function) entries not yet applied"""
+    current = get_schema_version(conn)
+    return [entry for entry in MIGRATIONS if entry[0] > current]
+
+@contextmanager
+def _migration_lock(conn):
+    """Hold a lock shared by every process migrating the database of conn.
+
+    Migrations commit as they go, so the database itself cannot stay locked
+    for a whole run. An exclusive transaction on a small file next to it is
+    held instead: SQLite's own file locking, so it works on every platform.
+    """
+    path = conn.execute('PRAGMA database_list').fetchone()[2]
+    if not path:
+        yield  # In-memory database: no other process can see it
+        return
+
+    lock = sqlite3.connect(f'{path}-migrate', timeout=Config.MIGRATION_LOCK_TIMEOUT, isolation_level=None)
+    try:
+        try:
+            lock.execute('BEGIN EXCLUSIVE')
+        except sqlite3.OperationalError:
+            raise RuntimeError(
+                f"Another process has been migrating the database for over {Config.MIGRATION_LOCK_TIMEOUT}s"
+            )
+        yield
+    finally:
+        lock.close()
+
+def run_migrations(conn, progress=None):
+    """Apply all pending migrations in order, returns the versions applied"""
+    def report(description, done=0, total=0):
+        if progress:
+            progress(description, done, total)
+
+    applied = []
+    with _migration_lock(conn):
+        # Read under the lock: another process may have just applied them
+        for version, description, func in pending_migrations(conn):
+            report(f"Applying migration {version}: {description}")
+            func(conn, lambda done, total: report(description, done, total))
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+            applied.append(version)
+    return applied
+
+def _columns(conn, table):
+    """Get the column names of a table"""
+    return {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+def _create_indexes(conn, indexes):
+    """Create (name, definition) indexes, replacing any of the same name defined differently.
+
+    Each migration lists the indexes of its own schema version, so that an
+    old database gains them step by step, before the migrations that need
+    them and never ahead of the columns they cover.
+    """
+    for name, definition in indexes:
+        # SQLite stores the statement without IF NOT EXISTS
+        sql = f'CREATE INDEX {name} ON {definition}'
+        existing = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        if existing and existing[0] == sql:
+            continue
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+    conn.commit()
+
+def _fts5_supported(conn):
+    """Check whether this SQLite build has the FTS5 module"""
+    try:
+        conn.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+    except sqlite3.OperationalError:
+        return False
+    conn.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+@migration(1, 'Create base tables')
+def create_base_tables(conn, progress):
+    cursor = conn.cursor()
+
+    # Create contractor_info table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contractor_info (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            address TEXT,
+            email TEXT,
+            phone TEXT,
+            tax_id TEXT,
+            personal_tax_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create clients table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            address TEXT,
+            email TEXT,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create invoices table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY,
+            invoice_number TEXT UNIQUE NOT NULL,
+            client_id INTEGER,
+            contractor_id INTEGER,
+            invoice_date DATE,
+            leave_date_blank INTEGER DEFAULT 0,
+            total REAL NOT NULL,
+            date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY (client_id) REFERENCES clients (id),
+            FOREIGN KEY (contractor_id) REFERENCES contractor_info (id)
+        )
+    ''')
+
+    # Create invoice_items table for multiple line items per invoice
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id INTEGER PRIMARY KEY,
+            invoice_id INTEGER NOT NULL,
+            service_name TEXT NOT NULL,
+            service_description TEXT,
+            quantity INTEGER DEFAULT 1,
+            rate REAL NOT NULL,
+            amount REAL NOT NULL,
+            sort_order INTEGER DEFAULT 0,
+            FOREIGN KEY (invoice_id) REFERENCES invoices (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Create receipts table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS receipts (
+            id INTEGER PRIMARY KEY,
+            invoice_id INTEGER,
+            receipt_number TEXT UNIQUE NOT NULL,
+            paid_amount REAL NOT NULL,
+            leave_date_blank INTEGER DEFAULT 0,
+            payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+        )
+    ''')
+
+@migration(2, 'Create secondary indexes')
+def create_indexes(conn, progress):
+    _create_indexes(conn, [
+        # Line items of an invoice, in display order
+        ('idx_invoice_items_invoice', 'invoice_items (invoice_id, sort_order)'),
+        # Receipt lookup by invoice and receipt lists/stats by payment date
+        ('idx_receipts_invoice', 'receipts (invoice_id)'),
+        ('idx_receipts_payment_date', 'receipts (payment_date, paid_amount)'),
+        # Invoice lists (newest first), status counts/sums and client checks
+        ('idx_invoices_date_created', 'invoices (date_created)'),
+        ('idx_invoices_status', 'invoices (status, total)'),
+        ('idx_invoices_client', 'invoices (client_id)'),
+        # Client list ordered by name
+        ('idx_clients_name', 'clients (name)'),
+    ])
+
+@migration(3, 'Move legacy single-service invoices to line items')
+def migrate_legacy_line_items(conn, progress):
+    # Databases created before line items kept the service on the invoice row
+    if 'service_name' not in _columns(conn, 'invoices'):
+        return
+
+    pending_query = '''
+        FROM invoices i
+        WHERE i.service_name IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM invoice_items ii WHERE ii.invoice_id = i.id)
+    '''
+    total = conn.execute(f'SELECT COUNT(*) {pending_query}').fetchone()[0]
+
+    # Walk the invoices in id order, one batch and one commit at a time
+    done = 0
+    last_id = 0
+    while True:
+        batch = conn.execute(f'''
+            SELECT i.id, i.service_name, i.service_description, i.quantity, i.rate, i.total
+            {pending_query} AND i.id > ?
+            ORDER BY i.id
+            LIMIT ?
+        ''', (last_id, Config.MIGRATION_BATCH_SIZE)).fetchall()
+        if not batch:
+            break
+
+        conn.executemany('''
+            INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', [
+            (row['id'], row['service_name'], row['service_description'], row['quantity'] or 1, row['rate'], row['total'])
+            for row in batch
+        ])
+        conn.commit()
+
+        done += len(batch)
+        last_id = batch[-1]['id']
+        progress(done, total)
+
+@migration(4, 'Create number sequences table')
+def create_number_sequences(conn, progress):
+    # Counters are seeded lazily from existing numbers on first use
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS number_sequences (
+            name TEXT NOT NULL,
+            period TEXT NOT NULL DEFAULT '',
+            next_value INTEGER NOT NULL,
+            PRIMARY KEY (name, period)
+        )
+    ''')
+
+# The dashboard triggers as migration 5 creates them; a change to them
+# belongs in a new migration
+DASHBOARD_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_invoices_stats_insert AFTER INSERT ON invoices BEGIN
+        UPDATE dashboard_stats SET
+            total_invoices = total_invoices + 1,
+            pending_invoices = pending_invoices + (NEW.status = 'pending'),
+            paid_invoices = paid_invoices + (NEW.status = 'paid'),
+            total_amount = total_amount + NEW.total,
+            pending_amount = pending_amount + (CASE WHEN NEW.status = 'pending' THEN NEW.total ELSE 0 END),
+            paid_amount = paid_amount + (CASE WHEN NEW.status = 'paid' THEN NEW.total ELSE 0 END)
+        WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_invoices_stats_delete AFTER DELETE ON invoices BEGIN
+        UPDATE dashboard_stats SET
+            total_invoices = total_invoices - 1,
+            pending_invoices = pending_invoices - (OLD.status = 'pending'),
+            paid_invoices = paid_invoices - (OLD.status = 'paid'),
+            total_amount = total_amount - OLD.total,
+            pending_amount = pending_amount - (CASE WHEN OLD.status = 'pending' THEN OLD.total ELSE 0 END),
+            paid_amount = paid_amount - (CASE WHEN OLD.status = 'paid' THEN OLD.total ELSE 0 END)
+        WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_invoices_stats_update AFTER UPDATE OF status, total ON invoices BEGIN
+        UPDATE dashboard_stats SET
+            total_invoices = total_invoices - 1,
+            pending_invoices = pending_invoices - (OLD.status = 'pending'),
+            paid_invoices = paid_invoices - (OLD.status = 'paid'),
+            total_amount = total_amount - OLD.total,
+            pending_amount = pending_amount - (CASE WHEN OLD.status = 'pending' THEN OLD.total ELSE 0 END),
+            paid_amount = paid_amount - (CASE WHEN OLD.status = 'paid' THEN OLD.total ELSE 0 END)
+        WHERE id = 1;
+        UPDATE dashboard_stats SET
+            total_invoices = total_invoices + 1,
+            pending_invoices = pending_invoices + (NEW.status = 'pending'),
+            paid_invoices = paid_invoices + (NEW.status = 'paid'),
+            total_amount = total_amount + NEW.total,
+            pending_amount = pending_amount + (CASE WHEN NEW.status = 'pending' THEN NEW.total ELSE 0 END),
+            paid_amount = paid_amount + (CASE WHEN NEW.status = 'paid' THEN NEW.total ELSE 0 END)
+        WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_receipts_stats_insert AFTER INSERT ON receipts BEGIN
+        UPDATE dashboard_stats SET
+            total_receipts = total_receipts + 1,
+            total_received = total_received + NEW.paid_amount
+        WHERE id = 1;
+        INSERT OR IGNORE INTO receipt_daily_stats (day, receipts, amount)
+        VALUES (substr(NEW.payment_date, 1, 10), 0, 0);
+        UPDATE receipt_daily_stats SET
+            receipts = receipts + 1,
+            amount = amount + NEW.paid_amount
+        WHERE day = substr(NEW.payment_date, 1, 10);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_receipts_stats_delete AFTER DELETE ON receipts BEGIN
+        UPDATE dashboard_stats SET
+            total_receipts = total_receipts - 1,
+            total_received = total_received - OLD.paid_amount
+        WHERE id = 1;
+        INSERT OR IGNORE INTO receipt_daily_stats (day, receipts, amount)
+        VALUES (substr(OLD.payment_date, 1, 10), 0, 0);
+        UPDATE receipt_daily_stats SET
+            receipts = receipts - 1,
+            amount = amount - OLD.paid_amount
+        WHERE day = substr(OLD.payment_date, 1, 10);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_receipts_stats_update AFTER UPDATE OF paid_amount, payment_date ON receipts BEGIN
+        UPDATE dashboard_stats SET
+            total_receipts = total_receipts - 1,
+            total_received = total_received - OLD.paid_amount
+        WHERE id = 1;
+        INSERT OR IGNORE INTO receipt_daily_stats (day, receipts, amount)
+        VALUES (substr(OLD.payment_date, 1, 10), 0, 0);
+        UPDATE receipt_daily_stats SET
+            receipts = receipts - 1,
+            amount = amount - OLD.paid_amount
+        WHERE day = substr(OLD.payment_date, 1, 10);
+        UPDATE dashboard_stats SET
+            total_receipts = total_receipts + 1,
+            total_received = total_received + NEW.paid_amount
+        WHERE id = 1;
+        INSERT OR IGNORE INTO receipt_daily_stats (day, receipts, amount)
+        VALUES (substr(NEW.payment_date, 1, 10), 0, 0);
+        UPDATE receipt_daily_stats SET
+            receipts = receipts + 1,
+            amount = amount + NEW.paid_amount
+        WHERE day = substr(NEW.payment_date, 1, 10);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_clients_stats_insert AFTER INSERT ON clients BEGIN
+        UPDATE dashboard_stats SET client_count = client_count + 1 WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_clients_stats_delete AFTER DELETE ON clients BEGIN
+        UPDATE dashboard_stats SET client_count = client_count - 1 WHERE id = 1;
+    END''',
+]
+
+@migration(5, 'Create dashboard statistics tables and triggers')
+def create_dashboard_stats(conn, progress):
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_invoices INTEGER NOT NULL DEFAULT 0,
+            pending_invoices INTEGER NOT NULL DEFAULT 0,
+            paid_invoices INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            pending_amount REAL NOT NULL DEFAULT 0,
+            paid_amount REAL NOT NULL DEFAULT 0,
+            total_receipts INTEGER NOT NULL DEFAULT 0,
+            total_received REAL NOT NULL DEFAULT 0,
+            client_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS receipt_daily_stats (
+            day TEXT PRIMARY KEY,
+            receipts INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Keep the summary up to date from every write path
+    for statement in DASHBOARD_TRIGGERS:
+        conn.execute(statement)
+
+    # Fill it from the existing rows (as DashboardStats.rebuild does)
+    conn.execute("DELETE FROM dashboard_stats")
+    conn.execute('''
+        INSERT INTO dashboard_stats (
+            id, total_invoices, pending_invoices, paid_invoices,
+            total_amount, pending_amount, paid_amount,
+            total_receipts, total_received, client_count
+        )
+        SELECT 1,
+               (SELECT COUNT(*) FROM invoices),
+               (SELECT COUNT(*) FROM invoices WHERE status = 'pending'),
+               (SELECT COUNT(*) FROM invoices WHERE status = 'paid'),
+               (SELECT COALESCE(SUM(total), 0) FROM invoices),
+               (SELECT COALESCE(SUM(total), 0) FROM invoices WHERE status = 'pending'),
+               (SELECT COALESCE(SUM(total), 0) FROM invoices WHERE status = 'paid'),
+               (SELECT COUNT(*) FROM receipts),
+               (SELECT COALESCE(SUM(paid_amount), 0) FROM receipts),
+               (SELECT COUNT(*) FROM clients)
+    ''')
+    conn.execute("DELETE FROM receipt_daily_stats")
+    conn.execute('''
+        INSERT INTO receipt_daily_stats (day, receipts, amount)
+        SELECT substr(payment_date, 1, 10), COUNT(*), SUM(paid_amount)
+        FROM receipts
+        GROUP BY substr(payment_date, 1, 10)
+    ''')
+    conn.commit()
+
+@migration(6, 'Add indexes for sorted and filtered list pages')
+def add_list_indexes(conn, progress):
+    _create_indexes(conn, [
+        ('idx_receipts_payment_date', 'receipts (payment_date)'),
+        # Invoice list sorts and filters
+        ('idx_invoices_total', 'invoices (total)'),
+        ('idx_invoices_status_date', 'invoices (status, date_created)'),
+        ('idx_invoices_status_number', 'invoices (status, invoice_number)'),
+        ('idx_invoices_client', 'invoices (client_id, date_created)'),
+    ])
+
+# The triggers keeping the full-text tables in step with clients and
+# invoice_items, as migration 7 creates them
+SEARCH_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_clients_fts_insert AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts (rowid, name, email, address) VALUES (new.id, new.name, new.email, new.address);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_clients_fts_delete AFTER DELETE ON clients BEGIN
+        INSERT INTO clients_fts (clients_fts, rowid, name, email, address) VALUES ('delete', old.id, old.name, old.email, old.address);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_clients_fts_update AFTER UPDATE OF name, email, address ON clients BEGIN
+        INSERT INTO clients_fts (clients_fts, rowid, name, email, address) VALUES ('delete', old.id, old.name, old.email, old.address);
+        INSERT INTO clients_fts (rowid, name, email, address) VALUES (new.id, new.name, new.email, new.address);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_invoice_items_fts_insert AFTER INSERT ON invoice_items BEGIN
+        INSERT INTO invoice_items_fts (rowid, service_name, service_description) VALUES (new.id, new.service_name, new.service_description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_invoice_items_fts_delete AFTER DELETE ON invoice_items BEGIN
+        INSERT INTO invoice_items_fts (invoice_items_fts, rowid, service_name, service_description) VALUES ('delete', old.id, old.service_name, old.service_description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_invoice_items_fts_update AFTER UPDATE OF service_name, service_description ON invoice_items BEGIN
+        INSERT INTO invoice_items_fts (invoice_items_fts, rowid, service_name, service_description) VALUES ('delete', old.id, old.service_name, old.service_description);
+        INSERT INTO invoice_items_fts (rowid, service_name, service_description) VALUES (new.id, new.service_name, new.service_description);
+    END''',
+]
+
+@migration(7, 'Create full-text search index')
+def create_search_index(conn, progress):
+    # Without FTS5 the app still works, search just returns nothing
+    if not _fts5_supported(conn):
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    # External content: the FTS tables index text and point back at the
+    # base tables by rowid
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+            name, email, address,
+            content='clients', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS invoice_items_fts USING fts5(
+            service_name, service_description,
+            content='invoice_items', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    for statement in SEARCH_TRIGGERS:
+        conn.execute(statement)
+
+    fts_tables = ['clients_fts', 'invoice_items_fts']
+    for done, fts_table in enumerate(fts_tables, start=1):
+        conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+        progress(done, len(fts_tables))
+    conn.commit()
+
+@migration(8, 'Add services summary to invoices')
+def add_services_summary(conn, progress):
+    from models.invoice import summarize_services
+
+    if 'services_summary' not in _columns(conn, 'invoices'):
+        conn.execute("ALTER TABLE invoices ADD COLUMN services_summary TEXT NOT NULL DEFAULT ''")
+        conn.commit()
+
+    # Backfill in chunks, each invoice's line items in display order
+    total = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+    done, last_id = 0, 0
+    while True:
+        batch = [row['id'] for row in conn.execute(
+            "SELECT id FROM invoices WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, Config.MIGRATION_BATCH_SIZE)
+        )]
+        if not batch:
+            break
+
+        names = {invoice_id: [] for invoice_id in batch}
+        for row in conn.execute('''
+            SELECT invoice_id, service_name FROM invoice_items
+            WHERE invoice_id BETWEEN ? AND ?
+            ORDER BY invoice_id, sort_order, id
+        ''', (batch[0], batch[-1])):
+            services = names.get(row['invoice_id'])
+            if services is not None:  # Not items left behind by a deleted invoice
+                services.append(row['service_name'])
+
+        conn.executemany(
+            "UPDATE invoices SET services_summary = ? WHERE id = ?",
+            [(summarize_services(services), invoice_id) for invoice_id, services in names.items()]
+        )
+        conn.commit()
+
+        done += len(batch)
+        last_id = batch[-1]
+        progress(done, total)
+
+@migration(9, 'Add invoice date index for bulk export')
+def add_export_indexes(conn, progress):
+    _create_indexes(conn, [('idx_invoices_invoice_date', 'invoices (invoice_date)')])
+
+@migration(10, 'Fill in missing invoice dates')
+def require_invoice_dates(conn, progress):
+    # Invoices from before dates were required have none; they get the day
+    # they were created, still printed as a blank line. Bulk exports page
+    # through invoices by (invoice_date, id), which never matches NULL.
+    pending_query = 'FROM invoices WHERE invoice_date IS NULL'
+    total = conn.execute(f'SELECT COUNT(*) {pending_query}').fetchone()[0]
+    done = 0
+    while True:
+        updated = conn.execute(f'''
+            UPDATE invoices
+            SET invoice_date = COALESCE(substr(date_created, 1, 10), date('now', 'localtime')),
+                leave_date_blank = 1
+            WHERE id IN (SELECT id {pending_query} LIMIT ?)
+        ''', (Config.MIGRATION_BATCH_SIZE,)).rowcount
+        conn.commit()
+        if not updated:
+            break
+        done += updated
+        progress(done, total)
+
+    # SQLite cannot add NOT NULL to an existing column, so triggers stand in
+    for event in ('INSERT', 'UPDATE OF invoice_date'):
+        name = 'trg_invoices_date_required_' + event.split()[0].lower()
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} BEFORE {event} ON invoices
+            WHEN NEW.invoice_date IS NULL BEGIN
+                SELECT RAISE(ABORT, 'NOT NULL constraint failed: invoices.invoice_date');
+            END
+        ''')
+    conn.commit()
+
+# Keep this last so it sees every registered migration
+LATEST_VERSION = MIGRATIONS[-1][0]
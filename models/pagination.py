@@ -0,0 +1,99 @@
+import base64
+import json
+from models.database import execute_query
+
+class Sort:
+    """A list sort order: (SQL expression, result column) pairs ending in a unique key"""
+
+    def __init__(self, columns, descending=False):
+        self.columns = columns
+        self.descending = descending
+
+class Page:
+    """One page of a keyset-paginated list"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def encode_cursor(values):
+    """Encode the sort key of a row as an opaque URL-safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+# Types a sort key value can have, i.e. that SQLite accepts as a parameter
+CURSOR_TYPES = (str, int, float, type(None))
+
+def decode_cursor(cursor, length=None):
+    """Decode a cursor made by encode_cursor, returns None if it is invalid.
+
+    A cursor comes from the URL, so anything but a list of length plain
+    values (one per sort column) is rejected rather than passed to SQLite.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or (length is not None and len(values) != length):
+        return None
+    if not all(isinstance(value, CURSOR_TYPES) for value in values):
+        return None
+    return values
+
+def _where(conditions):
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+def _order_by(sort, descending):
+    direction = 'DESC' if descending else 'ASC'
+    return ', '.join(f'{expression} {direction}' for expression, _ in sort.columns)
+
+def fetch_all(select, sort, conditions=(), params=()):
+    """Fetch every row of select in sort order"""
+    query = f'{select} {_where(conditions)} ORDER BY {_order_by(sort, sort.descending)}'
+    return execute_query(query, list(params), fetch='all')
+
+def fetch_page(select, sort, conditions=(), params=(), page_size=50, cursor=None, backwards=False, total=None):
+    """Fetch one page of select, continuing after (or before) cursor.
+
+    Instead of OFFSET, the page starts where the cursor row's sort key left
+    off, so with an index on the sort columns every page costs the same no
+    matter how deep into the list it is.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    descending = sort.descending != backwards
+
+    values = decode_cursor(cursor, len(sort.columns)) if cursor else None
+    if values is not None:
+        expressions = ', '.join(expression for expression, _ in sort.columns)
+        placeholders = ', '.join('?' for _ in values)
+        conditions.append(f"({expressions}) {'<' if descending else '>'} ({placeholders})")
+        params.extend(values)
+
+    # One extra row tells us whether there is another page in this direction
+    query = f'{select} {_where(conditions)} ORDER BY {_order_by(sort, descending)} LIMIT ?'
+    rows = execute_query(query, params + [page_size + 1], fetch='all')
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return encode_cursor([row[name] for _, name in sort.columns])
+
+    has_next = True if backwards else has_more
+    has_prev = has_more if backwards else values is not None
+    return Page(
+        rows,
+        next_cursor=key(rows[-1]) if rows and has_next else None,
+        prev_cursor=key(rows[0]) if rows and has_prev else None,
+        total=total
+    )
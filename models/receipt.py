@@ -1,25 +1,83 @@
-from models.database import execute_query
-from datetime import datetime
-from config import Config
+from models.database import execute_query, transaction, timestamp
+from datetime import datetime, timedelta
+from models.sequence import NumberSequence
+from models.stats import DashboardStats
+from models.pagination import Sort, fetch_all, fetch_page
 
 class Receipt:
     def __init__(self, invoice_id, paid_amount):
         self.invoice_id = invoice_id
         self.paid_amount = paid_amount
     
+    # List sort orders, each backed by an index (see models/migrations.py)
+    SORTS = {
+        'newest': Sort([('r.payment_date', 'payment_date'), ('r.id', 'id')], descending=True),
+        'oldest': Sort([('r.payment_date', 'payment_date'), ('r.id', 'id')]),
+        'number': Sort([('r.receipt_number', 'receipt_number')]),
+    }
+    
+    # Bulk export order
+    EXPORT_SORT = Sort([('r.payment_date', 'payment_date'), ('r.id', 'id')])
+    
     @staticmethod
-    def get_all_receipts():
-        """Get all receipts with invoice and client information"""
+    def get_all_receipts(page_size=None, cursor=None, backwards=False, sort='newest'):
+        """Get receipts with invoice and client information.
+        
+        Without page_size every receipt is returned; with page_size a Page of
+        rows continuing from cursor is returned instead.
+        """
         query = '''
             SELECT r.receipt_number, i.invoice_number, c.name, 
-                   (SELECT GROUP_CONCAT(ii.service_name, ', ') FROM invoice_items ii WHERE ii.invoice_id = i.id LIMIT 3) as services,
-                   r.paid_amount, r.payment_date
+                   i.services_summary as services,
+                   r.paid_amount, r.payment_date, r.id
             FROM receipts r
             JOIN invoices i ON r.invoice_id = i.id
             JOIN clients c ON i.client_id = c.id
-            ORDER BY r.payment_date DESC
         '''
-        return execute_query(query, fetch='all')
+        sort_order = Receipt.SORTS.get(sort, Receipt.SORTS['newest'])
+        if page_size is None:
+            return fetch_all(query, sort_order)
+        
+        total = DashboardStats.get().get('total_receipts', 0)
+        return fetch_page(query, sort_order, page_size=page_size, cursor=cursor, backwards=backwards, total=total)
+    
+    @staticmethod
+    def _export_filter(date_from=None, date_to=None, client_id=None):
+        """SQL conditions for the bulk export filter (payment dates are inclusive)"""
+        conditions, params = [], []
+        if date_from:
+            conditions.append('r.payment_date >= ?')
+            params.append(date_from)
+        if date_to:
+            # payment_date is a timestamp, so compare against the next day
+            conditions.append('r.payment_date < ?')
+            params.append((datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        if client_id:
+            # Checked per receipt while walking the payment_date index in order
+            conditions.append('EXISTS (SELECT 1 FROM invoices i WHERE i.id = r.invoice_id AND i.client_id = ?)')
+            params.append(client_id)
+        return conditions, params
+    
+    @staticmethod
+    def count_for_export(date_from=None, date_to=None, client_id=None):
+        """Count the receipts matching a bulk export filter"""
+        conditions, params = Receipt._export_filter(date_from, date_to, client_id)
+        query = f"SELECT COUNT(*) as count FROM receipts r {'WHERE ' + ' AND '.join(conditions) if conditions else ''}"
+        return execute_query(query, params, fetch='one')['count']
+    
+    @staticmethod
+    def iter_receipt_numbers(date_from=None, date_to=None, client_id=None, batch_size=500):
+        """Yield the numbers of matching receipts by payment date, reading a batch at a time"""
+        conditions, params = Receipt._export_filter(date_from, date_to, client_id)
+        select = "SELECT r.receipt_number, r.payment_date, r.id FROM receipts r"
+        cursor = None
+        while True:
+            page = fetch_page(select, Receipt.EXPORT_SORT, conditions, params, batch_size, cursor)
+            for row in page:
+                yield row['receipt_number']
+            if not page.next_cursor:
+                return
+            cursor = page.next_cursor
     
     @staticmethod
     def get_receipt_by_number(receipt_number):
@@ -69,26 +127,25 @@ class Receipt:
     @staticmethod
     def create_receipt(invoice_id, paid_amount):
         """Create a new receipt"""
-        # Generate receipt number
-        count_query = "SELECT COUNT(*) as count FROM receipts"
-        count_result = execute_query(count_query, fetch='one')
-        receipt_number = f"{Config.RECEIPT_PREFIX}{(count_result['count'] + 1):04d}"
-        
-        # Get the invoice's leave_date_blank setting
-        invoice_query = "SELECT leave_date_blank FROM invoices WHERE id = ?"
-        invoice_result = execute_query(invoice_query, (invoice_id,), fetch='one')
-        leave_date_blank = invoice_result['leave_date_blank'] if invoice_result else 0
-        
-        query = '''
-            INSERT INTO receipts (invoice_id, receipt_number, paid_amount, leave_date_blank, payment_date)
-            VALUES (?, ?, ?, ?, ?)
-        '''
-        params = (
-            invoice_id, receipt_number, paid_amount, leave_date_blank,
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        )
-        
-        execute_query(query, params)
+        with transaction():
+            # Allocate the receipt number as part of the same transaction
+            receipt_number = NumberSequence.next_number('receipt')
+            
+            # Get the invoice's leave_date_blank setting
+            invoice_query = "SELECT leave_date_blank FROM invoices WHERE id = ?"
+            invoice_result = execute_query(invoice_query, (invoice_id,), fetch='one')
+            leave_date_blank = invoice_result['leave_date_blank'] if invoice_result else 0
+            
+            query = '''
+                INSERT INTO receipts (invoice_id, receipt_number, paid_amount, leave_date_blank, payment_date)
+                VALUES (?, ?, ?, ?, ?)
+            '''
+            params = (
+                invoice_id, receipt_number, paid_amount, leave_date_blank,
+                timestamp()
+            )
+            
+            execute_query(query, params)
         return receipt_number
     
     @staticmethod
@@ -100,28 +157,14 @@ class Receipt:
     
     @staticmethod
     def get_receipt_stats():
-        """Get receipt statistics"""
-        stats = {}
-        
-        # Total receipts
-        query = "SELECT COUNT(*) as count FROM receipts"
-        result = execute_query(query, fetch='one')
-        stats['total_receipts'] = result['count']
-        
-        # Total received amount
-        query = "SELECT SUM(paid_amount) as total FROM receipts"
-        result = execute_query(query, fetch='one')
-        stats['total_received'] = result['total'] or 0
-        
-        # Recent receipts (last 30 days)
-        query = '''
-            SELECT COUNT(*) as count FROM receipts 
-            WHERE payment_date >= datetime('now', '-30 days')
-        '''
-        result = execute_query(query, fetch='one')
-        stats['recent_receipts'] = result['count']
-        
-        return stats
+        """Get receipt statistics from the trigger-maintained summary tables"""
+        summary = DashboardStats.get()
+        return {
+            'total_receipts': summary.get('total_receipts', 0),
+            'total_received': summary.get('total_received', 0),
+            # Recent receipts (last 30 days)
+            'recent_receipts': DashboardStats.count_receipts_since(datetime.now() - timedelta(days=30)),
+        }
     
     @staticmethod
     def get_recent_receipts(limit=5):
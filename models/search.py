@@ -0,0 +1,124 @@
+import re
+import sqlite3
+from markupsafe import Markup, escape
+from models.database import execute_query
+
+# snippet() wraps matches in these control characters; they are swapped for
+# <mark> tags only after the rest of the text has been HTML-escaped
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+# Longest search accepted, in terms
+MAX_TERMS = 8
+
+def _highlight(snippet):
+    """Turn an FTS5 snippet into HTML with the matched terms in <mark>"""
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>'))
+
+class Search:
+    """Full-text search over clients and invoice line items.
+
+    The FTS5 tables only index text and point back at the base tables by
+    rowid (external content), and triggers keep them in step with every
+    insert, update and delete. Migration 7 creates them (see
+    models/migrations.py).
+    """
+
+    # FTS5 table -> (content table, indexed columns)
+    TABLES = {
+        'clients_fts': ('clients', ['name', 'email', 'address']),
+        'invoice_items_fts': ('invoice_items', ['service_name', 'service_description']),
+    }
+
+    @staticmethod
+    def build_match(text):
+        """Turn free text into an FTS5 query, or None if it has no terms.
+
+        Every word is quoted, so FTS5 operators typed by the user are
+        searched for literally. The last word is matched as a prefix so
+        results show up while it is still being typed; earlier words are
+        complete and match exactly, which keeps their lookups cheap.
+        """
+        terms = re.findall(r'\w+', text or '')[:MAX_TERMS]
+        if not terms:
+            return None
+        return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+    @staticmethod
+    def search(text, limit=20):
+        """Search clients and invoices, best matches first.
+
+        Returns {'clients': [...], 'invoices': [...]} where every hit is a
+        dictionary with a highlighted 'snippet'. Invoices match on their line
+        items (one hit per invoice) or on a prefix of the invoice number.
+        """
+        results = {'clients': [], 'invoices': []}
+        match = Search.build_match(text)
+        if match is None:
+            return results
+
+        try:
+            results['clients'] = Search._search_clients(match, limit)
+            results['invoices'] = Search._search_invoices(text.strip(), match, limit)
+        except sqlite3.OperationalError as e:
+            # Databases on an SQLite build without FTS5 have no index to search
+            if 'no such table' not in str(e):
+                raise
+        return results
+
+    @staticmethod
+    def _search_clients(match, limit):
+        query = f'''
+            SELECT c.id, c.name, c.email,
+                   snippet(clients_fts, -1, '{_MATCH_START}', '{_MATCH_END}', '…', 12) as snippet
+            FROM clients_fts
+            JOIN clients c ON c.id = clients_fts.rowid
+            WHERE clients_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        '''
+        return [
+            {'id': row['id'], 'name': row['name'], 'email': row['email'], 'snippet': _highlight(row['snippet'])}
+            for row in execute_query(query, (match, limit), fetch='all')
+        ]
+
+    @staticmethod
+    def _search_invoices(text, match, limit):
+        hits = {}
+
+        # An invoice number typed (or partly typed) into the box goes first;
+        # a prefix range over the UNIQUE index on invoice_number
+        number_query = '''
+            SELECT i.id, i.invoice_number, i.status, i.total, i.invoice_date, c.name as client_name
+            FROM invoices i
+            LEFT JOIN clients c ON i.client_id = c.id
+            WHERE i.invoice_number >= ? AND i.invoice_number < ?
+            ORDER BY i.invoice_number
+            LIMIT ?
+        '''
+        for row in execute_query(number_query, (text, text + '\uffff', limit), fetch='all'):
+            hits[row['id']] = dict(row, snippet=_highlight(
+                f"{_MATCH_START}{row['invoice_number']}{_MATCH_END}"
+            ))
+
+        # Line item matches, best first (every match is ranked); several items of one invoice can
+        # match, so read a few extra rows and keep each invoice's best item
+        items_query = f'''
+            SELECT i.id, i.invoice_number, i.status, i.total, i.invoice_date, c.name as client_name,
+                   snippet(invoice_items_fts, -1, '{_MATCH_START}', '{_MATCH_END}', '…', 12) as snippet
+            FROM invoice_items_fts
+            JOIN invoice_items ii ON ii.id = invoice_items_fts.rowid
+            JOIN invoices i ON i.id = ii.invoice_id
+            LEFT JOIN clients c ON i.client_id = c.id
+            WHERE invoice_items_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        '''
+        for row in execute_query(items_query, (match, limit * 4), fetch='all'):
+            if len(hits) >= limit:
+                break
+            if row['id'] not in hits:
+                hits[row['id']] = dict(row, snippet=_highlight(row['snippet']))
+
+        return list(hits.values())[:limit]
@@ -0,0 +1,67 @@
+from datetime import datetime
+from models.database import execute_query, transaction
+from config import Config
+
+class NumberSequence:
+    """Allocates invoice and receipt numbers from the number_sequences table.
+
+    Allocation happens inside the caller's transaction, so a number is only
+    used up if the invoice or receipt insert commits, and concurrent workers
+    can never be handed the same number.
+    """
+
+    # kind -> (table, number column, prefix setting, format setting)
+    KINDS = {
+        'invoice': ('invoices', 'invoice_number', 'INVOICE_PREFIX', 'INVOICE_NUMBER_FORMAT'),
+        'receipt': ('receipts', 'receipt_number', 'RECEIPT_PREFIX', 'RECEIPT_NUMBER_FORMAT'),
+    }
+
+    @staticmethod
+    def next_number(kind, when=None):
+        """Allocate the next formatted number for 'invoice' or 'receipt'"""
+        _, _, prefix_setting, format_setting = NumberSequence.KINDS[kind]
+        prefix = getattr(Config, prefix_setting)
+        number_format = getattr(Config, format_setting)
+        year = (when or datetime.now()).year
+        period = str(year) if '{year' in number_format else ''
+
+        with transaction():
+            seq = NumberSequence._reserve(kind, period, prefix, number_format, year)
+
+        return number_format.format(prefix=prefix, year=year, seq=seq)
+
+    @staticmethod
+    def _reserve(kind, period, prefix, number_format, year):
+        """Take the counter's next value"""
+        row = execute_query(
+            "SELECT next_value FROM number_sequences WHERE name = ? AND period = ?",
+            (kind, period), fetch='one'
+        )
+        if row is None:
+            start = NumberSequence._highest_existing(kind, prefix, number_format, year) + 1
+            execute_query(
+                "INSERT INTO number_sequences (name, period, next_value) VALUES (?, ?, ?)",
+                (kind, period, start + 1)
+            )
+            return start
+
+        execute_query(
+            "UPDATE number_sequences SET next_value = next_value + 1 WHERE name = ? AND period = ?",
+            (kind, period)
+        )
+        return row['next_value']
+
+    @staticmethod
+    def _highest_existing(kind, prefix, number_format, year):
+        """Find the highest sequence value already used, to seed a new counter"""
+        table, column, _, _ = NumberSequence.KINDS[kind]
+        # Everything before {seq} is a fixed prefix, so this is a range scan
+        # over the UNIQUE index on the number column
+        head = number_format[:number_format.index('{seq')].format(prefix=prefix, year=year)
+        query = f'''
+            SELECT MAX(CAST(substr({column}, ?) AS INTEGER)) as highest
+            FROM {table}
+            WHERE {column} >= ? AND {column} < ?
+        '''
+        row = execute_query(query, (len(head) + 1, head, head + '\uffff'), fetch='one')
+        return row['highest'] or 0
@@ -0,0 +1,71 @@
+from datetime import timedelta
+from models.database import execute_query, transaction, timestamp
+
+class DashboardStats:
+    """Dashboard totals kept in a one-row summary table.
+
+    Triggers on invoices, receipts and clients update dashboard_stats and the
+    per-day receipt buckets in receipt_daily_stats, so reading the dashboard
+    costs the same however many invoices there are. The tables and triggers
+    are created by migration 5 (see models/migrations.py).
+    """
+
+    @staticmethod
+    def get():
+        """Get the dashboard summary row as a dictionary"""
+        row = execute_query("SELECT * FROM dashboard_stats WHERE id = 1", fetch='one')
+        return dict(row) if row else {}
+
+    @staticmethod
+    def count_receipts_since(since):
+        """Count receipts paid at or after a datetime.
+
+        Whole days come from the daily buckets; only the partial first day
+        is counted from receipts itself, over the payment_date index.
+        """
+        first_day = since.strftime('%Y-%m-%d')
+        next_day = (since + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        whole_days = execute_query(
+            "SELECT COALESCE(SUM(receipts), 0) as count FROM receipt_daily_stats WHERE day > ?",
+            (first_day,), fetch='one'
+        )
+        partial_day = execute_query(
+            "SELECT COUNT(*) as count FROM receipts WHERE payment_date >= ? AND payment_date < ?",
+            (timestamp(since), next_day), fetch='one'
+        )
+        return whole_days['count'] + partial_day['count']
+
+    @staticmethod
+    def rebuild(conn=None):
+        """Recompute the summary tables from scratch (e.g. after bulk imports)"""
+        if conn is None:
+            with transaction() as conn:
+                return DashboardStats.rebuild(conn)
+
+        conn.execute("DELETE FROM dashboard_stats")
+        conn.execute('''
+            INSERT INTO dashboard_stats (
+                id, total_invoices, pending_invoices, paid_invoices,
+                total_amount, pending_amount, paid_amount,
+                total_receipts, total_received, client_count
+            )
+            SELECT 1,
+                   (SELECT COUNT(*) FROM invoices),
+                   (SELECT COUNT(*) FROM invoices WHERE status = 'pending'),
+                   (SELECT COUNT(*) FROM invoices WHERE status = 'paid'),
+                   (SELECT COALESCE(SUM(total), 0) FROM invoices),
+                   (SELECT COALESCE(SUM(total), 0) FROM invoices WHERE status = 'pending'),
+                   (SELECT COALESCE(SUM(total), 0) FROM invoices WHERE status = 'paid'),
+                   (SELECT COUNT(*) FROM receipts),
+                   (SELECT COALESCE(SUM(paid_amount), 0) FROM receipts),
+                   (SELECT COUNT(*) FROM clients)
+        ''')
+
+        conn.execute("DELETE FROM receipt_daily_stats")
+        conn.execute('''
+            INSERT INTO receipt_daily_stats (day, receipts, amount)
+            SELECT substr(payment_date, 1, 10), COUNT(*), SUM(paid_amount)
+            FROM receipts
+            GROUP BY substr(payment_date, 1, 10)
+        ''')
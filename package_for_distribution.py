@@ -44,6 +44,8 @@ def create_distribution_package():
         
         # Utility scripts
         'reset_data.py',
+        'manage_db.py',
+        'export_pdfs.py',
         
         # Source code directories
         'models/',
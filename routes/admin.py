@@ -0,0 +1,83 @@
+import hmac
+import threading
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, abort
+from config import Config
+from services.memory import MemoryRecords
+from services.profiler import Profiles, Sampler
+from services.query_stats import QueryStats
+
+admin_bp = Blueprint('admin', __name__)
+
+def is_admin_request():
+    """Whether the request may use the admin pages.
+
+    ADMIN_TOKEN must be sent in the X-Admin-Token header or as a bearer
+    token (as Prometheus does); never in the URL, which ends up in access
+    logs. Without ADMIN_TOKEN nobody is let in: behind a reverse proxy
+    every request would look like it came from this machine.
+    """
+    if not Config.ADMIN_TOKEN:
+        return False
+    authorization = request.headers.get('Authorization', '')
+    bearer = authorization[7:] if authorization.startswith('Bearer ') else None
+    token = request.headers.get('X-Admin-Token') or bearer or ''
+    return hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode())
+
+@admin_bp.before_request
+def require_admin():
+    if not is_admin_request():
+        abort(403)
+
+@admin_bp.route('/queries')
+def queries():
+    """Query timings by fingerprint, query plans and N+1 suspects"""
+    return render_template('admin/queries.html', stats=QueryStats.snapshot())
+
+@admin_bp.route('/queries.json')
+def queries_json():
+    """The query statistics as JSON (?download=1 to save them as a file)"""
+    response = jsonify(QueryStats.snapshot())
+    if request.args.get('download'):
+        response.headers['Content-Disposition'] = 'attachment; filename=query_stats.json'
+    return response
+
+@admin_bp.route('/queries/reset', methods=['POST'])
+def reset_queries():
+    """Start collecting query statistics afresh"""
+    QueryStats.reset()
+    flash('Query statistics cleared.', 'success')
+    return redirect(url_for('admin.queries'))
+
+@admin_bp.route('/profile')
+def profile():
+    """Sample every request being served for ?seconds= (default 10), as collapsed stacks"""
+    if not Config.PROFILING:
+        abort(404)
+    if not Profiles.window_lock.acquire(blocking=False):
+        return Response('Another profile is running\n', status=409, mimetype='text/plain')
+    try:
+        seconds = request.args.get('seconds', 10, type=float)
+        interval = request.args.get('interval_ms', type=float)
+        # Every thread serving a request except this one, which only waits
+        sampler = Sampler(interval=interval, max_seconds=seconds, exclude=threading.get_ident()).start().join()
+    finally:
+        Profiles.window_lock.release()
+    response = Response(sampler.collapsed(), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=profile.folded'
+    response.headers['X-Profile-Samples'] = str(sampler.samples)
+    return response
+
+@admin_bp.route('/profile/<profile_id>')
+def request_profile(profile_id):
+    """Collapsed stacks of a request sent with X-Profile, by its X-Profile-Id"""
+    collapsed = Profiles.get(profile_id)
+    if collapsed is None:
+        abort(404)
+    return Response(collapsed, mimetype='text/plain')
+
+@admin_bp.route('/memory')
+def memory():
+    """Peak and retained memory of the latest requests and inline renders, newest first"""
+    if not Config.MEMORY_TRACKING:
+        abort(404)
+    return jsonify(MemoryRecords.latest())
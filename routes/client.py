@@ -1,13 +1,18 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models.client import Client
+from routes.pagination import get_page_args
 
 client_bp = Blueprint('client', __name__)
 
 @client_bp.route('/')
 def list_clients():
-    """List all clients"""
-    clients = Client.get_all_clients()
-    return render_template('clients/list.html', clients=clients)
+    """List clients one page at a time"""
+    page_size, cursor, backwards = get_page_args()
+    sort = request.args.get('sort', 'name')
+    
+    clients = Client.get_all_clients(page_size=page_size, cursor=cursor, backwards=backwards, sort=sort)
+    page_args = {'sort': sort, 'per_page': page_size}
+    return render_template('clients/list.html', clients=clients, page_args=page_args)
 
 @client_bp.route('/add', methods=['GET', 'POST'])
 def add_client():
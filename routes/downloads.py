@@ -0,0 +1,14 @@
+import io
+from flask import send_file
+from services.render_service import RenderService
+from services.request_timing import timed
+
+def send_pdf(kind, number, data, download_name):
+    """Send a document's PDF as a download, rendering it first if needed"""
+    with timed('pdf'):
+        filepath, pdf = RenderService.fetch(kind, number, data)
+    if pdf is not None:
+        # Just rendered in this process: send the bytes, no need to read the file back
+        return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True, download_name=download_name)
+    # Streamed from the cache file
+    return send_file(filepath, mimetype='application/pdf', as_attachment=True, download_name=download_name)
@@ -0,0 +1,76 @@
+import re
+import uuid
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from models.client import Client
+from services.bulk_export import ZipExport, ExportProgress, EXPORT_SOURCES
+
+export_bp = Blueprint('export', __name__)
+
+def _get_export_args():
+    """Read the export kind and filter from the query string, None if invalid"""
+    kind = request.args.get('kind', 'invoice')
+    if kind not in EXPORT_SOURCES:
+        return None, None
+
+    filters = {
+        'date_from': request.args.get('date_from') or None,
+        'date_to': request.args.get('date_to') or None,
+        'client_id': request.args.get('client_id', type=int),
+        'status': request.args.get('status') or None,
+    }
+    for name in ('date_from', 'date_to'):
+        if filters[name]:
+            try:
+                datetime.strptime(filters[name], '%Y-%m-%d')
+            except ValueError:
+                return None, None
+    if filters['status'] not in (None, 'pending', 'paid'):
+        return None, None
+    return kind, filters
+
+@export_bp.route('/')
+def export_form():
+    """Choose the documents to download as a ZIP of PDFs"""
+    clients = Client.get_clients_for_dropdown()
+    return render_template('export/form.html', clients=clients, kind=request.args.get('kind', 'invoice'))
+
+@export_bp.route('/download')
+def download_export():
+    """Stream a ZIP with the PDF of every matching invoice or receipt"""
+    kind, filters = _get_export_args()
+    if kind is None:
+        flash('Invalid export filter!', 'error')
+        return redirect(url_for('export.export_form'))
+
+    # The page polls /progress with an id of its own choosing
+    export_id = request.args.get('export_id', '')
+    if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', export_id):
+        export_id = uuid.uuid4().hex
+
+    def progress(done, failed, total, finished):
+        ExportProgress.update(export_id, done=done, failed=failed, total=total, finished=finished)
+
+    export = ZipExport(kind, filters, progress=progress)
+    if not export.total:
+        flash(f'No {kind}s match this filter.', 'info')
+        return redirect(url_for('export.export_form', kind=kind))
+
+    name_parts = [f'{kind}s'] + [filters[name] for name in ('date_from', 'date_to') if filters[name]]
+    return Response(
+        stream_with_context(iter(export)),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f"attachment; filename={'_'.join(name_parts)}.zip",
+            'X-Export-Id': export_id,
+            'X-Export-Total': str(export.total),
+        }
+    )
+
+@export_bp.route('/progress/<export_id>')
+def export_progress(export_id):
+    """Progress of a running export, as JSON"""
+    job = ExportProgress.get(export_id)
+    if job is None:
+        return jsonify({'error': 'Unknown export'}), 404
+    return jsonify(dict(job, export_id=export_id))
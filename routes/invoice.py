@@ -1,9 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models.invoice import Invoice
 from models.client import Client
 from models.contractor import Contractor
 from models.receipt import Receipt
-from services.pdf_generator import generate_invoice_pdf
+from services.pdf_generator import invoice_pdf_filename
+from services.metrics import Metrics
+from services.render_service import RenderService
+from routes.downloads import send_pdf
+from routes.pagination import get_page_args
 import json
 
 invoice_bp = Blueprint('invoice', __name__)
@@ -16,9 +20,26 @@ def row_to_dict(row):
 
 @invoice_bp.route('/')
 def list_invoices():
-    """List all invoices"""
-    invoices = Invoice.get_all_invoices()
-    return render_template('invoices/list.html', invoices=invoices)
+    """List invoices one page at a time"""
+    page_size, cursor, backwards = get_page_args()
+    sort = request.args.get('sort', 'newest')
+    status = request.args.get('status') or None
+    client_id = request.args.get('client_id', type=int)
+    
+    invoices = Invoice.get_all_invoices(
+        page_size=page_size, cursor=cursor, backwards=backwards,
+        sort=sort, status=status, client_id=client_id
+    )
+    
+    # Query parameters carried over by the pagination links
+    page_args = {'sort': sort, 'per_page': page_size}
+    if status:
+        page_args['status'] = status
+    if client_id:
+        page_args['client_id'] = client_id
+    
+    return render_template('invoices/list.html', invoices=invoices, page_args=page_args,
+                           filtered=bool(status or client_id))
 
 @invoice_bp.route('/create', methods=['GET', 'POST'])
 def create_invoice():
@@ -74,6 +95,8 @@ def create_invoice():
         
         try:
             invoice_number = Invoice.create_invoice(data)
+            Metrics.inc('invoice_invoices_created_total')
+            RenderService.prerender_invoice(invoice_number)
             flash(f'Invoice {invoice_number} created successfully!', 'success')
             return redirect(url_for('invoice.view_invoice', invoice_number=invoice_number))
         except Exception as e:
@@ -158,6 +181,7 @@ def edit_invoice(invoice_number):
         
         try:
             Invoice.update_invoice(invoice_number, data)
+            RenderService.prerender_invoice(invoice_number)
             flash(f'Invoice {invoice_number} updated successfully!', 'success')
             return redirect(url_for('invoice.view_invoice', invoice_number=invoice_number))
         except Exception as e:
@@ -185,14 +209,13 @@ def delete_invoice(invoice_number):
 @invoice_bp.route('/download/<invoice_number>')
 def download_invoice(invoice_number):
     """Download invoice PDF"""
-    invoice = Invoice.get_invoice_by_number(invoice_number)
+    invoice = Invoice.get_invoice_for_pdf(invoice_number)
     if not invoice:
         flash('Invoice not found!', 'error')
         return redirect(url_for('invoice.list_invoices'))
     
     try:
-        filepath = generate_invoice_pdf(invoice)
-        return send_file(filepath, as_attachment=True)
+        return send_pdf('invoice', invoice_number, invoice, invoice_pdf_filename(invoice))
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'error')
         return redirect(url_for('invoice.view_invoice', invoice_number=invoice_number))
@@ -210,12 +233,15 @@ def mark_paid(invoice_number):
         return redirect(url_for('invoice.view_invoice', invoice_number=invoice_number))
     
     try:
-        # Mark invoice as paid
-        Invoice.mark_invoice_paid(invoice_number)
-        
-        # Create receipt
-        receipt_number = Receipt.create_receipt(invoice['id'], invoice['total'])
+        # Mark invoice as paid and create receipt atomically
+        receipt_number = Invoice.record_payment(invoice_number)
+        if receipt_number is None:
+            flash('Invoice is already paid!', 'warning')
+            return redirect(url_for('invoice.view_invoice', invoice_number=invoice_number))
         
+        Metrics.inc('invoice_receipts_issued_total')
+        RenderService.prerender_invoice(invoice_number)
+        RenderService.prerender_receipt(receipt_number)
         flash(f'Invoice marked as paid! Receipt {receipt_number} generated.', 'success')
         return redirect(url_for('invoice.view_invoice', invoice_number=invoice_number))
     except Exception as e:
@@ -14,12 +14,11 @@ def index():
     receipt_stats = Receipt.get_receipt_stats()
     
     # Get recent activities
-    recent_invoices = Invoice.get_all_invoices()[:5]  # Last 5 invoices
+    recent_invoices = Invoice.get_recent_invoices(5)
     recent_receipts = Receipt.get_recent_receipts(5)
     
     # Get client count
-    clients = Client.get_all_clients()
-    client_count = len(clients)
+    client_count = Client.get_client_count()
     
     # Check if contractor is set up
     contractor = Contractor.get_contractor()
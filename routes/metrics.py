@@ -0,0 +1,15 @@
+from flask import Blueprint, Response, abort
+from config import Config
+from routes.admin import is_admin_request
+from services.metrics import Metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Counters and histograms of every running process, in Prometheus format"""
+    if not Config.METRICS:
+        abort(404)
+    if not is_admin_request():
+        abort(403)
+    return Response(Metrics.render(), mimetype='text/plain; version=0.0.4')
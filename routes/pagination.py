@@ -0,0 +1,10 @@
+from flask import request
+from config import Config
+
+def get_page_args():
+    """Read page size, cursor and direction from the query string"""
+    page_size = request.args.get('per_page', Config.PAGE_SIZE, type=int)
+    page_size = max(1, min(page_size, Config.MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor') or None
+    backwards = request.args.get('dir') == 'prev'
+    return page_size, cursor, backwards
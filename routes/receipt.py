@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models.receipt import Receipt
-from services.pdf_generator import generate_receipt_pdf
+from services.pdf_generator import receipt_pdf_filename
+from routes.downloads import send_pdf
+from routes.pagination import get_page_args
 
 receipt_bp = Blueprint('receipt', __name__)
 
@@ -12,9 +14,13 @@ def row_to_dict(row):
 
 @receipt_bp.route('/')
 def list_receipts():
-    """List all receipts"""
-    receipts = Receipt.get_all_receipts()
-    return render_template('receipts/list.html', receipts=receipts)
+    """List receipts one page at a time"""
+    page_size, cursor, backwards = get_page_args()
+    sort = request.args.get('sort', 'newest')
+    
+    receipts = Receipt.get_all_receipts(page_size=page_size, cursor=cursor, backwards=backwards, sort=sort)
+    page_args = {'sort': sort, 'per_page': page_size}
+    return render_template('receipts/list.html', receipts=receipts, page_args=page_args)
 
 @receipt_bp.route('/view/<receipt_number>')
 def view_receipt(receipt_number):
@@ -41,8 +47,7 @@ def download_receipt(receipt_number):
     receipt_dict = row_to_dict(receipt)
     
     try:
-        filepath = generate_receipt_pdf(receipt_dict)
-        return send_file(filepath, as_attachment=True)
+        return send_pdf('receipt', receipt_number, receipt_dict, receipt_pdf_filename(receipt_dict))
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'error')
         return redirect(url_for('receipt.view_receipt', receipt_number=receipt_number))
\ No newline at end of file
@@ -0,0 +1,41 @@
+import time
+from flask import Blueprint, render_template, request, jsonify, url_for
+from models.search import Search
+from config import Config
+
+search_bp = Blueprint('search', __name__)
+
+def _get_search_args():
+    """Read the search text and result limit from the query string"""
+    text = request.args.get('q', '').strip()
+    limit = request.args.get('limit', Config.SEARCH_RESULT_LIMIT, type=int)
+    return text, max(1, min(limit, Config.MAX_SEARCH_RESULT_LIMIT))
+
+@search_bp.route('/')
+def search():
+    """Search clients and invoices"""
+    text, limit = _get_search_args()
+    results = Search.search(text, limit) if text else None
+    return render_template('search/results.html', query=text, results=results)
+
+@search_bp.route('/api')
+def search_api():
+    """Search clients and invoices, returning JSON"""
+    text, limit = _get_search_args()
+    started = time.perf_counter()
+    results = Search.search(text, limit)
+    took_ms = (time.perf_counter() - started) * 1000
+    
+    # Snippets are HTML with the matched terms wrapped in <mark>
+    return jsonify({
+        'query': text,
+        'took_ms': round(took_ms, 2),
+        'clients': [
+            dict(hit, snippet=str(hit['snippet']), url=url_for('client.view_client', client_id=hit['id']))
+            for hit in results['clients']
+        ],
+        'invoices': [
+            dict(hit, snippet=str(hit['snippet']), url=url_for('invoice.view_invoice', invoice_number=hit['invoice_number']))
+            for hit in results['invoices']
+        ]
+    })
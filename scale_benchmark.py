@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Database Scale Benchmark for Invoice System
+===========================================
+
+Fills a throwaway database with realistic volumes of synthetic data (by
+default growing to 10,000 clients, 1,000,000 invoices, about 5,000,000 line
+items and a receipt for every paid invoice) and times the model methods at
+each data size, reporting p50/p95/p99 latencies per method.
+
+Data is bulk loaded on a connection of its own: triggers and secondary
+indexes are dropped during the load and rebuilt afterwards, together with
+the search index and dashboard totals, which is far faster than inserting
+row by row through the models.
+
+Your real database and PDFs are never touched; the scratch database is
+deleted afterwards unless --database is given.
+
+Usage:
+    python scale_benchmark.py [--sizes 10000,100000,1000000] [--iterations 200]
+    python scale_benchmark.py --sizes 1000000 --database /tmp/scale.db [--output results.json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+
+SERVICES = ['Consulting', 'Design', 'Development', 'Support', 'Training', 'Audit', 'Hosting', 'Maintenance']
+DESCRIPTIONS = [
+    'Work performed', 'Monthly retainer', 'Code review and fixes', 'On-site workshop',
+    'Server migration', 'Quarterly security audit', 'Logo and brand design', 'Emergency support call'
+]
+CITIES = ['Springfield', 'Riverside', 'Franklin', 'Greenville', 'Bristol', 'Clinton', 'Fairview', 'Salem']
+
+# Invoices are dated two minutes apart from here, so a million of them span about four years
+START = datetime(2022, 1, 1)
+INVOICE_INTERVAL = timedelta(minutes=2)
+
+BATCH_SIZE = 10000  # Invoices per executemany batch
+CLIENTS_PER_INVOICE = 0.01
+PAID_SHARE = 0.6
+
+def format_number(kind, seq, when):
+    """Invoice or receipt number the way NumberSequence formats it, and its counter period"""
+    from models.sequence import NumberSequence
+
+    _, _, prefix_setting, format_setting = NumberSequence.KINDS[kind]
+    number_format = getattr(Config, format_setting)
+    period = str(when.year) if '{year' in number_format else ''
+    return number_format.format(prefix=getattr(Config, prefix_setting), year=when.year, seq=seq), period
+
+def invoice_number(invoice_id):
+    """Number of a generated invoice (its id is its sequence value)"""
+    return format_number('invoice', invoice_id, START + INVOICE_INTERVAL * invoice_id)[0]
+
+def _schema_objects(conn):
+    """The triggers and managed indexes, as (type, name, sql)"""
+    return conn.execute(r'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type = 'trigger' OR (type = 'index' AND name LIKE 'idx\_%' ESCAPE '\')
+    ''').fetchall()
+
+def bulk_load(invoice_count, items_per_invoice, rng):
+    """Grow the scratch database to invoice_count invoices"""
+    from models.database import close_pools, timestamp
+    from models.invoice import summarize_services
+    from models.search import Search
+    from models.stats import DashboardStats
+
+    # The load needs the database to itself
+    close_pools()
+    conn = sqlite3.connect(Config.DATABASE_PATH, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+
+    first_invoice = conn.execute('SELECT COALESCE(MAX(id), 0) FROM invoices').fetchone()[0] + 1
+    client_count = conn.execute('SELECT COALESCE(MAX(id), 0) FROM clients').fetchone()[0]
+    receipt_count = conn.execute('SELECT COUNT(*) FROM receipts').fetchone()[0]
+    target_clients = max(10, int(invoice_count * CLIENTS_PER_INVOICE))
+    if first_invoice > invoice_count:
+        conn.close()
+        return
+
+    objects = _schema_objects(conn)
+    conn.execute('BEGIN')
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} {name}')
+
+    if not conn.execute('SELECT 1 FROM contractor_info').fetchone():
+        conn.execute(
+            "INSERT INTO contractor_info (id, name, address, email, phone, tax_id) "
+            "VALUES (1, 'Scale Test LLC', '1 Bench Street', 'billing@example.com', '555-0100', '12-3456789')"
+        )
+
+    conn.executemany(
+        "INSERT INTO clients (id, name, address, email, phone) VALUES (?, ?, ?, ?, ?)",
+        [
+            (n, f'Client {n} {rng.choice(SERVICES)} Co', f'{n} Main St\n{rng.choice(CITIES)}',
+             f'client{n}@example.com', f'555-{n % 10000:04d}')
+            for n in range(client_count + 1, target_clients + 1)
+        ]
+    )
+
+    sequences = {}
+    for batch_start in range(first_invoice, invoice_count + 1, BATCH_SIZE):
+        invoices, items, receipts = [], [], []
+        for invoice_id in range(batch_start, min(batch_start + BATCH_SIZE, invoice_count + 1)):
+            created = START + INVOICE_INTERVAL * invoice_id
+            number, period = format_number('invoice', invoice_id, created)
+            sequences[('invoice', period)] = invoice_id + 1
+
+            names = [rng.choice(SERVICES) for _ in range(rng.randint(1, 2 * items_per_invoice - 1))]
+            total = 0
+            for order, name in enumerate(names):
+                quantity, rate = rng.randint(1, 10), float(rng.randint(50, 500))
+                total += quantity * rate
+                items.append((invoice_id, name, rng.choice(DESCRIPTIONS), quantity, rate, quantity * rate, order))
+
+            paid = rng.random() < PAID_SHARE
+            invoices.append((
+                invoice_id, number, rng.randint(1, target_clients), 1, created.strftime('%Y-%m-%d'), total,
+                timestamp(created), 'paid' if paid else 'pending', summarize_services(names)
+            ))
+            if paid:
+                receipt_count += 1
+                paid_at = created + timedelta(days=rng.randint(1, 30))
+                receipt_number, receipt_period = format_number('receipt', receipt_count, paid_at)
+                sequences[('receipt', receipt_period)] = receipt_count + 1
+                receipts.append((invoice_id, receipt_number, total, timestamp(paid_at)))
+
+        conn.executemany('''
+            INSERT INTO invoices (id, invoice_number, client_id, contractor_id, invoice_date, total, date_created, status, services_summary)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', invoices)
+        conn.executemany('''
+            INSERT INTO invoice_items (invoice_id, service_name, service_description, quantity, rate, amount, sort_order)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', items)
+        conn.executemany(
+            "INSERT INTO receipts (invoice_id, receipt_number, paid_amount, payment_date) VALUES (?, ?, ?, ?)", receipts
+        )
+        print(f"\r   {invoices[-1][0]:,} / {invoice_count:,} invoices", end='', flush=True)
+    print()
+
+    print("   Rebuilding indexes, search index and dashboard totals...")
+    for kind, name, sql in objects:
+        if kind == 'index':
+            conn.execute(sql)
+    for kind, name, sql in objects:
+        if kind == 'trigger':
+            conn.execute(sql)
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for fts_table in Search.TABLES:
+        if fts_table in existing:
+            conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+    DashboardStats.rebuild(conn)
+
+    # Numbers continue after the generated ones
+    conn.executemany(
+        "INSERT OR REPLACE INTO number_sequences (name, period, next_value) VALUES (?, ?, ?)",
+        [(name, period, next_value) for (name, period), next_value in sequences.items()]
+    )
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+
+def sample(query, count, rng, params=()):
+    """count random rows of a query's result (which should be small enough to read)"""
+    from models.database import execute_query
+
+    rows = execute_query(query, params, fetch='all')
+    return [rng.choice(rows) for _ in range(count)] if rows else []
+
+def line_items(rng, count=5):
+    return [
+        {'service_name': rng.choice(SERVICES), 'service_description': rng.choice(DESCRIPTIONS),
+         'quantity': rng.randint(1, 10), 'rate': float(rng.randint(50, 500))}
+        for _ in range(count)
+    ]
+
+def cases(invoice_count, iterations, rng):
+    """(method name, call, runs) for everything to time, in order"""
+    from models.client import Client
+    from models.contractor import Contractor
+    from models.invoice import Invoice
+    from models.receipt import Receipt
+    from models.search import Search
+    from models.stats import DashboardStats
+
+    client_count = Client.get_client_count()
+    invoice_ids = [rng.randint(1, invoice_count) for _ in range(iterations)]
+    receipts = sample(
+        "SELECT receipt_number, invoice_id FROM receipts WHERE id IN (%s)" % ','.join(
+            str(rng.randint(1, max(1, int(invoice_count * PAID_SHARE)))) for _ in range(iterations)
+        ), iterations, rng
+    )
+    deep_cursor = Invoice.get_all_invoices(page_size=Config.PAGE_SIZE)
+    for _ in range(20):
+        deep_cursor = Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, cursor=deep_cursor.next_cursor)
+    deep_cursor = deep_cursor.next_cursor
+
+    last = START + INVOICE_INTERVAL * invoice_count
+    month = ((last - timedelta(days=30)).strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d'))
+    few = max(3, iterations // 20)  # Methods reading every client
+
+    def each(values):
+        """Calls take the next value in turn (lists may still be filling up)"""
+        values = iter(values)
+        return lambda func: lambda: func(next(values))
+
+    invoice_numbers = [invoice_number(n) for n in invoice_ids]
+    created, created_clients = [], []
+
+    def create_invoice():
+        created.append(Invoice.create_invoice({
+            'client_id': rng.randint(1, client_count), 'contractor_id': 1,
+            'invoice_date': datetime.now().strftime('%Y-%m-%d'), 'line_items': line_items(rng)
+        }))
+
+    def update_invoice(number):
+        Invoice.update_invoice(number, {
+            'client_id': rng.randint(1, client_count), 'invoice_date': datetime.now().strftime('%Y-%m-%d'),
+            'line_items': line_items(rng)
+        })
+
+    def create_client():
+        created_clients.append(Client.create_client({
+            'name': f'New Client {len(created_clients)}', 'address': '2 High St', 'email': 'new@example.com', 'phone': '555'
+        }))
+
+    contractor = {
+        'name': 'Scale Test LLC', 'address': '1 Bench Street', 'email': 'billing@example.com',
+        'phone': '555-0100', 'tax_id': '12-3456789', 'personal_tax_id': ''
+    }
+
+    return [
+        # Reads
+        ('Contractor.get_contractor', Contractor.get_contractor, iterations),
+        ('Contractor.get_contractor_dict', Contractor.get_contractor_dict, iterations),
+        ('Client.get_all_clients (first page)', lambda: Client.get_all_clients(page_size=Config.PAGE_SIZE), iterations),
+        ('Client.get_all_clients (all rows)', Client.get_all_clients, few),
+        ('Client.get_clients_for_dropdown', Client.get_clients_for_dropdown, few),
+        ('Client.get_client_count', Client.get_client_count, iterations),
+        ('Client.get_client_by_id', each(rng.randint(1, client_count) for _ in range(iterations))(Client.get_client_by_id), iterations),
+        ('Invoice.get_all_invoices (first page)', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE), iterations),
+        ('Invoice.get_all_invoices (page 21)', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, cursor=deep_cursor), iterations),
+        ('Invoice.get_all_invoices (by amount)', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, sort='amount'), iterations),
+        ('Invoice.get_all_invoices (pending)', lambda: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, status='pending'), iterations),
+        ('Invoice.get_all_invoices (one client)', each(rng.randint(1, client_count) for _ in range(iterations))(
+            lambda client_id: Invoice.get_all_invoices(page_size=Config.PAGE_SIZE, client_id=client_id)), iterations),
+        ('Invoice.count_invoices', Invoice.count_invoices, iterations),
+        ('Invoice.count_invoices (pending)', lambda: Invoice.count_invoices(status='pending'), iterations),
+        ('Invoice.count_for_export (30 days)', lambda: Invoice.count_for_export(*month), iterations),
+        ('Invoice.iter_invoice_numbers (30 days)', lambda: sum(1 for _ in Invoice.iter_invoice_numbers(*month)), few),
+        ('Invoice.get_recent_invoices', Invoice.get_recent_invoices, iterations),
+        ('Invoice.get_invoice_by_number', each(invoice_numbers)(Invoice.get_invoice_by_number), iterations),
+        ('Invoice.get_invoice_for_pdf', each(invoice_numbers)(Invoice.get_invoice_for_pdf), iterations),
+        ('Invoice.iter_line_items', each(invoice_ids)(lambda invoice_id: list(Invoice.iter_line_items(invoice_id))), iterations),
+        ('Invoice.can_edit_invoice', each(invoice_numbers)(Invoice.can_edit_invoice), iterations),
+        ('Invoice.get_invoice_stats', Invoice.get_invoice_stats, iterations),
+        ('Receipt.get_all_receipts (first page)', lambda: Receipt.get_all_receipts(page_size=Config.PAGE_SIZE), iterations),
+        ('Receipt.count_for_export (30 days)', lambda: Receipt.count_for_export(*month), iterations),
+        ('Receipt.iter_receipt_numbers (30 days)', lambda: sum(1 for _ in Receipt.iter_receipt_numbers(*month)), few),
+        ('Receipt.get_receipt_by_number', each(row['receipt_number'] for row in receipts)(Receipt.get_receipt_by_number), len(receipts)),
+        ('Receipt.get_receipt_by_invoice_id', each(row['invoice_id'] for row in receipts)(Receipt.get_receipt_by_invoice_id), len(receipts)),
+        ('Receipt.get_receipt_stats', Receipt.get_receipt_stats, iterations),
+        ('Receipt.get_recent_receipts', Receipt.get_recent_receipts, iterations),
+        ('DashboardStats.get', DashboardStats.get, iterations),
+        ('Search.search (word)', lambda: Search.search('consulting'), iterations),
+        ('Search.search (prefix)', lambda: Search.search('migr'), iterations),
+        # Writes, each working on what the one before created
+        ('Invoice.create_invoice', create_invoice, iterations),
+        ('Invoice.update_invoice', each(created)(update_invoice), iterations),
+        ('Invoice.record_payment', each(itertools.islice(created, 0, None, 2))(Invoice.record_payment), iterations // 2),
+        ('Invoice.delete_invoice', each(itertools.islice(created, 1, None, 2))(Invoice.delete_invoice), iterations // 2),
+        ('Client.create_client', create_client, iterations),
+        ('Client.update_client', each(rng.randint(1, client_count) for _ in range(few))(
+            lambda client_id: Client.update_client(client_id, dict(Client.get_client_by_id(client_id)))), few),
+        ('Client.delete_client', each(created_clients)(Client.delete_client), iterations),
+        ('Contractor.create_or_update_contractor', lambda: Contractor.create_or_update_contractor(contractor), few),
+    ]
+
+def percentiles(timings):
+    """(p50, p95, p99) of timings"""
+    if len(timings) < 2:
+        return timings[0], timings[0], timings[0]
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+def run(invoice_count, iterations, rng):
+    """Time every case, returns {method: {runs, p50_ms, p95_ms, p99_ms}}"""
+    results = {}
+    print(f"\n{'Method':<44} {'runs':>5} {'p50':>9} {'p95':>9} {'p99':>9}")
+    print("-" * 80)
+    for name, func, runs in cases(invoice_count, iterations, rng):
+        if not runs:
+            continue
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        p50, p95, p99 = percentiles(timings)
+        results[name] = {'runs': runs, 'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+        print(f"{name:<44} {runs:>5} {p50:>7.2f}ms {p95:>7.2f}ms {p99:>7.2f}ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the model methods on large synthetic databases')
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='comma separated invoice counts; the database is grown to each in turn')
+    parser.add_argument('--items-per-invoice', type=int, default=5, help='average line items per invoice')
+    parser.add_argument('--iterations', type=int, default=200, help='timed calls per method')
+    parser.add_argument('--database', help='build the database here and keep it (reused if it exists)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the generated data')
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(',') if size)
+    rng = random.Random(args.seed)
+
+    scratch_dir = tempfile.mkdtemp(prefix='invoice_scale_')
+    Config.DATABASE_PATH = os.path.abspath(args.database) if args.database else os.path.join(scratch_dir, 'invoices.db')
+    # Writes invalidate cached PDFs; keep that away from the real cache
+    Config.PDF_CACHE_FOLDER = os.path.join(scratch_dir, 'cache')
+
+    from models.database import init_db, close_pools
+
+    results = {'created': datetime.now().isoformat(timespec='seconds'), 'sizes': {}}
+    try:
+        init_db(progress=lambda *_: None)
+        for size in sizes:
+            print(f"\n🏗️  Growing the database to {size:,} invoices...")
+            started = time.perf_counter()
+            bulk_load(size, args.items_per_invoice, rng)
+            print(f"   Done in {time.perf_counter() - started:.1f}s "
+                  f"({os.path.getsize(Config.DATABASE_PATH) / 1024 / 1024:,.0f} MB)")
+
+            print(f"\n📊 {size:,} invoices")
+            results['sizes'][str(size)] = run(size, args.iterations, rng)
+
+        if len(sizes) > 1:
+            print(f"\n{'p95 by invoice count':<44}" + ''.join(f"{size:>12,}" for size in sizes))
+            print("-" * (44 + 12 * len(sizes)))
+            for name in results['sizes'][str(sizes[0])]:
+                row = [results['sizes'][str(size)].get(name, {}).get('p95_ms') for size in sizes]
+                print(f"{name:<44}" + ''.join(f"{value:>10.2f}ms" if value is not None else f"{'-':>12}" for value in row))
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"\n💾 Results written to {args.output}")
+    finally:
+        close_pools()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
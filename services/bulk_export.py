@@ -0,0 +1,186 @@
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from services.pdf_generator import invoice_pdf_filename, receipt_pdf_filename
+from services.render_service import RenderService
+
+def _invoice_source():
+    from models.invoice import Invoice
+    return {
+        'count': Invoice.count_for_export,
+        'numbers': Invoice.iter_invoice_numbers,
+        'load': Invoice.get_invoice_for_pdf,
+        'filename': invoice_pdf_filename,
+        'filters': ('date_from', 'date_to', 'client_id', 'status'),
+    }
+
+def _receipt_source():
+    from models.receipt import Receipt
+
+    def load(receipt_number):
+        receipt = Receipt.get_receipt_by_number(receipt_number)
+        return dict(receipt) if receipt else None
+
+    return {
+        'count': Receipt.count_for_export,
+        'numbers': Receipt.iter_receipt_numbers,
+        'load': load,
+        'filename': receipt_pdf_filename,
+        'filters': ('date_from', 'date_to', 'client_id'),
+    }
+
+EXPORT_SOURCES = {
+    'invoice': _invoice_source,
+    'receipt': _receipt_source,
+}
+
+class _StreamWriter:
+    """Write-only file for ZipFile that hands out what was written so far.
+
+    Without seek() or tell(), ZipFile writes each member's sizes after its
+    data instead of going back to patch the header, so the archive can be
+    sent while it is being built.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Yield what was written since the last call, if anything"""
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks = []
+            yield data
+
+class ExportProgress:
+    """Progress of the exports running in this process, for polling"""
+
+    MAX_JOBS = 100
+
+    _jobs = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def update(export_id, **values):
+        with ExportProgress._lock:
+            job = ExportProgress._jobs.pop(export_id, None) or {'started': time.time()}
+            job.update(values)
+            ExportProgress._jobs[export_id] = job
+            while len(ExportProgress._jobs) > ExportProgress.MAX_JOBS:
+                ExportProgress._jobs.popitem(last=False)
+
+    @staticmethod
+    def get(export_id):
+        with ExportProgress._lock:
+            job = ExportProgress._jobs.get(export_id)
+            return dict(job) if job else None
+
+class ZipExport:
+    """A ZIP archive of the PDFs of every document matching a filter.
+
+    Iterating yields the archive a piece at a time. Documents are rendered
+    across the worker pool (already cached ones are reused) and each PDF is
+    added as soon as it is finished; at most max_in_flight renders are
+    queued at once and the matching numbers are read in batches, so memory
+    use does not grow with the size of the export. Documents that fail to
+    render are listed in errors.txt at the end of the archive.
+    """
+
+    def __init__(self, kind, filters=None, progress=None, max_in_flight=None):
+        self.kind = kind
+        self.source = EXPORT_SOURCES[kind]()
+        self.filters = {
+            name: value for name, value in (filters or {}).items()
+            if value and name in self.source['filters']
+        }
+        self.progress = progress
+        self.max_in_flight = max_in_flight or max(1, Config.PDF_RENDER_WORKERS) * 2
+        self.total = self.source['count'](**self.filters)
+        self.done = 0
+        self.errors = []
+
+    def _report(self, finished=False):
+        if self.progress:
+            self.progress(self.done, len(self.errors), self.total, finished)
+
+    def _add(self, archive, filename, filepath):
+        try:
+            archive.write(filepath, filename)
+            self.done += 1
+        except FileNotFoundError:
+            self.errors.append(f'{filename}: removed from the PDF cache before it was added')
+        self._report()
+
+    def _submit(self, archive, in_flight, number, data, filename, retried=False):
+        """Start rendering a document, adding it right away if it is cached"""
+        try:
+            filepath, future = RenderService.render_async(self.kind, number, data)
+        except Exception as e:
+            self.errors.append(f'{filename}: {e}')
+            self._report()
+            return
+
+        if future is None:
+            self._add(archive, filename, filepath)
+        else:
+            in_flight[future] = (filename, filepath, number, data, retried)
+
+    def _collect(self, archive, in_flight, return_when=FIRST_COMPLETED):
+        """Add finished renders to the archive"""
+        finished, _ = wait(in_flight, timeout=RenderService.WATCH_INTERVAL, return_when=return_when)
+        if not finished:
+            # Renders queued behind other users' are simply waited for;
+            # watching one stops any worker stuck past its deadline
+            RenderService.watch(next(iter(in_flight)))
+            return
+
+        for future in finished:
+            filename, filepath, number, data, retried = in_flight.pop(future)
+            error = future.exception()
+            if RenderService.watch(future) == 'killed':
+                self.errors.append(f'{filename}: did not render within {Config.PDF_RENDER_TIMEOUT}s')
+                self._report()
+            elif isinstance(error, BrokenProcessPool) and not retried:
+                # Another render's worker was stopped, which fails the whole pool
+                self._submit(archive, in_flight, number, data, filename, retried=True)
+            elif error is not None:
+                self.errors.append(f'{filename}: {error}')
+                self._report()
+            else:
+                self._add(archive, filename, filepath)
+
+    def __iter__(self):
+        writer = _StreamWriter()
+        in_flight = {}
+        self._report()
+
+        with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for number in self.source['numbers'](**self.filters):
+                data = self.source['load'](number)
+                if data is None:
+                    continue  # Deleted since the list was read
+                self._submit(archive, in_flight, number, data, self.source['filename'](data))
+                while len(in_flight) >= self.max_in_flight:
+                    self._collect(archive, in_flight)
+                yield from writer.drain()
+
+            while in_flight:
+                self._collect(archive, in_flight)
+                yield from writer.drain()
+
+            if self.errors:
+                archive.writestr('errors.txt', '\n'.join(self.errors) + '\n')
+
+        self._report(finished=True)
+        yield from writer.drain()
@@ -0,0 +1,199 @@
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from flask import g, request
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Usages being measured in this process (tracemalloc's peak is process wide)
+_active = []
+_active_lock = threading.Lock()
+
+# Usages open on the current thread, innermost last
+_local = threading.local()
+
+class MemoryBudgetExceeded(Exception):
+    """A render went over MEMORY_BUDGET_MB with MEMORY_BUDGET_ACTION 'abort'"""
+
+def start():
+    """Start tracing allocations if MEMORY_TRACKING is on"""
+    if Config.MEMORY_TRACKING and not tracemalloc.is_tracing():
+        tracemalloc.start(Config.MEMORY_TRACE_FRAMES)
+
+def _note_peak():
+    """Fold the traced peak into every open usage, so that it can be reset (hold _active_lock)"""
+    current, peak = tracemalloc.get_traced_memory()
+    for usage in _active:
+        usage.peak = max(usage.peak, peak - usage._start)
+    return current
+
+def _snapshot():
+    # Leave out what tracemalloc allocates for its own bookkeeping
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+def _top_sites(baseline):
+    """The MEMORY_TOP_SITES lines that allocated the most since baseline"""
+    # A snapshot takes a megabyte or more, which must not count as anyone's peak
+    with _active_lock:
+        _note_peak()
+        stats = _snapshot().compare_to(baseline, 'lineno')[:Config.MEMORY_TOP_SITES]
+        tracemalloc.reset_peak()
+    return [
+        {'site': str(stat.traceback), 'kb': round(stat.size_diff / 1024, 1), 'blocks': stat.count_diff}
+        for stat in stats if stat.size_diff > 0
+    ]
+
+class MemoryUsage:
+    """Python memory allocated by one request or render, traced with tracemalloc.
+
+    peak is the most memory in use above the level at the start, retained
+    what is still allocated at the end. With sites, top lists the lines
+    that allocated the most of what is retained since baseline, a snapshot
+    taken at the start (or shared with an enclosing usage). Snapshots of a
+    large process take a good fraction of a second, so requests go without
+    and only renders have them. tracemalloc counts the whole process, so
+    when requests run in parallel threads their allocations mix.
+    """
+
+    def __init__(self, label, baseline=None, sites=True):
+        self.label = label
+        self.peak = 0
+        self.retained = 0
+        self.top = []
+        self.over_budget = None
+        with _active_lock:
+            # Resetting the peak would hide the one other open usages are waiting for
+            _note_peak()
+            if baseline is None and sites and Config.MEMORY_TOP_SITES:
+                baseline = _snapshot()
+            tracemalloc.reset_peak()
+            self.baseline = baseline
+            self._start = tracemalloc.get_traced_memory()[0]
+            _active.append(self)
+
+    def _peak_so_far(self):
+        return max(self.peak, tracemalloc.get_traced_memory()[1] - self._start)
+
+    def top_sites(self):
+        return _top_sites(self.baseline) if self.baseline is not None else []
+
+    def check(self, abort=True):
+        """Warn (once) when the budget is exceeded, or raise MemoryBudgetExceeded"""
+        budget = Config.MEMORY_BUDGET_MB
+        if not budget or self.over_budget is not None:
+            return
+        peak = self._peak_so_far()
+        if peak <= budget * MB:
+            return
+        self.over_budget = self.top_sites()
+        logger.warning(json.dumps({
+            'event': 'memory_budget_exceeded', 'label': self.label,
+            'peak_kb': round(peak / 1024), 'budget_mb': budget, 'top': self.over_budget
+        }))
+        if abort and Config.MEMORY_BUDGET_ACTION == 'abort':
+            raise MemoryBudgetExceeded(f'{self.label} used more than {budget} MB of memory')
+
+    def finish(self):
+        current = tracemalloc.get_traced_memory()[0]
+        self.peak = self._peak_so_far()
+        self.retained = current - self._start
+        self.top = self.top_sites()
+        with _active_lock:
+            _active.remove(self)
+        self.baseline = None
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'peak_kb': round(self.peak / 1024, 1),
+            'retained_kb': round(self.retained / 1024, 1),
+            'top': self.top,
+            'over_budget': self.over_budget is not None,
+        }
+
+class MemoryRecords:
+    """The latest MAX_RECORDS measured requests and renders of this process"""
+
+    MAX_RECORDS = 200
+
+    _records = deque(maxlen=MAX_RECORDS)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def add(usage):
+        record = dict(usage.as_dict(), time=time.strftime('%Y-%m-%d %H:%M:%S'))
+        with MemoryRecords._lock:
+            MemoryRecords._records.append(record)
+        logger.info(json.dumps(dict(record, event='memory_usage')))
+
+    @staticmethod
+    def latest():
+        """Records, newest first"""
+        with MemoryRecords._lock:
+            return list(reversed(MemoryRecords._records))
+
+def _open(label, sites=True):
+    stack = _local.__dict__.setdefault('usages', [])
+    baseline = next((usage.baseline for usage in stack if usage.baseline is not None), None)
+    usage = MemoryUsage(label, baseline, sites)
+    stack.append(usage)
+    return usage
+
+def _close(usage):
+    _local.usages.remove(usage)
+    usage.finish()
+    MemoryRecords.add(usage)
+
+@contextmanager
+def track_memory(label):
+    """Measure the block as a MemoryUsage; yields None when tracking is off"""
+    if not tracemalloc.is_tracing():
+        yield None
+        return
+    usage = _open(label)
+    try:
+        yield usage
+    finally:
+        _close(usage)
+
+def check_memory():
+    """Check the usages open on this thread against the budget (cheap when tracking is off)"""
+    if not _active:
+        return
+    # Innermost first: a render's warning comes with its top allocation sites
+    for usage in reversed(getattr(_local, 'usages', ())):
+        usage.check()
+
+def _start():
+    if tracemalloc.is_tracing():
+        g._memory_usage = _open(f'{request.method} {request.path}', sites=False)
+
+def _finish(response):
+    usage = g.get('_memory_usage')
+    if usage is not None:
+        usage.check(abort=False)  # The response is ready: too late to abort
+    return response
+
+def _teardown(exception=None):
+    usage = g.pop('_memory_usage', None)
+    if usage is not None:
+        _close(usage)
+        # Imported here: the metrics module imports the PDF code, which imports this one
+        from services.metrics import Metrics
+        Metrics.observe('invoice_http_request_memory_peak_bytes', usage.peak, endpoint=request.endpoint or 'unmatched')
+
+def init_app(app):
+    """Measure the memory of app's requests if MEMORY_TRACKING is on"""
+    if not Config.MEMORY_TRACKING:
+        return
+    start()
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
@@ -0,0 +1,275 @@
+import bisect
+import json
+import os
+import threading
+import time
+from flask import g, request
+from config import Config
+from models.database import add_query_listener, busy_error_count, pool_stats, remove_query_listener
+from services.pdf_cache import PdfCache
+
+# Histogram bucket upper bounds, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+RENDER_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Peak memory, in bytes (only measured with MEMORY_TRACKING on)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'invoice_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status', None),
+    'invoice_http_request_duration_seconds': ('histogram', 'HTTP request handling time by endpoint', REQUEST_BUCKETS),
+    'invoice_http_request_memory_peak_bytes': ('histogram', 'Peak Python memory of requests by endpoint', MEMORY_BUCKETS),
+    'invoice_db_query_duration_seconds': ('histogram', 'execute_query time by statement', QUERY_BUCKETS),
+    'invoice_db_busy_errors_total': ('counter', 'SQLITE_BUSY errors (database locked past the busy timeout)', None),
+    'invoice_db_pool_connections': ('gauge', 'Pooled database connections by pool and state', None),
+    'invoice_db_pool_connections_opened_total': ('counter', 'Database connections opened by the pools', None),
+    'invoice_pdf_render_duration_seconds': ('histogram', 'PDF render time by document kind', RENDER_BUCKETS),
+    'invoice_pdf_render_memory_peak_bytes': ('histogram', 'Peak Python memory of PDF renders by kind', MEMORY_BUCKETS),
+    'invoice_pdf_render_jobs_total': ('counter', 'PDF render jobs by outcome', None),
+    'invoice_pdf_render_jobs_pending': ('gauge', 'PDF render jobs queued or running', None),
+    'invoice_pdf_cache_events_total': ('counter', 'PDF cache lookups and removals by event', None),
+    'invoice_invoices_created_total': ('counter', 'Invoices created', None),
+    'invoice_receipts_issued_total': ('counter', 'Receipts issued (invoices marked paid)', None),
+}
+
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+class _Series:
+    """One labelled counter or histogram; counts is None for counters"""
+
+    __slots__ = ('lock', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1) if buckets else None
+        self.sum = 0.0
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _labels(pairs, extra=None):
+    pairs = list(pairs) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _alive(pid):
+    if os.name == 'nt':  # os.kill(pid, 0) would end the process there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def remove_dead_snapshots():
+    """Delete the snapshots (and half-written ones) of processes that are no longer running"""
+    if not Config.METRICS_DIR or not os.path.isdir(Config.METRICS_DIR):
+        return
+    for filename in os.listdir(Config.METRICS_DIR):
+        pid = filename.split('.', 1)[0]
+        if pid.isdigit() and filename.endswith(('.json', '.json.tmp')) and not _alive(int(pid)):
+            _remove(os.path.join(Config.METRICS_DIR, filename))
+
+class Metrics:
+    """Counters and histograms of this process, exposed in Prometheus format.
+
+    Series are created on first use with their buckets preallocated, and
+    each update takes only that series' lock. Every process (web workers
+    and PDF render workers alike) writes a snapshot of its series to
+    METRICS_DIR at most every METRICS_FLUSH_SECONDS; /metrics adds up the
+    snapshots of the processes still running. A process that exits takes
+    its counts with it, which Prometheus treats as a counter reset.
+    """
+
+    _series = {}
+    _registry_lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _flushed = 0.0
+
+    @staticmethod
+    def _get(name, labels):
+        key = (name, labels)
+        series = Metrics._series.get(key)
+        if series is None:
+            with Metrics._registry_lock:
+                series = Metrics._series.get(key)
+                if series is None:
+                    series = Metrics._series[key] = _Series(METRICS[name][2])
+        return series
+
+    @staticmethod
+    def inc(name, amount=1, **labels):
+        """Add amount to a counter"""
+        series = Metrics._get(name, tuple(sorted(labels.items())))
+        with series.lock:
+            series.sum += amount
+
+    @staticmethod
+    def observe(name, value, **labels):
+        """Record one value in a histogram"""
+        series = Metrics._get(name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(METRICS[name][2], value)
+        with series.lock:
+            series.counts[index] += 1
+            series.sum += value
+
+    @staticmethod
+    def snapshot():
+        """This process's series as [name, labels, sum, counts] rows"""
+        rows = []
+        for (name, labels), series in list(Metrics._series.items()):
+            with series.lock:
+                rows.append([name, labels, series.sum, list(series.counts) if series.counts else None])
+        return rows + Metrics._collect()
+
+    @staticmethod
+    def _collect():
+        """Rows read from the statistics other modules keep for this process"""
+        # Imported here: the render service imports this module
+        from services.render_service import RenderService
+
+        rows = [['invoice_db_busy_errors_total', (), busy_error_count(), None]]
+        for readonly, stats in pool_stats().items():
+            pool = ('pool', 'readonly' if readonly else 'readwrite')
+            rows.append(['invoice_db_pool_connections', (pool, ('state', 'idle')), stats['idle'], None])
+            rows.append(['invoice_db_pool_connections', (pool, ('state', 'in_use')), stats['in_use'], None])
+            rows.append(['invoice_db_pool_connections_opened_total', (pool,), stats['opened'], None])
+        for event, count in PdfCache.stats().items():
+            rows.append(['invoice_pdf_cache_events_total', (('event', event),), count, None])
+        render_stats = RenderService.stats()
+        rows.append(['invoice_pdf_render_jobs_pending', (), render_stats.pop('pending'), None])
+        for outcome, count in render_stats.items():
+            rows.append(['invoice_pdf_render_jobs_total', (('outcome', outcome),), count, None])
+        return rows
+
+    @staticmethod
+    def flush(force=False):
+        """Write this process's snapshot to METRICS_DIR (at most every METRICS_FLUSH_SECONDS)"""
+        if not Config.METRICS or not Config.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - Metrics._flushed < Config.METRICS_FLUSH_SECONDS:
+            return
+        if not Metrics._flush_lock.acquire(blocking=False):
+            return  # Another thread is writing it right now
+        try:
+            Metrics._flushed = now
+            os.makedirs(Config.METRICS_DIR, exist_ok=True)
+            path = os.path.join(Config.METRICS_DIR, f'{os.getpid()}.json')
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(Metrics.snapshot(), f)
+            os.replace(temp_path, path)
+        except OSError:
+            pass  # Metrics must never fail the request or render
+        finally:
+            Metrics._flush_lock.release()
+
+    @staticmethod
+    def _process_snapshots():
+        """This process's live rows plus the last snapshot of every other running process"""
+        snapshots = [Metrics.snapshot()]
+        if not Config.METRICS_DIR or not os.path.isdir(Config.METRICS_DIR):
+            return snapshots
+        for filename in os.listdir(Config.METRICS_DIR):
+            pid, extension = os.path.splitext(filename)
+            if extension != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(Config.METRICS_DIR, filename)
+            if not _alive(int(pid)):
+                _remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    @staticmethod
+    def render():
+        """All processes' metrics added up, in the Prometheus text format"""
+        totals = {}
+        for rows in Metrics._process_snapshots():
+            for name, labels, value, counts in rows:
+                if name not in METRICS:
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = [value, list(counts) if counts else None]
+                else:
+                    total[0] += value
+                    if counts:
+                        total[1] = [a + b for a, b in zip(total[1], counts)]
+
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            series = sorted((labels, total) for (series_name, labels), total in totals.items() if series_name == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, (value, counts) in series:
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f'{name}_bucket{_labels(labels, ("le", le))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value)}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+def _statement(query):
+    word = query.lstrip()[:6].upper()
+    return word.lower() if word in STATEMENTS else 'other'
+
+def _on_query(query, params, duration):
+    Metrics.observe('invoice_db_query_duration_seconds', duration, statement=_statement(query))
+
+def _start():
+    g._metrics_started = time.perf_counter()
+
+def _finish(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        Metrics.observe('invoice_http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+        Metrics.inc('invoice_http_requests_total', endpoint=endpoint, method=request.method,
+                    status=str(response.status_code))
+    Metrics.flush()
+    return response
+
+def init_app(app):
+    """Count app's requests and queries for /metrics if METRICS is on"""
+    if not Config.METRICS:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+
+    # Listeners are process wide; creating a second app must not count twice
+    remove_query_listener(_on_query)
+    add_query_listener(_on_query)
+
+    # Snapshots left behind by processes of an earlier run
+    remove_dead_snapshots()
+
+    # Unlabelled counters start at 0 instead of appearing with the first event
+    Metrics.inc('invoice_invoices_created_total', 0)
+    Metrics.inc('invoice_receipts_issued_total', 0)
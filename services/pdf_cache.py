@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from config import Config
+from services.pdf_generator import save_pdf
+
+# Hit/miss counters for this process
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+_generator_fingerprint = None
+
+# Eviction goes down to this fraction of the limit, so that the cache does
+# not go over it again (and get walked again) with the very next store
+EVICT_TO = 0.9
+
+# Bytes in the cache as far as this process knows: the last scan plus what
+# it stored since (None until the first scan)
+_size = None
+_scanned = 0.0
+_size_lock = threading.Lock()
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def _add_size(amount):
+    global _size
+    with _size_lock:
+        if _size is not None:
+            _size += amount
+
+def _scan():
+    """(mtime, size, path) of every cached PDF, and their total size"""
+    entries = []
+    total = 0
+    for root, _, files in os.walk(Config.PDF_CACHE_FOLDER):
+        for name in files:
+            if not name.endswith('.pdf'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+            total += info.st_size
+    return entries, total
+
+def _safe_name(value):
+    """Make a document number usable as a directory name"""
+    return ''.join(char if char.isalnum() or char in '-_' else '_' for char in str(value))
+
+def generator_fingerprint():
+    """Hash of the PDF layout code, so a changed layout never serves old files"""
+    global _generator_fingerprint
+    if _generator_fingerprint is None:
+        from services import pdf_generator
+        with open(pdf_generator.__file__, 'rb') as f:
+            _generator_fingerprint = hashlib.sha256(f.read()).hexdigest()
+    return _generator_fingerprint
+
+class PdfCache:
+    """Rendered invoice and receipt PDFs, addressed by a hash of their input.
+
+    Entries live in PDF_CACHE_FOLDER/<kind>/<document number>/<hash>.pdf.
+    The hash covers everything printed on the document (header, line items,
+    contractor and client details, status) plus the layout code, so a stale
+    PDF is never served; the explicit invalidate calls only free the space
+    of versions that can no longer be requested. ReportLab renders with
+    invariant=1, so identical input always gives identical bytes.
+    """
+
+    @staticmethod
+    def key(kind, data):
+        """Content hash of the data a document is rendered from"""
+        payload = json.dumps(
+            {'kind': kind, 'layout': generator_fingerprint(), 'data': data},
+            sort_keys=True, separators=(',', ':'), default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _document_dir(kind, number):
+        return os.path.join(Config.PDF_CACHE_FOLDER, kind, _safe_name(number))
+
+    @staticmethod
+    def path(kind, number, data):
+        """Where the PDF rendered from data is (or would be) cached"""
+        return os.path.join(PdfCache._document_dir(kind, number), f'{PdfCache.key(kind, data)}.pdf')
+
+    @staticmethod
+    def lookup(filepath):
+        """Check for a cached PDF, counting the hit or miss"""
+        try:
+            os.utime(filepath)  # Recently used, for eviction
+        except FileNotFoundError:
+            _count('misses')
+            return False
+        _count('hits')
+        return True
+
+    @staticmethod
+    def store(filepath, pdf):
+        """Save rendered PDF bytes at filepath.
+
+        The file is written atomically (see save_pdf), so a concurrent
+        download never sees a half-written PDF.
+        """
+        filepath = save_pdf(filepath, pdf)
+        _add_size(len(pdf))
+        return filepath
+
+    @staticmethod
+    def stored_elsewhere(filepath):
+        """Count a PDF that another process (a render worker) stored towards the cache size"""
+        try:
+            _add_size(os.path.getsize(filepath))
+        except OSError:
+            pass
+
+    @staticmethod
+    def get_or_render(kind, number, data, render):
+        """Path of the cached PDF for data, calling render() for its bytes on a miss"""
+        filepath = PdfCache.path(kind, number, data)
+        if not PdfCache.lookup(filepath):
+            PdfCache.store(filepath, render())
+            PdfCache.evict()
+        return filepath
+
+    @staticmethod
+    def invalidate(kind, number):
+        """Drop every cached version of one document"""
+        document_dir = PdfCache._document_dir(kind, number)
+        if os.path.isdir(document_dir):
+            shutil.rmtree(document_dir, ignore_errors=True)
+            _count('invalidations')
+
+    @staticmethod
+    def clear():
+        """Drop the whole cache (e.g. after the contractor details change)"""
+        global _size
+        if os.path.isdir(Config.PDF_CACHE_FOLDER):
+            shutil.rmtree(Config.PDF_CACHE_FOLDER, ignore_errors=True)
+            _count('invalidations')
+        with _size_lock:
+            _size = None
+
+    @staticmethod
+    def evict(max_bytes=None):
+        """Remove least recently used PDFs once the cache is over max_bytes, down to EVICT_TO of it.
+
+        The cache is only walked when this process's running total says it
+        may be over the limit, or PDF_CACHE_SCAN_SECONDS after the last walk
+        (other processes store PDFs too); otherwise this is a comparison.
+        Passing max_bytes always walks it.
+        """
+        global _size, _scanned
+        now = time.monotonic()
+        if max_bytes is None:
+            max_bytes = Config.PDF_CACHE_MAX_BYTES
+            with _size_lock:
+                if _size is not None and _size <= max_bytes and now - _scanned < Config.PDF_CACHE_SCAN_SECONDS:
+                    return 0
+
+        entries, total = _scan()
+        removed = 0
+        if total > max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            _count('evictions', removed)
+
+        with _size_lock:
+            _size, _scanned = total, now
+        return removed
+
+    @staticmethod
+    def stats():
+        """Hit, miss, eviction and invalidation counts for this process"""
+        with _stats_lock:
+            return dict(_stats)
@@ -1,15 +1,32 @@
+import io
 import os
+import tempfile
+from functools import lru_cache
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, HRFlowable
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, HRFlowable, Flowable
+from reportlab.platypus.tables import LINECOMMANDS, CellStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from config import Config
+from services.memory import check_memory
+
+# Layout objects shared by every document, built once per process: a
+# document only binds its data to them. (Flowables are still created per
+# document; platypus stores their layout state on them while building.)
+_styles = None
 
 def get_custom_styles():
-    """Get custom styles for professional documents"""
+    """Get custom styles for professional documents (shared, do not modify)"""
+    global _styles
+    if _styles is None:
+        _styles = _build_custom_styles()
+    return _styles
+
+def _build_custom_styles():
     styles = getSampleStyleSheet()
     
     # Title style
@@ -79,25 +96,448 @@ def get_custom_styles():
         fontName='Helvetica-Bold'
     ))
     
+    # Line item descriptions, wrapped inside their table cell
+    styles.add(ParagraphStyle(
+        name='InvoiceItemText',
+        parent=styles['Normal'],
+        fontSize=8,
+        leading=10,
+        alignment=TA_LEFT
+    ))
+    styles.add(ParagraphStyle(
+        name='ReceiptItemText',
+        parent=styles['Normal'],
+        fontSize=7,  # Smaller font for receipt
+        leading=9,
+        alignment=TA_LEFT
+    ))
+    
     return styles
 
-def generate_invoice_pdf(invoice_data):
-    """Generate professional invoice PDF"""
+# Colors
+INVOICE_COLOR = colors.HexColor('#3498db')
+INVOICE_ACCENT_COLOR = colors.HexColor('#2980b9')
+RECEIPT_COLOR = colors.HexColor('#27ae60')
+TEXT_COLOR = colors.HexColor('#2c3e50')
+RULE_COLOR = colors.HexColor('#bdc3c7')
+ROW_BACKGROUND = colors.HexColor('#f8f9fa')
+
+# Table styles
+INVOICE_CONTACT_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 0),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+    ('TOPPADDING', (0, 0), (-1, -1), 0),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+])
+
+INVOICE_DETAILS_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TEXTCOLOR', (0, 0), (0, -1), INVOICE_ACCENT_COLOR),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+INVOICE_SERVICES_STYLE = TableStyle([
+    # Header row - smaller font
+    ('BACKGROUND', (0, 0), (-1, 0), INVOICE_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),  # Smaller header font
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('TOPPADDING', (0, 0), (-1, 0), 8),
+    
+    # Data rows
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),  # Smaller data font
+    ('ALIGN', (2, 1), (-1, -1), 'CENTER'),  # Center quantity, rate, total
+    ('ALIGN', (0, 1), (1, -1), 'LEFT'),     # Left align service and description
+    ('VALIGN', (0, 1), (-1, -1), 'TOP'),    # Top align content for proper wrapping
+    ('BACKGROUND', (0, 1), (-1, -1), ROW_BACKGROUND),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+    ('TOPPADDING', (0, 1), (-1, -1), 10),
+    
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 1, RULE_COLOR),
+    ('LINEBELOW', (0, 0), (-1, 0), 2, INVOICE_ACCENT_COLOR),
+])
+
+INVOICE_TOTAL_STYLE = TableStyle([
+    ('FONTNAME', (1, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (1, 0), (-1, 0), 14),
+    ('TEXTCOLOR', (1, 0), (-1, 0), TEXT_COLOR),
+    ('ALIGN', (1, 0), (-1, 0), 'RIGHT'),
+    ('PADDING', (1, 0), (-1, 0), 12),
+])
+
+# Rows of a large invoice that continue a page: no header row
+INVOICE_SERVICES_CONTINUED_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (2, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (0, 0), (1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('BACKGROUND', (0, 0), (-1, -1), ROW_BACKGROUND),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, RULE_COLOR),
+])
+
+RECEIPT_CONTACT_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 0),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+    ('TOPPADDING', (0, 0), (-1, -1), 0),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),  # Reduced padding
+])
+
+RECEIPT_DETAILS_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),  # Smaller font
+    ('TEXTCOLOR', (0, 0), (0, -1), RECEIPT_COLOR),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),  # Reduced padding
+])
+
+RECEIPT_SERVICES_STYLE = TableStyle([
+    # Header row - compact
+    ('BACKGROUND', (0, 0), (-1, 0), RECEIPT_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),  # Smaller header font
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),  # Reduced padding
+    ('TOPPADDING', (0, 0), (-1, 0), 6),
+    
+    # Data rows - compact
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),  # Smaller data font
+    ('ALIGN', (2, 1), (-1, -1), 'CENTER'),
+    ('ALIGN', (0, 1), (1, -1), 'LEFT'),
+    ('VALIGN', (0, 1), (-1, -1), 'TOP'),  # Top align for proper text wrapping
+    ('BACKGROUND', (0, 1), (-1, -1), ROW_BACKGROUND),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),  # Increased padding for wrapped text
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 0.5, RULE_COLOR),  # Thinner grid lines
+    ('LINEBELOW', (0, 0), (-1, 0), 2, RECEIPT_COLOR),
+])
+
+RECEIPT_AMOUNT_STYLE = TableStyle([
+    ('FONTNAME', (1, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (1, 0), (-1, 0), 12),  # Smaller font
+    ('TEXTCOLOR', (1, 0), (-1, 0), TEXT_COLOR),
+    ('ALIGN', (1, 0), (-1, 0), 'RIGHT'),
+    ('PADDING', (1, 0), (-1, 0), 8),  # Reduced padding
+])
+
+# Large invoices: line items measured for the first page of items (after
+# that, enough to fill the space left at the average row height so far)
+LINE_ITEM_CHUNK_ROWS = 20
+
+# Page margins and table column widths
+INVOICE_MARGINS = {
+    'topMargin': 0.5*inch,
+    'bottomMargin': 0.5*inch,
+    'leftMargin': 0.75*inch,
+    'rightMargin': 0.75*inch,
+}
+INVOICE_CONTACT_WIDTHS = [3.5*inch, 3.5*inch]
+INVOICE_DETAILS_WIDTHS = [2*inch, 2*inch]
+INVOICE_SERVICE_HEADER = ['Service', 'Description', 'Quantity', 'Rate', 'Total']
+INVOICE_SERVICE_WIDTHS = [1.8*inch, 1.8*inch, 0.8*inch, 1.2*inch, 1.2*inch]
+INVOICE_TOTAL_WIDTHS = [4*inch, 1.5*inch, 1.5*inch]
+
+RECEIPT_MARGINS = {  # Reduced margins - optimized for single page
+    'topMargin': 0.4*inch,
+    'bottomMargin': 0.4*inch,
+    'leftMargin': 0.6*inch,
+    'rightMargin': 0.6*inch,
+}
+RECEIPT_CONTACT_WIDTHS = [4*inch, 4*inch]  # Wider columns
+RECEIPT_DETAILS_WIDTHS = [1.5*inch, 2.5*inch]
+RECEIPT_SERVICE_HEADER = ['Service', 'Description', 'Qty', 'Rate', 'Amount']
+RECEIPT_SERVICE_WIDTHS = [2.2*inch, 2.2*inch, 0.6*inch, 1*inch, 1*inch]
+RECEIPT_AMOUNT_WIDTHS = [3.5*inch, 1.8*inch, 1.7*inch]
+RECEIPT_STYLE_NAMES = ('CustomTitle', 'Subtitle', 'SectionHeader', 'Address', 'Description', 'ReceiptItemText')
+
+class LineItemTable(Table):
+    """A table of line items that knows the amount of each of its rows"""
+    
+    def __init__(self, data, amounts=(), **kwargs):
+        Table.__init__(self, data, **kwargs)
+        self.amounts = list(amounts)
+
+class LineItemChunks(Flowable):
+    """Line items laid out a page at a time, read as they are needed.
+    
+    A single table of thousands of rows is measured in full and measured
+    again every time it is split, so each page costs more than the last.
+    This flowable never fits a frame as a whole: when the frame splits it,
+    it builds a table of the items that should just overrun the space
+    left, hands out the rows that fit and keeps the rest for the next
+    page. Only those rows are in memory and every page costs the same.
+    
+    How many rows that is comes from the average height of the rows
+    measured so far (LINE_ITEM_CHUNK_ROWS before there are any). Each page
+    is then one table split once; too few rows would fill it with several
+    tables, each measured and split in turn, and too many would be
+    measured only to be measured again on the next page.
+    """
+    
+    def __init__(self, items, make_row, chunk_rows=LINE_ITEM_CHUNK_ROWS):
+        Flowable.__init__(self)
+        self._items = iter(items)
+        self._make_row = make_row
+        self._chunk_rows = chunk_rows
+        self._rows = []
+        self._amounts = []
+        self._last_page = None
+        self._full_page = None
+        self._measured_rows = 0
+        self._measured_height = 0
+        self._fill(chunk_rows)
+    
+    def _fill(self, count):
+        """Read items until count are ready (or there are no more)"""
+        while len(self._rows) < count:
+            item = next(self._items, None)
+            if item is None:
+                break
+            self._rows.append(self._make_row(item))
+            self._amounts.append(item['amount'])
+    
+    def wrap(self, availWidth, availHeight):
+        if not self._rows:
+            return availWidth, 0  # Done: nothing left to draw
+        return availWidth, availHeight + 1  # Never fits, so the frame calls split()
+    
+    def split(self, availWidth, availHeight):
+        page = self.canv.getPageNumber()
+        if page == self._full_page:
+            return []  # Only the bottom of a page this filled is left
+        
+        count = self._chunk_rows
+        if self._measured_rows:
+            # Enough to overrun the space left by a row or two
+            count = int(availHeight * self._measured_rows / self._measured_height) + 2
+            self._fill(count)
+        if not self._rows:
+            return []
+        
+        # The column header starts every page; a chunk that continues the
+        # page of the previous one goes straight on
+        header = [] if page == self._last_page else [INVOICE_SERVICE_HEADER]
+        table = LineItemTable(header + self._rows[:count], self._amounts[:count],
+                              colWidths=INVOICE_SERVICE_WIDTHS, repeatRows=len(header))
+        table.setStyle(INVOICE_SERVICES_STYLE if header else INVOICE_SERVICES_CONTINUED_STYLE)
+        
+        width, height = table.wrap(availWidth, availHeight)
+        self._measured_rows += table._nrows - len(header)
+        self._measured_height += sum(table._rowHeights[len(header):])
+        if height > availHeight:
+            parts = table.split(availWidth, availHeight)
+            if not parts:
+                return []  # Not even one row fits; the frame moves this to the next page
+            table = parts[0]
+            self._full_page = page
+        
+        placed = table._nrows - len(header)
+        table.amounts = self._amounts[:placed]
+        del self._rows[:placed], self._amounts[:placed]
+        self._last_page = page
+        
+        # Placed at least partly, so it may be postponed again later on
+        if hasattr(self, '_postponed'):
+            del self._postponed
+        return [table, self]
+    
+    def draw(self):
+        pass
+
+class BudgetDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate that checks the memory budget (MEMORY_BUDGET_MB) after each flowable"""
+    
+    def afterFlowable(self, flowable):
+        check_memory()
+
+class InvoiceDocTemplate(BudgetDocTemplate):
+    """SimpleDocTemplate that prints a subtotal of the line items on each page"""
+    
+    def __init__(self, filename, **kwargs):
+        SimpleDocTemplate.__init__(self, filename, **kwargs)
+        self.page_subtotal = None
+        self.running_total = 0
+    
+    def afterFlowable(self, flowable):
+        BudgetDocTemplate.afterFlowable(self, flowable)
+        if isinstance(flowable, LineItemTable):
+            self.page_subtotal = (self.page_subtotal or 0) + sum(flowable.amounts)
+    
+    def afterPage(self):
+        if self.page_subtotal is None:
+            return
+        self.running_total += self.page_subtotal
+        
+        canv = self.canv
+        canv.saveState()
+        canv.setFont('Helvetica-Bold', 9)
+        canv.setFillColor(TEXT_COLOR)
+        canv.drawRightString(
+            self.pagesize[0] - self.rightMargin, self.bottomMargin / 2,
+            f"Page subtotal: ${self.page_subtotal:.2f}    Running total: ${self.running_total:.2f}"
+        )
+        canv.restoreState()
+        self.page_subtotal = None
+
+def invoice_pdf_filename(invoice_data):
+    """File name for an invoice PDF"""
     # Format: Invoice_INV-0001_2025-07-12.pdf
     invoice_date = invoice_data['invoice_date'].replace('-', '')  # Remove dashes: 20250712
-    filename = f"Invoice_{invoice_data['invoice_number']}_{invoice_date}.pdf"
-    filepath = os.path.join(Config.INVOICE_PDF_FOLDER, filename)
+    return f"Invoice_{invoice_data['invoice_number']}_{invoice_date}.pdf"
+
+def receipt_pdf_filename(receipt_data):
+    """File name for a receipt PDF"""
+    # Format: Receipt_REC-0001_2025-07-12.pdf
+    payment_date = receipt_data['payment_date'].split(' ')[0].replace('-', '')  # Remove dashes: 20250712
+    return f"Receipt_{receipt_data['receipt_number']}_{payment_date}.pdf"
+
+def _contractor_markup(data):
+    """FROM address of a document, as Paragraph markup"""
+    return f"""
+        <b>{data['contractor_name']}</b><br/>
+        {data['contractor_address'].replace(chr(10), '<br/>')}<br/>
+        <b>Email:</b> {data['contractor_email']}<br/>
+        <b>Phone:</b> {data['contractor_phone']}<br/>
+        {f"<b>Tax ID:</b> {data['contractor_tax_id']}<br/>" if data.get('contractor_tax_id') else ""}
+        {f"<b>Personal Tax ID:</b> {data['contractor_personal_tax_id']}<br/>" if data.get('contractor_personal_tax_id') else ""}
+    """
+
+def _client_markup(data):
+    """TO address of a document, as Paragraph markup"""
+    return f"""
+        <b>{data['client_name']}</b><br/>
+        {data['client_address'].replace(chr(10), '<br/>')}<br/>
+        <b>Email:</b> {data['client_email']}<br/>
+        <b>Phone:</b> {data['client_phone']}<br/>
+    """
+
+def _invoice_details(invoice_data):
+    """Rows of the invoice details table - with option for blank dates"""
+    invoice_date_display = invoice_data.get('leave_date_blank', False) and "________________" or invoice_data['invoice_date']
     
-    # Ensure directory exists
-    os.makedirs(Config.INVOICE_PDF_FOLDER, exist_ok=True)
+    return [
+        ['Invoice Date:', invoice_date_display],  # Show blank line or actual date
+        ['Status:', 'Pending Payment' if invoice_data.get('status') == 'pending' else 'Paid']
+    ]
+
+def _receipt_details(receipt_data):
+    """Rows of the receipt details table - with option for blank dates"""
+    payment_date_display = receipt_data.get('leave_date_blank', False) and "________________" or receipt_data['payment_date'].split(' ')[0]
     
-    doc = SimpleDocTemplate(
-        filepath, 
+    return [
+        ['Payment Date:', payment_date_display],  # Show blank line or actual date
+        ['Invoice Number:', receipt_data['invoice_number']],
+        ['Services:', f"{len(receipt_data.get('line_items', []))} item(s)" if receipt_data.get('line_items') else receipt_data.get('service_name', 'Services Rendered')]
+    ]
+
+def _invoice_footer(invoice_data):
+    """Footer - different message based on status"""
+    if invoice_data.get('status') == 'paid':
+        return "Thank you for your business! This invoice has been paid in full."
+    return "Thank you for your business! Please remit payment by the due date."
+
+def _confirmation_markup(receipt_data):
+    """Legal confirmation of a receipt, as Paragraph markup"""
+    return f"""
+    I, <b>{receipt_data['contractor_name']}</b>, hereby confirm that I have received the payment of
+    <b>${receipt_data['paid_amount']:.2f} only</b> in full from <b>{receipt_data['client_name']}</b>
+    for the services rendered as described above.
+    """
+
+RECEIPT_THANK_YOU = "<b>Thank you for your payment!</b><br/>This receipt serves as proof of payment."
+
+def _line_item_row(item, description_style):
+    """Services table row for a line item"""
+    # Use Paragraph for description to enable text wrapping
+    desc_text = item.get('service_description', '')
+    if desc_text:
+        desc_paragraph = Paragraph(desc_text, description_style)
+    else:
+        desc_paragraph = ''
+    
+    return [
+        item['service_name'],
+        desc_paragraph,  # Use Paragraph instead of plain text
+        str(item['quantity']),
+        f"${item['rate']:.2f}",
+        f"${item['amount']:.2f}"
+    ]
+
+def save_pdf(filepath, pdf):
+    """Write PDF bytes to filepath atomically.
+    
+    The bytes go to a temporary file in the same directory that is then
+    renamed over filepath, so nobody ever reads a half-written PDF and two
+    writers of the same file cannot interleave.
+    """
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return filepath
+
+def generate_invoice_pdf(invoice_data, filepath=None, line_items=None):
+    """Render an invoice PDF and save it (by default in INVOICE_PDF_FOLDER) for archiving"""
+    if filepath is None:
+        filepath = os.path.join(Config.INVOICE_PDF_FOLDER, invoice_pdf_filename(invoice_data))
+    return save_pdf(filepath, render_invoice_pdf(invoice_data, line_items))
+
+def generate_receipt_pdf(receipt_data, filepath=None):
+    """Render a receipt PDF and save it (by default in RECEIPT_PDF_FOLDER) for archiving"""
+    if filepath is None:
+        filepath = os.path.join(Config.RECEIPT_PDF_FOLDER, receipt_pdf_filename(receipt_data))
+    return save_pdf(filepath, render_receipt_pdf(receipt_data))
+
+def render_invoice_pdf(invoice_data, line_items=None):
+    """Render a professional invoice PDF in memory and return its bytes.
+    
+    line_items defaults to invoice_data['line_items']; any iterable of
+    items (such as Invoice.stream_line_items) can be passed instead, and
+    must be for a large invoice from Invoice.get_invoice_for_pdf, which
+    comes without them. Large invoices are laid out a page at a time with
+    page subtotals.
+    """
+    buffer = io.BytesIO()
+    
+    if line_items is None:
+        if 'line_items' not in invoice_data and invoice_data.get('line_item_count'):
+            raise ValueError(
+                f"Invoice {invoice_data['invoice_number']} has {invoice_data['line_item_count']} line items "
+                "but none were passed; stream them with line_items="
+            )
+        line_items = invoice_data.get('line_items', [])
+    
+    if isinstance(line_items, list) and _fits_fast_layout(line_items):
+        pdf = _draw_invoice_page(invoice_data, line_items)
+        if pdf is not None:
+            return pdf
+    
+    doc = InvoiceDocTemplate(
+        buffer,
         pagesize=letter,
-        topMargin=0.5*inch,
-        bottomMargin=0.5*inch,
-        leftMargin=0.75*inch,
-        rightMargin=0.75*inch
+        invariant=1,  # Fixed timestamps and document ID: same data, same bytes
+        **INVOICE_MARGINS
     )
     
     styles = get_custom_styles()
@@ -111,7 +551,7 @@ def generate_invoice_pdf(invoice_data):
     story.append(invoice_number)
     
     # Add horizontal line
-    story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor('#3498db')))
+    story.append(HRFlowable(width="100%", thickness=2, color=INVOICE_COLOR))
     story.append(Spacer(1, 20))
     
     # Create two-column layout for FROM and TO
@@ -121,51 +561,20 @@ def generate_invoice_pdf(invoice_data):
             Paragraph('<b>TO:</b>', styles['SectionHeader'])
         ],
         [
-            Paragraph(f"""
-                <b>{invoice_data['contractor_name']}</b><br/>
-                {invoice_data['contractor_address'].replace(chr(10), '<br/>')}<br/>
-                <b>Email:</b> {invoice_data['contractor_email']}<br/>
-                <b>Phone:</b> {invoice_data['contractor_phone']}<br/>
-                {f"<b>Tax ID:</b> {invoice_data['contractor_tax_id']}<br/>" if invoice_data.get('contractor_tax_id') else ""}
-                {f"<b>Personal Tax ID:</b> {invoice_data['contractor_personal_tax_id']}<br/>" if invoice_data.get('contractor_personal_tax_id') else ""}
-            """, styles['Address']),
-            Paragraph(f"""
-                <b>{invoice_data['client_name']}</b><br/>
-                {invoice_data['client_address'].replace(chr(10), '<br/>')}<br/>
-                <b>Email:</b> {invoice_data['client_email']}<br/>
-                <b>Phone:</b> {invoice_data['client_phone']}<br/>
-            """, styles['Address'])
+            Paragraph(_contractor_markup(invoice_data), styles['Address']),
+            Paragraph(_client_markup(invoice_data), styles['Address'])
         ]
     ]
     
-    contact_table = Table(contact_data, colWidths=[3.5*inch, 3.5*inch])
-    contact_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-    ]))
+    contact_table = Table(contact_data, colWidths=INVOICE_CONTACT_WIDTHS)
+    contact_table.setStyle(INVOICE_CONTACT_STYLE)
     
     story.append(contact_table)
     story.append(Spacer(1, 20))
     
-    # Invoice details - with option for blank dates
-    invoice_date_display = invoice_data.get('leave_date_blank', False) and "________________" or invoice_data['invoice_date']
-    
-    details_data = [
-        ['Invoice Date:', invoice_date_display],  # Show blank line or actual date
-        ['Status:', 'Pending Payment' if invoice_data.get('status') == 'pending' else 'Paid']
-    ]
-    
-    details_table = Table(details_data, colWidths=[2*inch, 2*inch])
-    details_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2980b9')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    # Invoice details
+    details_table = Table(_invoice_details(invoice_data), colWidths=INVOICE_DETAILS_WIDTHS)
+    details_table.setStyle(INVOICE_DETAILS_STYLE)
     
     story.append(details_table)
     story.append(Spacer(1, 30))
@@ -173,119 +582,72 @@ def generate_invoice_pdf(invoice_data):
     # Service section header
     service_header = Paragraph('SERVICE DETAILS', styles['SectionHeader'])
     story.append(service_header)
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#bdc3c7')))
+    story.append(HRFlowable(width="100%", thickness=1, color=RULE_COLOR))
     story.append(Spacer(1, 15))
     
-    # Service table with multiple line items
-    service_data = [
-        ['Service', 'Description', 'Quantity', 'Rate', 'Total']
-    ]
+    def item_row(item):
+        return _line_item_row(item, styles['InvoiceItemText'])
     
-    # Add line items to table
-    for item in invoice_data.get('line_items', []):
-        # Use Paragraph for description to enable text wrapping
-        desc_text = item.get('service_description', '')
-        if desc_text:
-            desc_paragraph = Paragraph(desc_text, ParagraphStyle(
-                'WrappedText',
-                parent=styles['Normal'],
-                fontSize=8,
-                leading=10,
-                alignment=TA_LEFT
-            ))
-        else:
-            desc_paragraph = ''
+    if isinstance(line_items, list) and len(line_items) <= Config.LARGE_INVOICE_ITEMS:
+        # Service table with multiple line items
+        service_data = [INVOICE_SERVICE_HEADER] + [item_row(item) for item in line_items]
         
-        service_data.append([
-            item['service_name'],
-            desc_paragraph,  # Use Paragraph instead of plain text
-            str(item['quantity']),
-            f"${item['rate']:.2f}",
-            f"${item['amount']:.2f}"
-        ])
-    
-    # Column widths: Service smaller, Description gets space, others stay same
-    service_table = Table(service_data, colWidths=[1.8*inch, 1.8*inch, 0.8*inch, 1.2*inch, 1.2*inch])
-    service_table.setStyle(TableStyle([
-        # Header row - smaller font
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),  # Smaller header font
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('TOPPADDING', (0, 0), (-1, 0), 8),
-        
-        # Data rows
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),  # Smaller data font
-        ('ALIGN', (2, 1), (-1, -1), 'CENTER'),  # Center quantity, rate, total
-        ('ALIGN', (0, 1), (1, -1), 'LEFT'),     # Left align service and description
-        ('VALIGN', (0, 1), (-1, -1), 'TOP'),    # Top align content for proper wrapping
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-        ('TOPPADDING', (0, 1), (-1, -1), 10),
-        
-        # Grid
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bdc3c7')),
-        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#2980b9')),
-    ]))
+        # Column widths: Service smaller, Description gets space, others stay same
+        service_table = Table(service_data, colWidths=INVOICE_SERVICE_WIDTHS)
+        service_table.setStyle(INVOICE_SERVICES_STYLE)
+        story.append(service_table)
+    else:
+        # Large invoice: page-sized tables with repeated headers and page subtotals
+        story.append(LineItemChunks(line_items, item_row))
     
-    story.append(service_table)
     story.append(Spacer(1, 20))
     
     # Total section
-    story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor('#2980b9')))
+    story.append(HRFlowable(width="100%", thickness=2, color=INVOICE_ACCENT_COLOR))
     story.append(Spacer(1, 15))
     
     total_data = [
         ['', 'TOTAL DUE:', f"${invoice_data['total']:.2f} only"]
     ]
     
-    total_table = Table(total_data, colWidths=[4*inch, 1.5*inch, 1.5*inch])
-    total_table.setStyle(TableStyle([
-        ('FONTNAME', (1, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (1, 0), (-1, 0), 14),
-        ('TEXTCOLOR', (1, 0), (-1, 0), colors.HexColor('#2c3e50')),
-        ('ALIGN', (1, 0), (-1, 0), 'RIGHT'),
-        ('PADDING', (1, 0), (-1, 0), 12),
-    ]))
+    total_table = Table(total_data, colWidths=INVOICE_TOTAL_WIDTHS)
+    total_table.setStyle(INVOICE_TOTAL_STYLE)
     
     story.append(total_table)
     story.append(Spacer(1, 30))
     
-    # Footer - different message based on status
-    if invoice_data.get('status') == 'paid':
-        footer_text = "Thank you for your business! This invoice has been paid in full."
-    else:
-        footer_text = "Thank you for your business! Please remit payment by the due date."
-    
-    footer = Paragraph(footer_text, styles['Description'])
+    footer = Paragraph(_invoice_footer(invoice_data), styles['Description'])
     story.append(footer)
     
     doc.build(story)
-    return filepath
+    return buffer.getvalue()
 
-def generate_receipt_pdf(receipt_data):
-    """Generate professional receipt PDF - optimized for single page"""
-    # Format: Receipt_REC-0001_2025-07-12.pdf
-    payment_date = receipt_data['payment_date'].split(' ')[0].replace('-', '')  # Remove dashes: 20250712
-    filename = f"Receipt_{receipt_data['receipt_number']}_{payment_date}.pdf"
-    filepath = os.path.join(Config.RECEIPT_PDF_FOLDER, filename)
+def render_receipt_pdf(receipt_data):
+    """Render a professional receipt PDF in memory - shrunk to fit a single page where it can"""
+    buffer = io.BytesIO()
     
-    # Ensure directory exists
-    os.makedirs(Config.RECEIPT_PDF_FOLDER, exist_ok=True)
+    if _fits_fast_layout(receipt_data.get('line_items') or []):
+        pdf = _draw_receipt_page(receipt_data)
+        if pdf is not None:
+            return pdf
     
-    doc = SimpleDocTemplate(
-        filepath, 
+    doc = BudgetDocTemplate(
+        buffer,
         pagesize=letter,
-        topMargin=0.4*inch,      # Reduced top margin
-        bottomMargin=0.4*inch,   # Reduced bottom margin
-        leftMargin=0.6*inch,     # Reduced left margin
-        rightMargin=0.6*inch     # Reduced right margin
+        invariant=1,  # Same data, same bytes
+        **RECEIPT_MARGINS
     )
     
-    styles = get_custom_styles()
+    doc.build(_fit_receipt_story(receipt_data))
+    return buffer.getvalue()
+
+def _receipt_story(receipt_data, font=1, spacing=1):
+    """The flowables of a receipt, font sizes scaled by font and padding and spacing by spacing"""
+    styles = _scaled_styles(RECEIPT_STYLE_NAMES, font, spacing)
+    contact_style, details_style, services_style, amount_style = [
+        _scaled_table_style(style, font, spacing)
+        for style in (RECEIPT_CONTACT_STYLE, RECEIPT_DETAILS_STYLE, RECEIPT_SERVICES_STYLE, RECEIPT_AMOUNT_STYLE)
+    ]
     story = []
     
     # Header with title - more compact
@@ -296,8 +658,8 @@ def generate_receipt_pdf(receipt_data):
     story.append(receipt_number)
     
     # Add horizontal line
-    story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor('#27ae60')))
-    story.append(Spacer(1, 12))  # Reduced spacing
+    story.append(HRFlowable(width="100%", thickness=2, color=RECEIPT_COLOR))
+    story.append(Spacer(1, 12 * spacing))  # Reduced spacing
     
     # Create two-column layout for FROM and TO - more compact
     contact_data = [
@@ -306,174 +668,519 @@ def generate_receipt_pdf(receipt_data):
             Paragraph('<b>TO:</b>', styles['SectionHeader'])
         ],
         [
-            Paragraph(f"""
-                <b>{receipt_data['contractor_name']}</b><br/>
-                {receipt_data['contractor_address'].replace(chr(10), '<br/>')}<br/>
-                <b>Email:</b> {receipt_data['contractor_email']}<br/>
-                <b>Phone:</b> {receipt_data['contractor_phone']}<br/>
-                {f"<b>Tax ID:</b> {receipt_data['contractor_tax_id']}<br/>" if receipt_data.get('contractor_tax_id') else ""}
-                {f"<b>Personal Tax ID:</b> {receipt_data['contractor_personal_tax_id']}<br/>" if receipt_data.get('contractor_personal_tax_id') else ""}
-            """, styles['Address']),
-            Paragraph(f"""
-                <b>{receipt_data['client_name']}</b><br/>
-                {receipt_data['client_address'].replace(chr(10), '<br/>')}<br/>
-                <b>Email:</b> {receipt_data['client_email']}<br/>
-                <b>Phone:</b> {receipt_data['client_phone']}<br/>
-            """, styles['Address'])
+            Paragraph(_contractor_markup(receipt_data), styles['Address']),
+            Paragraph(_client_markup(receipt_data), styles['Address'])
         ]
     ]
     
-    contact_table = Table(contact_data, colWidths=[4*inch, 4*inch])  # Wider columns
-    contact_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),  # Reduced padding
-    ]))
+    contact_table = Table(contact_data, colWidths=RECEIPT_CONTACT_WIDTHS)
+    contact_table.setStyle(contact_style)
     
     story.append(contact_table)
-    story.append(Spacer(1, 12))  # Reduced spacing
-    
-    # Payment details - with option for blank dates
-    payment_date_display = receipt_data.get('leave_date_blank', False) and "________________" or receipt_data['payment_date'].split(' ')[0]
-    
-    details_data = [
-        ['Payment Date:', payment_date_display],  # Show blank line or actual date
-        ['Invoice Number:', receipt_data['invoice_number']],
-        ['Services:', f"{len(receipt_data.get('line_items', []))} item(s)" if receipt_data.get('line_items') else receipt_data.get('service_name', 'Services Rendered')]
-    ]
+    story.append(Spacer(1, 12 * spacing))  # Reduced spacing
     
-    details_table = Table(details_data, colWidths=[1.5*inch, 2.5*inch])  # Adjusted widths
-    details_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),  # Smaller font
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#27ae60')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),  # Reduced padding
-    ]))
+    # Payment details
+    details_table = Table(_receipt_details(receipt_data), colWidths=RECEIPT_DETAILS_WIDTHS)
+    details_table.setStyle(details_style)
     
     story.append(details_table)
-    story.append(Spacer(1, 15))  # Reduced spacing
+    story.append(Spacer(1, 15 * spacing))  # Reduced spacing
     
     # Services section - show line items if available
     if receipt_data.get('line_items'):
         service_header = Paragraph('SERVICES PROVIDED', styles['SectionHeader'])
         story.append(service_header)
-        story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#bdc3c7')))
-        story.append(Spacer(1, 8))  # Reduced spacing
+        story.append(HRFlowable(width="100%", thickness=1, color=RULE_COLOR))
+        story.append(Spacer(1, 8 * spacing))  # Reduced spacing
         
         # Service table with multiple line items - more compact
-        service_data = [
-            ['Service', 'Description', 'Qty', 'Rate', 'Amount']
+        service_data = [RECEIPT_SERVICE_HEADER] + [
+            _line_item_row(item, styles['ReceiptItemText']) for item in receipt_data['line_items']
         ]
         
-        # Add line items to table
-        for item in receipt_data['line_items']:
-            # Use Paragraph for description to enable text wrapping
-            desc_text = item.get('service_description', '')
-            if desc_text:
-                desc_paragraph = Paragraph(desc_text, ParagraphStyle(
-                    'WrappedText',
-                    parent=styles['Normal'],
-                    fontSize=7,  # Smaller font for receipt
-                    leading=9,
-                    alignment=TA_LEFT
-                ))
-            else:
-                desc_paragraph = ''
-            
-            service_data.append([
-                item['service_name'],
-                desc_paragraph,  # Use Paragraph instead of truncated text
-                str(item['quantity']),
-                f"${item['rate']:.2f}",
-                f"${item['amount']:.2f}"
-            ])
-        
         # More compact column widths
-        service_table = Table(service_data, colWidths=[2.2*inch, 2.2*inch, 0.6*inch, 1*inch, 1*inch])
-        service_table.setStyle(TableStyle([
-            # Header row - compact
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27ae60')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),  # Smaller header font
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),  # Reduced padding
-            ('TOPPADDING', (0, 0), (-1, 0), 6),
-            
-            # Data rows - compact
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),  # Smaller data font
-            ('ALIGN', (2, 1), (-1, -1), 'CENTER'),
-            ('ALIGN', (0, 1), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 1), (-1, -1), 'TOP'),  # Top align for proper text wrapping
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),  # Increased padding for wrapped text
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),  # Thinner grid lines
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#27ae60')),
-        ]))
+        service_table = Table(service_data, colWidths=RECEIPT_SERVICE_WIDTHS)
+        service_table.setStyle(services_style)
         
         story.append(service_table)
-        story.append(Spacer(1, 12))  # Reduced spacing
+        story.append(Spacer(1, 12 * spacing))  # Reduced spacing
     
     # Description section (if exists and only one service) - more compact
     elif receipt_data.get('service_description'):
         desc_header = Paragraph('SERVICE DESCRIPTION', styles['SectionHeader'])
         story.append(desc_header)
-        story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#bdc3c7')))
-        story.append(Spacer(1, 6))  # Reduced spacing
+        story.append(HRFlowable(width="100%", thickness=1, color=RULE_COLOR))
+        story.append(Spacer(1, 6 * spacing))  # Reduced spacing
         
         description = Paragraph(receipt_data['service_description'], styles['Description'])
         story.append(description)
-        story.append(Spacer(1, 12))  # Reduced spacing
+        story.append(Spacer(1, 12 * spacing))  # Reduced spacing
     
     # Amount received section - more compact
-    story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor('#27ae60')))
-    story.append(Spacer(1, 10))  # Reduced spacing
+    story.append(HRFlowable(width="100%", thickness=2, color=RECEIPT_COLOR))
+    story.append(Spacer(1, 10 * spacing))  # Reduced spacing
     
     amount_data = [
         ['', 'AMOUNT RECEIVED:', f"${receipt_data['paid_amount']:.2f} only"]
     ]
     
-    amount_table = Table(amount_data, colWidths=[3.5*inch, 1.8*inch, 1.7*inch])  # Adjusted widths
-    amount_table.setStyle(TableStyle([
-        ('FONTNAME', (1, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (1, 0), (-1, 0), 12),  # Smaller font
-        ('TEXTCOLOR', (1, 0), (-1, 0), colors.HexColor('#2c3e50')),
-        ('ALIGN', (1, 0), (-1, 0), 'RIGHT'),
-        ('PADDING', (1, 0), (-1, 0), 8),  # Reduced padding
-    ]))
+    amount_table = Table(amount_data, colWidths=RECEIPT_AMOUNT_WIDTHS)
+    amount_table.setStyle(amount_style)
     
     story.append(amount_table)
-    story.append(Spacer(1, 15))  # Reduced spacing
+    story.append(Spacer(1, 15 * spacing))  # Reduced spacing
     
     # Legal confirmation section - more compact
     confirmation_header = Paragraph('PAYMENT CONFIRMATION', styles['SectionHeader'])
     story.append(confirmation_header)
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#bdc3c7')))
-    story.append(Spacer(1, 8))  # Reduced spacing
+    story.append(HRFlowable(width="100%", thickness=1, color=RULE_COLOR))
+    story.append(Spacer(1, 8 * spacing))  # Reduced spacing
     
-    confirmation_text = f"""
-    I, <b>{receipt_data['contractor_name']}</b>, hereby confirm that I have received the payment of 
-    <b>${receipt_data['paid_amount']:.2f} only</b> in full from <b>{receipt_data['client_name']}</b> 
-    for the services rendered as described above.
-    """
-    
-    confirmation = Paragraph(confirmation_text, styles['Description'])
+    confirmation = Paragraph(_confirmation_markup(receipt_data), styles['Description'])
     story.append(confirmation)
-    story.append(Spacer(1, 15))  # Reduced spacing
+    story.append(Spacer(1, 15 * spacing))  # Reduced spacing
     
     # Thank you message - more compact
-    thank_you = Paragraph(
-        "<b>Thank you for your payment!</b><br/>This receipt serves as proof of payment.",
-        styles['Description']
-    )
+    thank_you = Paragraph(RECEIPT_THANK_YOU, styles['Description'])
     story.append(thank_you)
     
-    doc.build(story)
-    return filepath
\ No newline at end of file
+    return story
+
+# Receipts are meant to fit on one page. One that runs over is shrunk:
+# its padding and spacing first, then its fonts. Every size tried is only
+# measured with wrap() - nothing is drawn - so the receipt is still built
+# once.
+
+RECEIPT_FIT_STEPS = 5  # Binary search steps for the font scale, to within 1/32 of its range
+
+_PADDING_COMMANDS = ('TOPPADDING', 'BOTTOMPADDING')  # Not the sides: those would change how cells wrap
+
+def _scaled_styles(names, font, spacing):
+    """The named custom styles with font sizes scaled by font and space before and after by spacing"""
+    styles = get_custom_styles()
+    if font == 1 and spacing == 1:
+        return styles
+    
+    scaled = {}
+    for name in names:
+        style = styles[name]
+        scaled[name] = ParagraphStyle(
+            name,
+            parent=style,
+            fontSize=style.fontSize * font,
+            leading=style.leading * font,
+            spaceBefore=style.spaceBefore * spacing,
+            spaceAfter=style.spaceAfter * spacing
+        )
+    return scaled
+
+def _scaled_table_style(table_style, font, spacing):
+    """table_style with font sizes and leading scaled by font and top and bottom padding by spacing"""
+    if font == 1 and spacing == 1:
+        return table_style
+    
+    # Cells without a LEADING of their own use the default one
+    commands = [('LEADING', (0, 0), (-1, -1), CellStyle.leading * font)]
+    for command in table_style.getCommands():
+        op = command[0]
+        if op in ('FONTSIZE', 'SIZE', 'LEADING'):
+            command = command[:3] + (command[3] * font,) + tuple(command[4:])
+        elif op in _PADDING_COMMANDS:
+            command = command[:3] + (command[3] * spacing,) + tuple(command[4:])
+        commands.append(command)
+    return TableStyle(commands)
+
+def _measure(story, margins, whole=True):
+    """(height, fits): the height story takes stacked the way a frame places it, and whether that is on one page.
+    
+    Unless whole is set, measuring stops at the first flowable that runs
+    off the page (the height is then only that far).
+    """
+    page = _Page(margins)
+    top = page.y
+    for flowable in story:
+        height = flowable.wrap(page.width, page.y - page.bottom)[1]
+        page.add(height, space_before=flowable.getSpaceBefore(), space_after=flowable.getSpaceAfter())
+        if not (page.fits or whole):
+            break
+    return top - page.y - page._space_after, page.fits
+
+def _fit_receipt_story(receipt_data):
+    """The receipt's story at the largest size that fits on one page.
+    
+    A receipt that does not fit even at RECEIPT_MIN_SPACING_SCALE and
+    RECEIPT_MIN_FONT_SCALE keeps its regular size and runs onto more pages.
+    """
+    story = _receipt_story(receipt_data)
+    height, fits = _measure(story, RECEIPT_MARGINS)
+    if fits:
+        return story
+    
+    min_spacing = Config.RECEIPT_MIN_SPACING_SCALE
+    min_font = Config.RECEIPT_MIN_FONT_SCALE
+    page = _Page(RECEIPT_MARGINS)
+    available = page.y - page.bottom
+    
+    tight = _receipt_story(receipt_data, spacing=min_spacing)
+    tight_height, fits = _measure(tight, RECEIPT_MARGINS, whole=False)
+    if fits:
+        # No line wraps differently with the fonts unchanged, so the height
+        # is the content plus spacing and padding growing with the scale,
+        # the tallest cell of each row setting its height. That is convex
+        # in the scale: the line through the two measurements never falls
+        # below it, and the scale where the line meets the page fits.
+        spacing = min_spacing + (1 - min_spacing) * (available - tight_height) / (height - tight_height)
+        return _receipt_story(receipt_data, spacing=spacing)
+    
+    smallest = _receipt_story(receipt_data, min_font, min_spacing)
+    if not _measure(smallest, RECEIPT_MARGINS, whole=False)[1]:
+        return story
+    
+    # Lines wrap differently as the fonts shrink, so search for the scale
+    low, high = min_font, 1
+    for _ in range(RECEIPT_FIT_STEPS):
+        font = (low + high) / 2
+        candidate = _receipt_story(receipt_data, font, min_spacing)
+        if _measure(candidate, RECEIPT_MARGINS, whole=False)[1]:
+            low, smallest = font, candidate
+        else:
+            high = font
+    return smallest
+
+
+# Short documents
+# ===============
+# A platypus build spends most of its time fitting flowables into frames
+# and measuring tables cell by cell. An invoice or receipt with a handful
+# of line items fits on one page, so it is drawn straight onto a canvas
+# instead: the same content at the positions platypus gives it, using the
+# same paragraph styles, TableStyles, widths and margins as above. A
+# document that turns out not to fit on one page is laid out by platypus
+# after all.
+
+FRAME_PADDING = 6  # Between the margins and the content of a SimpleDocTemplate page
+
+# TableStyle commands _Page.table() draws, besides the ones setting cell styles
+_TABLE_DRAW_COMMANDS = ('BACKGROUND', 'GRID', 'LINEBELOW')
+
+def _fits_fast_layout(line_items):
+    """Whether a document with these line items is tried on a single canvas page"""
+    return Config.PDF_FAST_LAYOUT_ITEMS is not None and len(line_items) <= Config.PDF_FAST_LAYOUT_ITEMS
+
+@lru_cache(maxsize=64)
+def _cell_styles(table_style, nrows, ncols):
+    """Style of each cell of an nrows x ncols table in table_style, as platypus resolves it"""
+    table = Table([[''] * ncols] * nrows)
+    table.setStyle(table_style)
+    return table._cellStyles
+
+@lru_cache(maxsize=None)
+def _can_draw(table_style):
+    """Whether _Page.table() draws everything table_style asks for"""
+    for command in table_style.getCommands():
+        op = command[0]
+        if op in LINECOMMANDS or op in ('SPAN', 'ROWBACKGROUNDS', 'COLBACKGROUNDS'):
+            if op not in _TABLE_DRAW_COMMANDS or len(command) > 5:  # No own caps, dashes or joins
+                return False
+        elif op == 'BACKGROUND' and not isinstance(command[3], colors.Color):
+            return False
+    return True
+
+class _Page:
+    """Blocks stacked down one page with the spacing of a platypus frame.
+    
+    Everything is measured while the page is built, so whether it fits is
+    known before anything is drawn; render() then draws each block at the
+    position it was given.
+    """
+    
+    def __init__(self, margins):
+        page_width, page_height = letter
+        self.left = margins['leftMargin'] + FRAME_PADDING
+        self.width = page_width - margins['leftMargin'] - margins['rightMargin'] - 2 * FRAME_PADDING
+        self.bottom = margins['bottomMargin'] + FRAME_PADDING
+        self.y = page_height - margins['topMargin'] - FRAME_PADDING
+        self.fits = True
+        self._blocks = []
+        self._space_after = None  # Nothing placed yet
+    
+    def add(self, height, draw=None, space_before=0, space_after=0, width=None):
+        """Place a block under the previous one.
+        
+        draw(canv, x, y) is later called with the bottom left corner of the
+        block. As in a frame, a block only gets the part of its space
+        before that exceeds the space after the block above, there is no
+        space before the first block, and blocks with a width of their
+        own (tables) are centred.
+        """
+        if self._space_after is not None:
+            self.y -= max(space_before - self._space_after, 0)
+        self.y -= height
+        if self.y < self.bottom - 1e-6:  # The tolerance of a platypus frame
+            self.fits = False
+        if draw is not None:
+            x = self.left if width is None else self.left + (self.width - width) / 2
+            self._blocks.append((draw, x, self.y))
+        self.y -= space_after
+        self._space_after = space_after
+    
+    def space(self, height):
+        """Spacer"""
+        self.add(height)
+    
+    def rule(self, thickness, color):
+        """HRFlowable across the page"""
+        def draw(canv, x, y):
+            canv.saveState()
+            canv.setLineWidth(thickness)
+            canv.setLineCap(1)
+            canv.setStrokeColor(color)
+            canv.line(x, y, x + self.width, y)
+            canv.restoreState()
+        
+        self.add(thickness, draw, 1, 1)
+    
+    def text(self, text, style):
+        """Paragraph of one line of plain text"""
+        width = self.width - style.leftIndent - style.rightIndent
+        if '<' in text or '&' in text or stringWidth(text, style.fontName, style.fontSize) > width:
+            self.fits = False  # Markup or wrapping needs a real Paragraph
+        
+        def draw(canv, x, y):
+            canv.setFont(style.fontName, style.fontSize)
+            canv.setFillColor(style.textColor)
+            baseline = y + style.leading - style.fontSize
+            if style.alignment == TA_CENTER:
+                canv.drawCentredString(x + style.leftIndent + width / 2, baseline, text)
+            else:
+                canv.drawString(x + style.leftIndent, baseline, text)
+        
+        self.add(style.leading, draw, style.spaceBefore, style.spaceAfter)
+    
+    def paragraph(self, paragraph):
+        """Paragraph, with its markup and line wrapping"""
+        height = paragraph.wrap(self.width, self.y - self.bottom)[1]
+        self.add(height, paragraph.drawOn, paragraph.style.spaceBefore, paragraph.style.spaceAfter)
+    
+    def table(self, rows, col_widths, table_style):
+        """Table of strings and Paragraphs in table_style"""
+        if not _can_draw(table_style):
+            self.fits = False
+            return
+        
+        cell_styles = _cell_styles(table_style, len(rows), len(col_widths))
+        
+        # A row is as high as its highest cell
+        row_heights = []
+        for row, styles in zip(rows, cell_styles):
+            row_height = 0
+            for value, cell, width in zip(row, styles, col_widths):
+                if isinstance(value, Flowable):
+                    height = value.wrap(width - cell.leftPadding - cell.rightPadding, 72000)[1]
+                else:
+                    height = cell.leading * len(('' if value is None else str(value)).split('\n'))
+                row_height = max(row_height, height + cell.topPadding + cell.bottomPadding)
+            row_heights.append(row_height)
+        
+        def draw(canv, x, y):
+            _draw_table(canv, x, y, rows, col_widths, row_heights, cell_styles, table_style)
+        
+        self.add(sum(row_heights), draw, width=sum(col_widths))
+    
+    def render(self):
+        """The page as PDF bytes, checking the memory budget after each block as BudgetDocTemplate does"""
+        buffer = io.BytesIO()
+        canv = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+        for draw, x, y in self._blocks:
+            draw(canv, x, y)
+            check_memory()
+        canv.showPage()
+        canv.save()
+        return buffer.getvalue()
+
+def _draw_table(canv, x, y, rows, col_widths, row_heights, cell_styles, table_style):
+    """Draw a table the way platypus Table.draw does: backgrounds, cells, then lines"""
+    nrows, ncols = len(rows), len(col_widths)
+    col_x = [x]
+    for width in col_widths:
+        col_x.append(col_x[-1] + width)
+    row_y = [y + sum(row_heights)]  # Top of each row, then the bottom of the table
+    for height in row_heights:
+        row_y.append(row_y[-1] - height)
+    
+    def cells(command):
+        (sc, sr), (ec, er) = command[1], command[2]
+        return (sc + ncols if sc < 0 else sc, sr + nrows if sr < 0 else sr,
+                ec + ncols if ec < 0 else ec, er + nrows if er < 0 else er)
+    
+    canv.saveState()
+    commands = table_style.getCommands()
+    for command in commands:
+        if command[0] == 'BACKGROUND':
+            sc, sr, ec, er = cells(command)
+            canv.setFillColor(command[3])
+            canv.rect(col_x[sc], row_y[er + 1], col_x[ec + 1] - col_x[sc], row_y[sr] - row_y[er + 1], stroke=0, fill=1)
+    
+    for row, styles, top, height in zip(rows, cell_styles, row_y, row_heights):
+        for value, cell, left, width in zip(row, styles, col_x, col_widths):
+            _draw_cell(canv, value, cell, left, top - height, width, height)
+    
+    canv.setLineCap(1)  # Table lines default to round caps and joins
+    canv.setLineJoin(1)
+    for command in commands:
+        if command[0] not in ('GRID', 'LINEBELOW'):
+            continue
+        sc, sr, ec, er = cells(command)
+        canv.setLineWidth(command[3])
+        canv.setStrokeColor(command[4])
+        if command[0] == 'GRID':
+            lines = [(col_x[sc], row_y[r], col_x[ec + 1], row_y[r]) for r in range(sr, er + 2)]
+            lines += [(col_x[c], row_y[er + 1], col_x[c], row_y[sr]) for c in range(sc, ec + 2)]
+        else:
+            lines = [(col_x[sc], row_y[r + 1], col_x[ec + 1], row_y[r + 1]) for r in range(sr, er + 1)]
+        canv.lines(lines)
+    canv.restoreState()
+
+def _draw_cell(canv, value, cell, x, y, width, height):
+    """Draw a table cell the way platypus Table._drawCell does"""
+    if isinstance(value, Flowable):
+        value_height = value.height
+        if cell.valign == 'TOP':
+            bottom = y + height - cell.topPadding - value_height
+        elif cell.valign == 'BOTTOM':
+            bottom = y + cell.bottomPadding
+        else:
+            bottom = y + (height + cell.bottomPadding - cell.topPadding - value_height) / 2
+        if cell.alignment == 'LEFT':
+            left = x + cell.leftPadding
+        elif cell.alignment == 'RIGHT':
+            left = x + width - cell.rightPadding - value.width
+        else:
+            left = x + (width + cell.leftPadding - cell.rightPadding - value.width) / 2
+        value.drawOn(canv, left, bottom)
+        return
+    
+    lines = ('' if value is None else str(value)).split('\n')
+    if cell.valign == 'BOTTOM':
+        baseline = y + cell.bottomPadding + len(lines) * cell.leading - cell.fontsize
+    elif cell.valign == 'TOP':
+        baseline = y + height - cell.topPadding - cell.fontsize
+    else:
+        baseline = y + (cell.bottomPadding + height - cell.topPadding + len(lines) * cell.leading) / 2 - cell.fontsize
+    
+    canv.setFont(cell.fontname, cell.fontsize, cell.leading)
+    canv.setFillColor(cell.color)
+    for line in lines:
+        if cell.alignment == 'LEFT':
+            canv.drawString(x + cell.leftPadding, baseline, line)
+        elif cell.alignment == 'RIGHT':
+            canv.drawRightString(x + width - cell.rightPadding, baseline, line)
+        else:
+            canv.drawCentredString(x + (width + cell.leftPadding - cell.rightPadding) / 2, baseline, line)
+        baseline -= cell.leading
+
+def _contact_table(page, data, styles, col_widths, table_style):
+    """The two-column FROM/TO table (its headings are one-line SectionHeader paragraphs)"""
+    heading = styles['SectionHeader']
+    contractor = Paragraph(_contractor_markup(data), styles['Address'])
+    client = Paragraph(_client_markup(data), styles['Address'])
+    cell = _cell_styles(table_style, 2, 2)[0][0]  # All four cells are padded alike
+    
+    heading_height = heading.leading + cell.topPadding + cell.bottomPadding
+    address_height = max(
+        paragraph.wrap(width - cell.leftPadding - cell.rightPadding, 72000)[1]
+        for paragraph, width in ((contractor, col_widths[0]), (client, col_widths[1]))
+    )
+    address_row_height = address_height + cell.topPadding + cell.bottomPadding
+    
+    def draw(canv, x, y):
+        top = y + heading_height + address_row_height
+        canv.setFont(heading.fontName, heading.fontSize)
+        canv.setFillColor(heading.textColor)
+        for text, left in (('FROM:', x), ('TO:', x + col_widths[0])):
+            canv.drawString(left + cell.leftPadding + heading.leftIndent, top - cell.topPadding - heading.fontSize, text)
+        
+        top -= heading_height
+        for paragraph, left in ((contractor, x), (client, x + col_widths[0])):
+            paragraph.drawOn(canv, left + cell.leftPadding, top - cell.topPadding - paragraph.height)
+    
+    page.add(heading_height + address_row_height, draw, width=sum(col_widths))
+
+def _draw_invoice_page(invoice_data, line_items):
+    """The invoice drawn straight onto a canvas, or None if it does not fit on one page"""
+    styles = get_custom_styles()
+    page = _Page(INVOICE_MARGINS)
+    
+    page.text("INVOICE", styles['CustomTitle'])
+    page.text(f"#{invoice_data['invoice_number']}", styles['Subtitle'])
+    page.rule(2, INVOICE_COLOR)
+    page.space(20)
+    
+    _contact_table(page, invoice_data, styles, INVOICE_CONTACT_WIDTHS, INVOICE_CONTACT_STYLE)
+    page.space(20)
+    
+    page.table(_invoice_details(invoice_data), INVOICE_DETAILS_WIDTHS, INVOICE_DETAILS_STYLE)
+    page.space(30)
+    
+    page.text('SERVICE DETAILS', styles['SectionHeader'])
+    page.rule(1, RULE_COLOR)
+    page.space(15)
+    
+    service_data = [INVOICE_SERVICE_HEADER] + [_line_item_row(item, styles['InvoiceItemText']) for item in line_items]
+    page.table(service_data, INVOICE_SERVICE_WIDTHS, INVOICE_SERVICES_STYLE)
+    page.space(20)
+    
+    page.rule(2, INVOICE_ACCENT_COLOR)
+    page.space(15)
+    page.table([['', 'TOTAL DUE:', f"${invoice_data['total']:.2f} only"]], INVOICE_TOTAL_WIDTHS, INVOICE_TOTAL_STYLE)
+    page.space(30)
+    
+    page.text(_invoice_footer(invoice_data), styles['Description'])
+    
+    return page.render() if page.fits else None
+
+def _draw_receipt_page(receipt_data):
+    """The receipt drawn straight onto a canvas, or None if it does not fit on one page"""
+    styles = get_custom_styles()
+    page = _Page(RECEIPT_MARGINS)
+    
+    page.text("PAYMENT RECEIPT", styles['CustomTitle'])
+    page.text(f"#{receipt_data['receipt_number']}", styles['Subtitle'])
+    page.rule(2, RECEIPT_COLOR)
+    page.space(12)
+    
+    _contact_table(page, receipt_data, styles, RECEIPT_CONTACT_WIDTHS, RECEIPT_CONTACT_STYLE)
+    page.space(12)
+    
+    page.table(_receipt_details(receipt_data), RECEIPT_DETAILS_WIDTHS, RECEIPT_DETAILS_STYLE)
+    page.space(15)
+    
+    if receipt_data.get('line_items'):
+        page.text('SERVICES PROVIDED', styles['SectionHeader'])
+        page.rule(1, RULE_COLOR)
+        page.space(8)
+        service_data = [RECEIPT_SERVICE_HEADER] + [
+            _line_item_row(item, styles['ReceiptItemText']) for item in receipt_data['line_items']
+        ]
+        page.table(service_data, RECEIPT_SERVICE_WIDTHS, RECEIPT_SERVICES_STYLE)
+        page.space(12)
+    elif receipt_data.get('service_description'):
+        page.text('SERVICE DESCRIPTION', styles['SectionHeader'])
+        page.rule(1, RULE_COLOR)
+        page.space(6)
+        page.paragraph(Paragraph(receipt_data['service_description'], styles['Description']))
+        page.space(12)
+    
+    page.rule(2, RECEIPT_COLOR)
+    page.space(10)
+    page.table([['', 'AMOUNT RECEIVED:', f"${receipt_data['paid_amount']:.2f} only"]], RECEIPT_AMOUNT_WIDTHS, RECEIPT_AMOUNT_STYLE)
+    page.space(15)
+    
+    page.text('PAYMENT CONFIRMATION', styles['SectionHeader'])
+    page.rule(1, RULE_COLOR)
+    page.space(8)
+    page.paragraph(Paragraph(_confirmation_markup(receipt_data), styles['Description']))
+    page.space(15)
+    page.paragraph(Paragraph(RECEIPT_THANK_YOU, styles['Description']))
+    
+    return page.render() if page.fits else None
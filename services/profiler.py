@@ -0,0 +1,131 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from flask import g, request
+from config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+# Threads serving a request right now, the only ones worth sampling
+_request_threads = set()
+
+def _frame_label(code):
+    """function (file:first line), with app files relative to the project"""
+    filename = code.co_filename
+    if filename.startswith(ROOT):
+        filename = filename[len(ROOT):]
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+def _stack(frame):
+    """Collapsed stack of a frame, outermost call first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+class Sampler:
+    """Samples the stacks of some threads from a background thread.
+
+    Nothing runs in the sampled threads themselves: every interval the
+    sampler reads their current frames (sys._current_frames) and counts
+    each distinct stack. Sampling stops after max_seconds at the latest.
+    """
+
+    def __init__(self, threads=None, interval=None, max_seconds=None, exclude=None):
+        # threads: idents to sample, or None for every thread serving a request
+        self.threads = threads
+        self.exclude = exclude
+        self.interval = max(interval or Config.PROFILE_INTERVAL_MS, 1) / 1000
+        self.max_seconds = min(max_seconds or Config.PROFILE_MAX_SECONDS, Config.PROFILE_MAX_SECONDS)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        skip = {threading.get_ident(), self.exclude}
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            threads = self.threads if self.threads is not None else set(_request_threads)
+            for ident, frame in sys._current_frames().items():
+                if ident in threads and ident not in skip:
+                    self.stacks[_stack(frame)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def join(self):
+        """Wait for the sampling window to run out"""
+        self._thread.join()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self):
+        """The samples in collapsed-stack format, for flamegraph.pl or speedscope"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+class Profiles:
+    """Profiles of single requests for /admin/profile/<id>, the latest MAX_PROFILES kept"""
+
+    MAX_PROFILES = 50
+
+    _profiles = OrderedDict()
+    _lock = threading.Lock()
+    # Only one whole-process window at a time
+    window_lock = threading.Lock()
+
+    @staticmethod
+    def add(profile_id, collapsed):
+        with Profiles._lock:
+            Profiles._profiles[profile_id] = collapsed
+            while len(Profiles._profiles) > Profiles.MAX_PROFILES:
+                Profiles._profiles.popitem(last=False)
+
+    @staticmethod
+    def get(profile_id):
+        with Profiles._lock:
+            return Profiles._profiles.get(profile_id)
+
+def _start():
+    ident = threading.get_ident()
+    _request_threads.add(ident)
+    g._profile_thread = ident
+
+    if request.headers.get('X-Profile') or request.args.get('_profile'):
+        from routes.admin import is_admin_request
+        if is_admin_request():
+            g._profiler = Sampler(threads={ident}, interval=Config.PROFILE_REQUEST_INTERVAL_MS).start()
+
+def _finish(response):
+    sampler = g.pop('_profiler', None)
+    if sampler is not None:
+        profile_id = uuid.uuid4().hex
+        Profiles.add(profile_id, sampler.stop().collapsed())
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+def _teardown(exception=None):
+    sampler = g.pop('_profiler', None)
+    if sampler is not None:  # The response never got to _finish
+        sampler.stop()
+    _request_threads.discard(g.pop('_profile_thread', None))
+
+def init_app(app):
+    """Let admins profile app's requests if PROFILING is on"""
+    if not Config.PROFILING:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
@@ -0,0 +1,166 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from config import Config
+from models.database import add_query_listener, explain_query_plan, plan_problems, remove_query_listener
+
+logger = logging.getLogger(__name__)
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ROW_LISTS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+
+def fingerprint(query):
+    """Normalize SQL so that queries differing only in values group together.
+
+    Literals become ?, placeholder lists such as IN (?, ?, ?) become (...)
+    whatever their length, and comments and whitespace runs are dropped.
+    """
+    sql = _COMMENTS.sub(' ', query)
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _PLACEHOLDER_LISTS.sub('(...)', sql)
+    sql = _ROW_LISTS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+class QueryStats:
+    """Per query fingerprint timings of this process, with query plans.
+
+    Off unless QUERY_STATS is set. Every fingerprint is explained once when
+    first seen and again the first time a run takes SLOW_QUERY_MS or more,
+    so full table scans and slow plans are on record; requests that run
+    one fingerprint N_PLUS_ONE_QUERIES times or more are logged as N+1
+    suspects.
+    """
+
+    MAX_FINGERPRINTS = 2000
+
+    _queries = {}
+    _n_plus_one = {}
+    _fingerprints = {}  # query text -> fingerprint, queries are mostly constant strings
+    _started = time.time()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(query, params, duration):
+        """Query listener: add one execute_query call"""
+        sql = QueryStats._fingerprints.get(query)
+        if sql is None:
+            sql = fingerprint(query)
+            if len(QueryStats._fingerprints) >= QueryStats.MAX_FINGERPRINTS:
+                QueryStats._fingerprints.clear()
+            QueryStats._fingerprints[query] = sql
+
+        ms = duration * 1000
+        slow = Config.SLOW_QUERY_MS is not None and ms >= Config.SLOW_QUERY_MS
+        with QueryStats._lock:
+            entry = QueryStats._queries.get(sql)
+            if entry is None:
+                if len(QueryStats._queries) >= QueryStats.MAX_FINGERPRINTS:
+                    return
+                entry = QueryStats._queries[sql] = {
+                    'fingerprint': sql, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0,
+                    'plan': None, 'plan_problems': [], 'explained': None
+                }
+                explain = 'first run'
+            else:
+                explain = 'slow run' if slow and entry['explained'] != 'slow run' else None
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            entry['slow'] += slow
+            if explain:
+                entry['explained'] = explain
+
+        if explain:
+            try:
+                plan = explain_query_plan(query, params)
+            except sqlite3.Error:
+                plan = None
+            with QueryStats._lock:
+                entry['plan'] = plan
+                entry['plan_problems'] = plan_problems(plan, query) if plan else []
+
+        if has_request_context():
+            counts = g.get('_query_counts')
+            if counts is not None:
+                counts[sql] += 1
+
+    @staticmethod
+    def start_request():
+        g._query_counts = Counter()
+
+    @staticmethod
+    def finish_request(response):
+        """Note the fingerprints the request ran often enough to look like N+1"""
+        counts = g.pop('_query_counts', None)
+        if not counts or not Config.N_PLUS_ONE_QUERIES:
+            return response
+        for sql, count in counts.items():
+            if count < Config.N_PLUS_ONE_QUERIES:
+                continue
+            with QueryStats._lock:
+                suspect = QueryStats._n_plus_one.setdefault((request.endpoint, sql), {
+                    'endpoint': request.endpoint, 'fingerprint': sql, 'requests': 0, 'max_per_request': 0
+                })
+                suspect['requests'] += 1
+                suspect['max_per_request'] = max(suspect['max_per_request'], count)
+                suspect['last_path'] = request.path
+            logger.warning(json.dumps({
+                'event': 'n_plus_one', 'endpoint': request.endpoint, 'path': request.path,
+                'count': count, 'fingerprint': sql
+            }))
+        return response
+
+    @staticmethod
+    def snapshot():
+        """Queries by total time and N+1 suspects, as plain data"""
+        with QueryStats._lock:
+            queries = [dict(entry) for entry in QueryStats._queries.values()]
+            n_plus_one = [dict(suspect) for suspect in QueryStats._n_plus_one.values()]
+        for entry in queries:
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+            entry['avg_ms'] = round(entry['total_ms'] / entry['count'], 3)
+        queries.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        n_plus_one.sort(key=lambda suspect: suspect['max_per_request'], reverse=True)
+        return {
+            'enabled': Config.QUERY_STATS,
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(QueryStats._started)),
+            'slow_query_ms': Config.SLOW_QUERY_MS,
+            'n_plus_one_queries': Config.N_PLUS_ONE_QUERIES,
+            'queries': queries,
+            'n_plus_one': n_plus_one
+        }
+
+    @staticmethod
+    def dump(path):
+        """Write snapshot() to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump(QueryStats.snapshot(), f, indent=2)
+
+    @staticmethod
+    def reset():
+        with QueryStats._lock:
+            QueryStats._queries.clear()
+            QueryStats._n_plus_one.clear()
+            QueryStats._started = time.time()
+
+def init_app(app):
+    """Collect query statistics for app's requests if QUERY_STATS is on"""
+    if not Config.QUERY_STATS:
+        return
+    app.before_request(QueryStats.start_request)
+    app.after_request(QueryStats.finish_request)
+
+    # Listeners are process wide; creating a second app must not count twice
+    remove_query_listener(QueryStats.record)
+    add_query_listener(QueryStats.record)
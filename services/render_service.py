@@ -0,0 +1,391 @@
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from services import memory
+from services.metrics import Metrics
+from services.pdf_cache import PdfCache
+from services.pdf_generator import render_invoice_pdf, render_receipt_pdf
+
+try:
+    import resource
+except ImportError:  # Windows: no address space limits
+    resource = None
+
+RENDERERS = {
+    'invoice': render_invoice_pdf,
+    'receipt': render_receipt_pdf,
+}
+
+# One pool per process, created on first use (pid, pool, start queue)
+_executor = None
+_executor_lock = threading.Lock()
+
+# Workers report on the start queue when they pick up a job, so its timeout
+# runs from then rather than from when it was queued: job id -> (pid, time)
+_started = {}
+_job_ids = itertools.count(1)
+# Jobs whose worker was killed for running past its deadline
+_killed = set()
+
+# Set in each worker process by _init_worker
+_start_queue = None
+
+# A job still running this long after its deadline ignored the worker's own
+# timer (stuck outside Python code) and its worker is killed
+KILL_GRACE_SECONDS = 5
+
+# Renders in flight, by cache path, so a download waits for a pre-render
+# of the same document instead of starting a second one
+_pending = {}
+_pending_lock = threading.Lock()
+
+_stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0, 'busy': 0, 'killed': 0, 'inline': 0}
+
+# Config values copied into each worker process, which starts from a clean
+# interpreter: large invoices read their line items while rendering, render
+# times go to METRICS_DIR, jobs time themselves out and memory tracking has
+# to be started there too
+WORKER_SETTINGS = (
+    'DATABASE_PATH', 'METRICS_DIR', 'PDF_RENDER_TIMEOUT', 'MEMORY_TRACKING', 'MEMORY_TRACE_FRAMES', 'MEMORY_TOP_SITES',
+    'MEMORY_BUDGET_MB', 'MEMORY_BUDGET_ACTION'
+)
+
+class RenderTimeout(Exception):
+    """A PDF took longer than PDF_RENDER_TIMEOUT to render"""
+
+class RenderBusy(Exception):
+    """A download waited PDF_RENDER_QUEUE_TIMEOUT for a worker to start on its PDF"""
+
+def _count(name):
+    with _pending_lock:
+        _stats[name] += 1
+
+def _init_worker(memory_mb, settings, start_queue):
+    """Runs once in each worker process"""
+    global _start_queue
+    _start_queue = start_queue
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    memory.start()
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _render(kind, data):
+    """Render a document in memory, returns the PDF bytes"""
+    started = time.perf_counter()
+    with memory.track_memory(f'{kind} render') as usage:
+        if kind == 'invoice' and 'line_items' not in data:
+            # A large invoice (see Invoice.get_invoice_for_pdf): stream its items
+            from models.invoice import Invoice
+            pdf = render_invoice_pdf(data, line_items=Invoice.stream_line_items(data))
+        else:
+            pdf = RENDERERS[kind](data)
+    Metrics.observe('invoice_pdf_render_duration_seconds', time.perf_counter() - started, kind=kind)
+    if usage is not None:
+        Metrics.observe('invoice_pdf_render_memory_peak_bytes', usage.peak, kind=kind)
+    return pdf
+
+@contextmanager
+def _deadline(seconds, kind):
+    """Raise RenderTimeout in the block once it has run for seconds (POSIX only).
+
+    Jobs run in the worker's main thread, where SIGALRM interrupts the
+    render between two Python bytecodes; the worker itself lives on.
+    """
+    if not seconds or not hasattr(signal, 'setitimer'):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise RenderTimeout(f'The {kind} took longer than {seconds}s to render')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _render_job(job_id, kind, data, filepath):
+    """Render one document into the cache (runs in a worker process)"""
+    _start_queue.put((job_id, os.getpid(), time.time()))
+    with _deadline(Config.PDF_RENDER_TIMEOUT, kind):
+        pdf = _render(kind, data)
+    filepath = PdfCache.store(filepath, pdf)
+    # Workers serve no requests, so they report their render times after each job
+    Metrics.flush(force=True)
+    return filepath
+
+def _get_executor():
+    """The worker pool of this process, or None when rendering inline"""
+    global _executor
+    if Config.PDF_RENDER_WORKERS <= 0:
+        return None
+
+    with _executor_lock:
+        # A pool that lost a worker is broken for good, so start a new one
+        if _executor is None or _executor[0] != os.getpid() or _executor[1]._broken:
+            # Spawned workers start clean instead of inheriting the web
+            # process's threads, open database connections and mappings
+            context = multiprocessing.get_context('spawn')
+            start_queue = context.SimpleQueue()
+            pool = ProcessPoolExecutor(
+                max_workers=Config.PDF_RENDER_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    Config.PDF_RENDER_MEMORY_MB, {name: getattr(Config, name) for name in WORKER_SETTINGS},
+                    start_queue
+                )
+            )
+            _executor = (os.getpid(), pool, start_queue)
+        return _executor[1]
+
+def _reset_executor():
+    """Kill the pool and every job in it; the next job starts a new one"""
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor[0] != os.getpid():
+            return
+        pool = _executor[1]
+        _executor = None
+
+    # A running job cannot be cancelled, so stop its processes outright
+    for process in list(getattr(pool, '_processes', {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
+
+def _read_starts():
+    """Move the start reports of the workers into _started (hold _pending_lock)"""
+    executor = _executor
+    if executor is None or executor[0] != os.getpid():
+        return
+    start_queue = executor[2]
+    while not start_queue.empty():
+        job_id, pid, started = start_queue.get()
+        _started[job_id] = (pid, started)
+
+def _kill_stuck_workers():
+    """Kill the workers of jobs running KILL_GRACE_SECONDS past their deadline (hold _pending_lock)"""
+    if not Config.PDF_RENDER_TIMEOUT:
+        return
+    now = time.time()
+    for job_id, (pid, started) in list(_started.items()):
+        if now - started < Config.PDF_RENDER_TIMEOUT + KILL_GRACE_SECONDS:
+            continue
+        del _started[job_id]
+        _killed.add(job_id)
+        _stats['killed'] += 1
+        try:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except OSError:
+            pass  # Exited in the meantime
+
+def _finished(filepath, future):
+    with _pending_lock:
+        _pending.pop(filepath, None)
+        # Reading the reports here as well keeps the queue from filling up
+        _read_starts()
+        _started.pop(future.job_id, None)
+    if future.cancelled() or future.exception() is not None:
+        _count('failed')
+    else:
+        _count('completed')
+        PdfCache.stored_elsewhere(future.result())
+        PdfCache.evict()
+
+def _submit(kind, data, filepath):
+    """Queue a render unless one for the same file is already running"""
+    with _pending_lock:
+        future = _pending.get(filepath)
+        if future is not None:
+            return future
+
+    executor = _get_executor()
+    if executor is None:
+        return None
+
+    with _pending_lock:
+        future = _pending.get(filepath)
+        if future is None:
+            job_id = next(_job_ids)
+            future = executor.submit(_render_job, job_id, kind, data, filepath)
+            future.job_id = job_id
+            _pending[filepath] = future
+            _stats['submitted'] += 1
+    future.add_done_callback(lambda done: _finished(filepath, done))
+    return future
+
+class RenderService:
+    """Renders invoice and receipt PDFs in a pool of worker processes.
+
+    ReportLab layout is CPU-bound and holds the GIL, so rendering in the
+    request thread stalls every other request of the web worker. Jobs run
+    in separate processes instead, each with a timeout and a memory cap,
+    and write straight into the PDF cache. Documents are pre-rendered when
+    they change, so most downloads find a finished file.
+    """
+
+    # How often waiting callers check on a job (see watch)
+    WATCH_INTERVAL = 1
+
+    @staticmethod
+    def render(kind, number, data):
+        """Path of the PDF for data, rendering it if it is not cached yet"""
+        return RenderService.fetch(kind, number, data)[0]
+
+    @staticmethod
+    def fetch(kind, number, data):
+        """The PDF for data as (filepath, pdf), rendering it if it is not cached yet.
+
+        pdf holds the bytes when the document was just rendered in this
+        process (no worker pool), so they can be sent without reading the
+        cache file back; otherwise it is None and filepath is the file.
+        """
+        filepath = PdfCache.path(kind, number, data)
+        if PdfCache.lookup(filepath):
+            return filepath, None
+
+        for attempt in range(2):
+            try:
+                future = _submit(kind, data, filepath)
+                if future is None:
+                    _count('inline')
+                    pdf = _render(kind, data)
+                    PdfCache.store(filepath, pdf)
+                    PdfCache.evict()
+                    return filepath, pdf
+                return RenderService._wait(future, kind, number), None
+            except BrokenProcessPool:
+                # A worker died (possibly while running someone else's job);
+                # the next submit starts a fresh pool, so try once more
+                with _pending_lock:
+                    _pending.pop(filepath, None)
+                if attempt:
+                    raise
+
+    @staticmethod
+    def _wait(future, kind, number):
+        """The result of a job, raising RenderTimeout or RenderBusy.
+
+        The PDF_RENDER_TIMEOUT of a job runs from when a worker starts it,
+        so time spent queued behind other renders does not count against
+        it; a job no worker has started within PDF_RENDER_QUEUE_TIMEOUT
+        raises RenderBusy instead (it stays queued, so the PDF is cached
+        for the next try).
+        """
+        queued_until = time.monotonic() + Config.PDF_RENDER_QUEUE_TIMEOUT
+        while True:
+            try:
+                return future.result(timeout=RenderService.WATCH_INTERVAL)
+            except FutureTimeout:
+                pass
+            except RenderTimeout:  # Stopped by the worker's own timer
+                _count('timeouts')
+                raise RenderTimeout(f'{kind} {number} took longer than {Config.PDF_RENDER_TIMEOUT}s to render') from None
+
+            state = RenderService.watch(future)
+            if state == 'killed':
+                _count('timeouts')
+                raise RenderTimeout(f'{kind} {number} took longer than {Config.PDF_RENDER_TIMEOUT}s to render')
+            if state == 'queued' and time.monotonic() > queued_until:
+                _count('busy')
+                raise RenderBusy(f'All PDF workers are busy, {kind} {number} is queued - try again in a moment')
+
+    @staticmethod
+    def watch(future):
+        """Check on a job: 'queued', 'running', 'done' or 'killed'.
+
+        A job past its deadline is normally stopped by its worker's own
+        timer. One still running KILL_GRACE_SECONDS later is stuck where
+        the timer cannot reach it, so its worker process is killed - any
+        such job's, not only this one's, so that whoever waits keeps an eye
+        on the whole pool. Only that process is stopped, but
+        ProcessPoolExecutor then fails the other jobs of the pool with
+        BrokenProcessPool; fetch() and bulk exports retry those, and the
+        next job starts a new pool.
+        """
+        with _pending_lock:
+            _read_starts()
+            _kill_stuck_workers()
+            if future.job_id in _killed:
+                return 'killed'
+            if future.done():
+                return 'done'
+            return 'running' if future.job_id in _started else 'queued'
+
+    @staticmethod
+    def render_async(kind, number, data):
+        """Start rendering data, returns (filepath, future).
+
+        The future is None when the PDF is already cached, or was rendered
+        inline because no worker pool is configured.
+        """
+        filepath = PdfCache.path(kind, number, data)
+        if PdfCache.lookup(filepath):
+            return filepath, None
+
+        future = _submit(kind, data, filepath)
+        if future is None:
+            _count('inline')
+            PdfCache.store(filepath, _render(kind, data))
+            PdfCache.evict()
+        return filepath, future
+
+    @staticmethod
+    def reset():
+        """Replace the worker pool, stopping every job in it"""
+        _reset_executor()
+
+    @staticmethod
+    def prerender(kind, number, data):
+        """Queue a document for rendering in the background"""
+        filepath = PdfCache.path(kind, number, data)
+        if os.path.exists(filepath):
+            return
+        try:
+            _submit(kind, data, filepath)
+        except (BrokenProcessPool, RuntimeError, OSError):
+            pass  # Pre-rendering is only an optimisation; the download renders it
+
+    @staticmethod
+    def prerender_invoice(invoice_number):
+        """Queue the current version of an invoice for rendering"""
+        from models.invoice import Invoice
+
+        invoice = Invoice.get_invoice_for_pdf(invoice_number)
+        if invoice:
+            RenderService.prerender('invoice', invoice_number, invoice)
+
+    @staticmethod
+    def prerender_receipt(receipt_number):
+        """Queue a receipt for rendering"""
+        from models.receipt import Receipt
+
+        receipt = Receipt.get_receipt_by_number(receipt_number)
+        if receipt:
+            RenderService.prerender('receipt', receipt_number, dict(receipt))
+
+    @staticmethod
+    def stats():
+        """Job counts for this process"""
+        with _pending_lock:
+            return dict(_stats, pending=len(_pending))
+
+    @staticmethod
+    def shutdown():
+        """Stop the worker pool (waits for running jobs)"""
+        global _executor
+        with _executor_lock:
+            executor, _executor = _executor, None
+        if executor is not None and executor[0] == os.getpid():
+            executor[1].shutdown(wait=True)
@@ -0,0 +1,105 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from config import Config
+from models.database import add_query_listener, remove_query_listener
+
+logger = logging.getLogger(__name__)
+
+class RequestTiming:
+    """Where the time of one request went"""
+
+    __slots__ = ('started', 'queries', 'sql', 'template', 'pdf', '_templates')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.pdf = 0.0
+        self._templates = []
+
+def current():
+    """The timing of the request being handled, or None outside a request"""
+    if not has_request_context():
+        return None
+    return g.get('_timing')
+
+@contextmanager
+def timed(part):
+    """Add the time spent in the block to a part ('pdf' or 'template') of the request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing = current()
+        if timing is not None:
+            setattr(timing, part, getattr(timing, part) + time.perf_counter() - started)
+
+def _on_query(query, params, duration):
+    timing = current()
+    if timing is not None:
+        timing.queries += 1
+        timing.sql += duration
+
+def _before_template(sender, template, context, **extra):
+    timing = current()
+    if timing is not None:
+        timing._templates.append(time.perf_counter())
+
+def _after_template(sender, template, context, **extra):
+    timing = current()
+    if timing is not None and timing._templates:
+        timing.template += time.perf_counter() - timing._templates.pop()
+
+def _start():
+    g._timing = RequestTiming()
+
+def _finish(response):
+    timing = g.pop('_timing', None)
+    if timing is None:
+        return response
+    total = time.perf_counter() - timing.started
+    connections = len(g.get('_db_connections') or {})
+    opened = g.get('_db_connections_opened', 0)
+
+    if Config.SERVER_TIMING:
+        parts = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={timing.sql * 1000:.1f};desc="{timing.queries} queries, {connections} connections"',
+        ]
+        if timing.template:
+            parts.append(f'template;dur={timing.template * 1000:.1f}')
+        if timing.pdf:
+            parts.append(f'pdf;dur={timing.pdf * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+
+    if Config.SLOW_REQUEST_MS is not None and total * 1000 >= Config.SLOW_REQUEST_MS:
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(timing.sql * 1000, 1),
+            'queries': timing.queries,
+            'connections': connections,
+            'connections_opened': opened,
+            'template_ms': round(timing.template * 1000, 1),
+            'pdf_ms': round(timing.pdf * 1000, 1),
+        }))
+    return response
+
+def init_app(app):
+    """Time every request of app: Server-Timing header and slow request log"""
+    app.before_request(_start)
+    app.after_request(_finish)
+
+    # Listeners are process wide; creating a second app must not count twice
+    remove_query_listener(_on_query)
+    add_query_listener(_on_query)
+    before_render_template.connect(_before_template)
+    template_rendered.connect(_after_template)
@@ -0,0 +1,169 @@
+"""
+Golden-output tests for the single-page PDF fast path
+=====================================================
+
+Short invoices and receipts are drawn straight onto a canvas
+(_draw_invoice_page / _draw_receipt_page) instead of going through the
+platypus layout. The two must produce the same document: every word at
+the same position in the same font, size and colour, and the same lines
+and fills. Each case is rendered both ways and the extracted pages are
+compared.
+
+Needs pymupdf to read the pages back (pip install -r requirements-dev.txt).
+
+Usage:
+    python -m pytest tests/test_pdf_fast_path.py
+"""
+
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from services import memory, pdf_generator
+
+# Listed in requirements-dev.txt: a missing pymupdf fails the run instead of skipping it
+import pymupdf
+
+# Points; both paths compute the same positions, this only absorbs rounding
+TOLERANCE = 0.05
+
+def line_items(count, description='Work performed'):
+    """count line items; every other one has a description"""
+    items = []
+    for n in range(count):
+        quantity = 1 + n % 3
+        rate = 50.0 + n * 12.5
+        items.append({
+            'service_name': f'Service {n + 1}',
+            'service_description': description if n % 2 == 0 else '',
+            'quantity': quantity,
+            'rate': rate,
+            'amount': quantity * rate
+        })
+    return items
+
+def document(count, **overrides):
+    """Invoice and receipt data with count line items: both renderers take the same dict"""
+    items = line_items(count)
+    total = sum(item['amount'] for item in items)
+    data = {
+        'invoice_number': 'INV-2026-0001',
+        'receipt_number': 'REC-2026-0001',
+        'invoice_date': '2026-01-15',
+        'payment_date': '2026-02-01 10:30:00',
+        'status': 'paid',
+        'total': total,
+        'paid_amount': total,
+        'contractor_name': 'Smith & Sons',
+        'contractor_address': '1 Main Street\nSpringfield',
+        'contractor_email': 'billing@example.com',
+        'contractor_phone': '555-0100',
+        'contractor_tax_id': 'TAX-123',
+        'client_name': 'Acme Corp',
+        'client_address': '42 Market Road\nShelbyville',
+        'client_email': 'accounts@acme.example',
+        'client_phone': '555-0199',
+        'line_items': items
+    }
+    data.update(overrides)
+    return data
+
+def drawn_segments(page):
+    """Every line and filled rectangle on a page with its colours and width.
+
+    Sorted and rounded to TOLERANCE: the fast path strokes a table's grid
+    as one path where platypus strokes each line on its own.
+    """
+    def rounded(*values):
+        return tuple(round(value / TOLERANCE) * TOLERANCE for value in values)
+
+    segments = []
+    for drawing in page.get_drawings():
+        style = (drawing['type'], drawing.get('color'), drawing.get('fill'), drawing.get('width'))
+        for item in drawing['items']:
+            if item[0] == 're':
+                coordinates = tuple(item[1])  # Without its winding direction
+            else:
+                # Lines and curves: either end first
+                points = [tuple(point) for point in item[1:]]
+                coordinates = sum(min(points, points[::-1]), ())
+            segments.append(style + (item[0],) + rounded(*coordinates))
+    return sorted(segments, key=repr)
+
+def page_contents(pdf):
+    """Per page: its text spans with font, size, colour and origin, and its drawn segments"""
+    pages = []
+    with pymupdf.open(stream=pdf, filetype='pdf') as doc:
+        for page in doc:
+            spans = []
+            for block in page.get_text('dict')['blocks']:
+                for line in block.get('lines', []):
+                    for span in line['spans']:
+                        spans.append((span['text'], span['font'], span['size'], span['color'], span['origin']))
+            pages.append((spans, drawn_segments(page)))
+    return pages
+
+def assert_same_pages(fast, platypus):
+    """Compare two rendered PDFs within TOLERANCE points"""
+    fast_pages, platypus_pages = page_contents(fast), page_contents(platypus)
+    assert len(fast_pages) == len(platypus_pages)
+    for (fast_spans, fast_drawings), (spans, drawings) in zip(fast_pages, platypus_pages):
+        assert [span[:4] for span in fast_spans] == [span[:4] for span in spans]
+        for fast_span, span in zip(fast_spans, spans):
+            assert fast_span[4] == pytest.approx(span[4], abs=TOLERANCE), fast_span[0]
+
+        assert fast_drawings == drawings
+
+def platypus_pdf(render, data, monkeypatch):
+    """Render with the fast path switched off"""
+    with monkeypatch.context() as patch:
+        patch.setattr(Config, 'PDF_FAST_LAYOUT_ITEMS', None)
+        return render(data)
+
+CASES = {
+    'one item': lambda: document(1),
+    'threshold': lambda: document(Config.PDF_FAST_LAYOUT_ITEMS),
+    'no items': lambda: document(0, service_description='Consulting for <b>Q1</b> &amp; Q2'),
+    'pending, no date': lambda: document(2, status='pending', invoice_date='')
+}
+
+@pytest.mark.parametrize('case', CASES)
+def test_invoice_fast_path_matches_platypus(case, monkeypatch):
+    data = CASES[case]()
+    fast = pdf_generator._draw_invoice_page(data, data['line_items'])
+    assert fast is not None, 'expected to fit on one page'
+
+    assert fast == pdf_generator.render_invoice_pdf(data)
+    assert_same_pages(fast, platypus_pdf(pdf_generator.render_invoice_pdf, data, monkeypatch))
+
+@pytest.mark.parametrize('case', CASES)
+def test_receipt_fast_path_matches_platypus(case, monkeypatch):
+    data = CASES[case]()
+    fast = pdf_generator._draw_receipt_page(data)
+    assert fast is not None, 'expected to fit on one page'
+
+    assert fast == pdf_generator.render_receipt_pdf(data)
+    assert_same_pages(fast, platypus_pdf(pdf_generator.render_receipt_pdf, data, monkeypatch))
+
+def test_overflowing_invoice_falls_back_to_platypus(monkeypatch):
+    data = document(Config.PDF_FAST_LAYOUT_ITEMS, contractor_address='\n'.join(['Line'] * 40))
+    assert pdf_generator._draw_invoice_page(data, data['line_items']) is None
+
+    assert pdf_generator.render_invoice_pdf(data) == platypus_pdf(pdf_generator.render_invoice_pdf, data, monkeypatch)
+
+def test_fast_path_checks_memory_budget(monkeypatch):
+    monkeypatch.setattr(Config, 'MEMORY_BUDGET_MB', 0.001)
+    monkeypatch.setattr(Config, 'MEMORY_BUDGET_ACTION', 'abort')
+    data = document(1)
+    tracemalloc.start()
+    try:
+        with memory.track_memory('invoice render'):
+            with pytest.raises(memory.MemoryBudgetExceeded):
+                pdf_generator._draw_invoice_page(data, data['line_items'])
+    finally:
+        tracemalloc.stop()